@@ -0,0 +1,51 @@
+"""
+Download CTF challenges into folders rendered from templates.
+
+The library API streams an export without any console output:
+
+    from ctfdl import ExportConfig, stream
+
+    async for entry in stream(ExportConfig(url="https://demo.ctfd.io", token="...")):
+        print(entry.data.name, entry.path)
+"""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ctfdl.challenges.entry import ExportError, stream
+    from ctfdl.common.ratelimit import BandwidthLimiter
+    from ctfdl.core.config import ExportConfig
+    from ctfdl.core.events import EventEmitter
+    from ctfdl.core.models import ChallengeEntry
+    from ctfdl.rendering.sinks import FileSink, OutputSink
+
+# Imported on first use, so the command line starts without loading the exporter
+_EXPORTS = {
+    "BandwidthLimiter": "ctfdl.common.ratelimit",
+    "ChallengeEntry": "ctfdl.core.models",
+    "EventEmitter": "ctfdl.core.events",
+    "ExportConfig": "ctfdl.core.config",
+    "ExportError": "ctfdl.challenges.entry",
+    "FileSink": "ctfdl.rendering.sinks",
+    "OutputSink": "ctfdl.rendering.sinks",
+    "stream": "ctfdl.challenges.entry",
+}
+
+__all__ = [
+    "BandwidthLimiter",
+    "ChallengeEntry",
+    "EventEmitter",
+    "ExportConfig",
+    "ExportError",
+    "FileSink",
+    "OutputSink",
+    "stream",
+]
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'ctfdl' has no attribute {name!r}")
+    from importlib import import_module
+
+    return getattr(import_module(_EXPORTS[name]), name)
@@ -0,0 +1,575 @@
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import logging
+import os
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from pathlib import Path
+from typing import IO
+from urllib.parse import urljoin, urlparse
+
+import httpx
+from ctfbridge.base.client import CTFClient
+from ctfbridge.models.challenge import (
+    Attachment,
+    AttachmentCollection,
+    Challenge,
+    DownloadType,
+    ProgressData,
+)
+
+from ctfdl.challenges.deferred import (
+    AttachmentBudget,
+    AttachmentDeferredError,
+    announced_sha256,
+    stub_path,
+    write_stub,
+)
+from ctfdl.challenges.digests import DigestCache
+from ctfdl.common.ratelimit import paused_seconds
+from ctfdl.core.config import STATE_DIR_NAME
+from ctfdl.core.models import AttachmentFile
+from ctfdl.rendering.sinks import AttachmentUpload, OutputSink, StoredFile
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[ProgressData], Awaitable[None]]
+
+
+class StalledDownloadError(Exception):
+    """Raised when an attachment stream delivers no data for too long."""
+
+
+class _AlreadyStoredError(Exception):
+    """Raised once the response shows the sink already holds this attachment."""
+
+
+class StreamHasher:
+    """Hashes bytes as they stream past, so files never need a second read."""
+
+    def __init__(self, blake3: bool = False):
+        self._sha256 = hashlib.sha256()
+        self._blake3 = None
+        if blake3:
+            try:
+                from blake3 import blake3 as blake3_hasher
+            except ImportError:
+                logger.debug("blake3 is not installed, recording SHA-256 only")
+            else:
+                self._blake3 = blake3_hasher()
+
+    def update(self, chunk: bytes):
+        self._sha256.update(chunk)
+        if self._blake3 is not None:
+            self._blake3.update(chunk)
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def blake3(self) -> str | None:
+        return self._blake3.hexdigest() if self._blake3 is not None else None
+
+
+class _Transfer:
+    """One attachment's bytes on disk so far, kept across restarted requests."""
+
+    def __init__(self, blake3: bool):
+        self.blake3 = blake3
+        self.hasher = StreamHasher(blake3)
+        self.downloaded = 0
+        self.total = 0
+        self.validator: str | None = None
+        self.source: str | None = None
+        self.reserved = 0
+        self.limit: int | None = None
+
+    def restart(self):
+        self.hasher = StreamHasher(self.blake3)
+        self.downloaded = 0
+        self.validator = None
+
+
+class _FileWriter(AttachmentUpload):
+    """Writes into the `.part` file that replaces the attachment once complete."""
+
+    def __init__(self, f: IO[bytes]):
+        self.f = f
+
+    def expect(self, size: int):
+        preallocate(self.f.fileno(), size)
+
+    async def write(self, data: bytes):
+        self.f.write(data)
+
+    async def restart(self):
+        self.f.seek(0)
+        self.f.truncate()
+
+
+def origin_validator(headers: httpx.Headers) -> str | None:
+    """A strong ETag, or else Last-Modified: what tells whether the file changed."""
+    etag = headers.get("ETag", "")
+    return (etag if etag and not etag.startswith("W/") else None) or headers.get("Last-Modified")
+
+
+def absolute_url(client: CTFClient | None, url: str) -> str:
+    """Attachment URLs may be relative to the platform."""
+    parsed = urlparse(url)
+    if not parsed.scheme and not parsed.netloc and client is not None:
+        return urljoin(client.platform_url.rstrip("/") + "/", url.lstrip("/"))
+    return url
+
+
+def hash_file(path: Path, chunk_size: int, blake3: bool = False) -> StreamHasher:
+    hasher = StreamHasher(blake3)
+    with path.open("rb") as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher
+
+
+def same_content(existing: Path, size: int, sha256: str, chunk_size: int) -> bool:
+    """Whether `existing` already holds exactly the bytes that were just downloaded."""
+    try:
+        if existing.stat().st_size != size:
+            return False
+    except FileNotFoundError:
+        return False
+    return hash_file(existing, chunk_size).sha256 == sha256
+
+
+def preallocate(fd: int, size: int):
+    """Reserve `size` bytes up front so large files are not fragmented on disk."""
+    if size <= 0:
+        return
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    except OSError as e:
+        logger.debug("Preallocation of %d bytes failed: %s", size, e)
+
+
+def fsync_dir(path: Path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class AttachmentDownloader:
+    """
+    Downloads challenge attachments and records their integrity data.
+
+    HTTP attachments are streamed by ctf-dl itself so they can be hashed while the bytes
+    arrive. Other download types are delegated to ctfbridge and hashed afterwards.
+    HTTP attachments that do not fit the size budget are left behind as deferred stubs.
+    A stream that stalls (no data for `stall_timeout`, or a read timeout) is restarted
+    up to `restarts` times, continuing with a range request when the server allows it.
+    With a `sink` that takes uploads, HTTP attachments stream into it instead of onto
+    disk. Ones the sink already holds are skipped once the response headers show that.
+    On disk, `digests` remembers what the files already there hash to, so an update
+    only reads back the files that changed since they were written.
+    """
+
+    def __init__(
+        self,
+        client: CTFClient | None,
+        http: httpx.AsyncClient,
+        chunk_size: int = 1024 * 1024,
+        fsync: str = "none",
+        blake3: bool = False,
+        budget: AttachmentBudget | None = None,
+        stall_timeout: float | None = None,
+        restarts: int = 2,
+        sink: OutputSink | None = None,
+        digests: DigestCache | None = None,
+    ):
+        self.client = client
+        self.http = http
+        self.chunk_size = chunk_size
+        self.fsync = fsync
+        self.blake3 = blake3
+        self.budget = budget
+        self.stall_timeout = stall_timeout
+        self.restarts = restarts
+        self.sink = sink
+        self.digests = digests
+
+    async def download_all(
+        self,
+        challenge: Challenge,
+        save_dir: Path,
+        concurrency: int = 5,
+        progress: ProgressCallback | None = None,
+    ) -> tuple[Challenge, list[AttachmentFile]]:
+        attachments = list(challenge.attachments)
+        if not attachments:
+            return challenge, []
+
+        save_dir.mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def task(att: Attachment):
+            async with semaphore:
+                return await self.download(att, save_dir, progress, challenge.category)
+
+        results = await asyncio.gather(*(task(a) for a in attachments))
+
+        updated = [att for atts, _ in results for att in atts]
+        files = [f for _, fs in results for f in fs]
+        challenge = challenge.model_copy(
+            update={"attachments": AttachmentCollection(attachments=updated)}
+        )
+        return challenge, files
+
+    async def download(
+        self,
+        attachment: Attachment,
+        save_dir: Path,
+        progress: ProgressCallback | None = None,
+        category: str | None = None,
+    ) -> tuple[list[Attachment], list[AttachmentFile]]:
+        try:
+            if attachment.download_info.type == DownloadType.HTTP:
+                url = self._normalize_url(attachment.download_info.url)
+                try:
+                    path, stored, unchanged = await self._download_http(
+                        attachment, url, save_dir, progress, category
+                    )
+                except AttachmentDeferredError as e:
+                    return [attachment], [self._defer(attachment, url, save_dir, e)]
+                stub_path(path).unlink(missing_ok=True)
+                attachment = attachment.model_copy(
+                    update={
+                        "name": attachment.name or path.name,
+                        "local_path": str(path),
+                        "size_bytes": stored.size,
+                    }
+                )
+                return [attachment], [
+                    self._record(attachment, path, save_dir, stored, unchanged=unchanged)
+                ]
+
+            downloaded = await self.client.attachments.download(attachment, save_dir)
+        except Exception as e:
+            logger.warning("Failed to download %s: %s", attachment.name or "<unknown>", e)
+            return [attachment], []
+
+        files = []
+        for att in downloaded:
+            if not att.local_path:
+                continue
+            path = Path(att.local_path)
+            hasher = await asyncio.to_thread(hash_file, path, self.chunk_size, self.blake3)
+            stored = StoredFile(
+                size=path.stat().st_size, sha256=hasher.sha256, blake3=hasher.blake3
+            )
+            files.append(self._record(att, path, save_dir, stored))
+        return downloaded, files
+
+    def _defer(
+        self, attachment: Attachment, url: str, save_dir: Path, deferred: AttachmentDeferredError
+    ) -> AttachmentFile:
+        name = Path(attachment.name or urlparse(url).path).name
+        stub = write_stub(
+            save_dir / name,
+            attachment,
+            url,
+            deferred.reason,
+            deferred.size_bytes,
+            deferred.sha256,
+            platform_url=self.client.platform_url if self.client else None,
+        )
+        logger.info("Deferred %s (%s)", name, deferred.reason)
+        return AttachmentFile(
+            name=name,
+            path=Path(save_dir.name) / stub.name,
+            size_bytes=deferred.size_bytes or attachment.size_bytes,
+            deferred=True,
+        )
+
+    def _record(
+        self,
+        attachment: Attachment,
+        path: Path,
+        save_dir: Path,
+        stored: StoredFile,
+        unchanged: bool = False,
+    ) -> AttachmentFile:
+        return AttachmentFile(
+            name=attachment.name or path.name,
+            path=Path(save_dir.name) / path.relative_to(save_dir),
+            size_bytes=stored.size,
+            sha256=stored.sha256,
+            blake3=stored.blake3,
+            unchanged=unchanged,
+        )
+
+    async def _download_http(
+        self,
+        attachment: Attachment,
+        url: str,
+        save_dir: Path,
+        progress: ProgressCallback | None = None,
+        category: str | None = None,
+    ) -> tuple[Path, StoredFile, bool]:
+        filename = Path(attachment.name or urlparse(url).path).name
+        final_path = save_dir / filename
+        temp_path = final_path.with_suffix(final_path.suffix + ".part")
+        transfer = _Transfer(self.blake3)
+
+        if self.budget and attachment.size_bytes is not None:
+            self.budget.check(category, attachment.size_bytes)
+
+        upload = self.sink.open_upload(final_path) if self.sink else None
+        stored = self.sink.stored(final_path) if self.sink else None
+        try:
+            try:
+                if upload is not None:
+                    await self._fetch(url, upload, transfer, attachment, progress, category, stored)
+                else:
+                    with temp_path.open("wb", buffering=self.chunk_size) as f:
+                        out = _FileWriter(f)
+                        await self._fetch(
+                            url, out, transfer, attachment, progress, category, stored
+                        )
+                        f.truncate(transfer.downloaded)
+                        if self.fsync != "none":
+                            f.flush()
+                            os.fsync(f.fileno())
+            except _AlreadyStoredError:
+                if self.budget:
+                    self.budget.charge(category, stored.size - transfer.reserved)
+                    transfer.reserved = stored.size
+                if upload is not None:
+                    await upload.finish(stored)
+                else:
+                    temp_path.unlink(missing_ok=True)
+                logger.info("Unchanged HTTP file: %s", final_path)
+                return final_path, stored, True
+        except BaseException:
+            if transfer.reserved:
+                self.budget.charge(category, -transfer.reserved)
+            if upload is not None:
+                await upload.abort()
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        if self.budget and not transfer.reserved:
+            self.budget.charge(category, transfer.downloaded)
+
+        hasher = transfer.hasher
+        downloaded = StoredFile(
+            size=transfer.downloaded,
+            sha256=hasher.sha256,
+            blake3=hasher.blake3,
+            validator=transfer.source,
+        )
+        if upload is not None:
+            unchanged = not await upload.finish(downloaded)
+            logger.info("%s HTTP file: %s", "Unchanged" if unchanged else "Uploaded", final_path)
+            return final_path, downloaded, unchanged
+
+        if self.sink:
+            self.sink.keep(final_path, downloaded)
+        if await self._same_content(final_path, downloaded):
+            # Keep the existing file, and its mtime, so mirrors and backups see no change
+            temp_path.unlink()
+            logger.info("Unchanged HTTP file: %s", final_path)
+            return final_path, downloaded, True
+
+        temp_path.replace(final_path)
+        if self.fsync == "full":
+            fsync_dir(save_dir)
+        if self.digests and STATE_DIR_NAME not in final_path.parts:
+            # Staged folders move before the next run, so only final paths are worth keeping
+            self.digests.put(final_path, downloaded.sha256)
+
+        logger.info("Downloaded HTTP file: %s", final_path)
+        return final_path, downloaded, False
+
+    async def _same_content(self, existing: Path, downloaded: StoredFile) -> bool:
+        recorded = self.digests.get(existing) if self.digests else None
+        if recorded is not None:
+            return recorded == (downloaded.size, downloaded.sha256)
+        same = await asyncio.to_thread(
+            same_content, existing, downloaded.size, downloaded.sha256, self.chunk_size
+        )
+        if same and self.digests:
+            self.digests.put(existing, downloaded.sha256)
+        return same
+
+    async def _fetch(
+        self,
+        url: str,
+        out: AttachmentUpload,
+        transfer: "_Transfer",
+        attachment: Attachment,
+        progress: ProgressCallback | None,
+        category: str | None,
+        stored: StoredFile | None = None,
+    ):
+        for attempt in itertools.count():
+            try:
+                await self._request_into(url, out, transfer, attachment, progress, category, stored)
+                return
+            except (StalledDownloadError, httpx.ReadTimeout) as e:
+                if attempt >= self.restarts:
+                    raise
+                logger.info(
+                    "Download of %s stalled after %d bytes (%s), restarting",
+                    url,
+                    transfer.downloaded,
+                    e or type(e).__name__,
+                )
+
+    async def _request_into(
+        self,
+        url: str,
+        out: AttachmentUpload,
+        transfer: "_Transfer",
+        attachment: Attachment,
+        progress: ProgressCallback | None,
+        category: str | None,
+        stored: StoredFile | None = None,
+    ):
+        """Run one request for an attachment, continuing where a stalled one stopped."""
+        headers = {}
+        if transfer.downloaded and transfer.validator:
+            headers["Range"] = f"bytes={transfer.downloaded}-"
+            headers["If-Range"] = transfer.validator
+        elif stored and stored.validator:
+            is_etag = stored.validator.startswith('"')
+            headers["If-None-Match" if is_etag else "If-Modified-Since"] = stored.validator
+
+        async with self.http.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                raise _AlreadyStoredError
+            response.raise_for_status()
+            if transfer.downloaded and response.status_code != 206:
+                # No range support, or the file changed since: start over
+                transfer.restart()
+                await out.restart()
+
+            if not transfer.downloaded:
+                total_size = int(response.headers.get("Content-Length", 0))
+                # Content-Length counts encoded bytes, which is not what ends up on disk
+                size_is_exact = "Content-Encoding" not in response.headers
+                transfer.total = total_size if size_is_exact else 0
+                transfer.source = origin_validator(response.headers)
+                if stored and transfer.total == stored.size and transfer.source == stored.validator:
+                    # Same validator and size, or no validator on either side and the
+                    # same size: the body would not change what the sink holds
+                    raise _AlreadyStoredError
+                # Only strong validators make a range request safe to resume from
+                if size_is_exact and response.headers.get("Accept-Ranges") == "bytes":
+                    transfer.validator = transfer.source
+
+                if self.budget and not transfer.reserved:
+                    if size_is_exact and total_size:
+                        try:
+                            self.budget.check(category, total_size)
+                        except AttachmentDeferredError as e:
+                            e.sha256 = announced_sha256(response.headers)
+                            raise
+                        self.budget.charge(category, total_size)
+                        transfer.reserved = total_size
+                    else:
+                        transfer.limit = self.budget.limit_for(category)
+
+                if size_is_exact:
+                    out.expect(total_size)
+
+            await self._stream_to_file(response, out, transfer, attachment, progress)
+
+    async def _next_chunk(self, chunks: AsyncIterator[bytes], response: httpx.Response) -> bytes:
+        if self.stall_timeout is None:
+            return await anext(chunks)
+        # Waiting for --max-bandwidth is not a stall, so the clock stops while it lasts
+        read = asyncio.ensure_future(anext(chunks))
+        paused = paused_seconds(response)
+        timeout = self.stall_timeout
+        try:
+            while True:
+                done, _ = await asyncio.wait({read}, timeout=timeout)
+                if done:
+                    return read.result()
+                timeout = paused_seconds(response) - paused
+                paused += timeout
+                if timeout <= 0:
+                    raise StalledDownloadError(f"no data for {self.stall_timeout:g}s")
+        finally:
+            if not read.done():
+                read.cancel()
+                with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                    await read
+
+    async def _stream_to_file(
+        self,
+        response: httpx.Response,
+        out: AttachmentUpload,
+        transfer: "_Transfer",
+        attachment: Attachment,
+        progress: ProgressCallback | None,
+    ):
+        start_time = time.monotonic()
+        start_bytes = reported = transfer.downloaded
+        total_size = transfer.total
+
+        # Network-sized pieces, so a stall shows up even while a large chunk is filling;
+        # the file buffer still writes in chunk_size blocks
+        chunks = response.aiter_bytes().__aiter__()
+        while True:
+            try:
+                chunk = await self._next_chunk(chunks, response)
+            except StopAsyncIteration:
+                break
+            await out.write(chunk)
+            transfer.hasher.update(chunk)
+            transfer.downloaded += len(chunk)
+            downloaded = transfer.downloaded
+            if transfer.limit is not None and downloaded > transfer.limit:
+                raise AttachmentDeferredError(
+                    "exceeds the attachment size budget",
+                    transfer.total or None,
+                    # A partial response's digest would only cover its range
+                    announced_sha256(response.headers) if response.status_code == 200 else None,
+                )
+
+            if (
+                progress
+                and total_size > 0
+                and (downloaded - reported >= self.chunk_size or downloaded >= total_size)
+            ):
+                reported = downloaded
+                elapsed = time.monotonic() - start_time
+                speed_bps = (downloaded - start_bytes) / elapsed if elapsed > 0 else 0.0
+                await progress(
+                    ProgressData(
+                        attachment=attachment,
+                        downloaded_bytes=min(downloaded, total_size),
+                        total_bytes=total_size,
+                        percentage=min(downloaded / total_size, 1.0) * 100,
+                        speed_bps=speed_bps,
+                        eta_seconds=(
+                            (total_size - downloaded) / speed_bps
+                            if speed_bps > 0 and downloaded < total_size
+                            else None
+                        ),
+                    )
+                )
+
+    def _normalize_url(self, url: str) -> str:
+        return absolute_url(self.client, url)
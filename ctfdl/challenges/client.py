@@ -1,8 +1,42 @@
+import httpx
 from ctfbridge import create_client
+from ctfbridge.base.client import CTFClient
+from ctfbridge.models.challenge import Challenge
+from ctfbridge.processors.enrich import enrich_challenge
+from pydantic import BaseModel
 
+from ctfdl.core.config import ExportConfig
+from ctfdl.rendering.engine import TemplateEngine
 
-async def get_authenticated_client(url: str, username=None, password=None, token=None):
-    client = await create_client(url)
+# Fields that listing requests carry on the supported platforms
+LISTING_FIELDS = frozenset(
+    {"id", "name", "categories", "category", "subcategory", "value", "solved"}
+)
+# Fields ctfbridge's enrichment parsers derive, mostly from the description
+ENRICHED_FIELDS = frozenset(
+    {
+        "normalized_categories",
+        "normalized_category",
+        "services",
+        "service",
+        "has_services",
+        "authors",
+        "author",
+        "attachments",
+        "has_attachments",
+    }
+)
+
+
+async def get_authenticated_client(
+    url: str,
+    username=None,
+    password=None,
+    token=None,
+    http: httpx.AsyncClient | None = None,
+    cache_platform: bool = True,
+):
+    client = await create_client(url, http=http, cache_platform=cache_platform)
 
     if username and password:
         await client.auth.login(username=username, password=password)
@@ -12,3 +46,50 @@ async def get_authenticated_client(url: str, username=None, password=None, token
         pass
 
     return client
+
+
+class FetchPlan(BaseModel):
+    """Which requests an export needs, derived from the challenge fields it uses."""
+
+    details: bool = True
+    enrich: bool = True
+
+    @classmethod
+    def for_fields(cls, fields: set[str] | None) -> "FetchPlan":
+        if fields is None:
+            return cls()
+        return cls(details=not fields <= LISTING_FIELDS, enrich=bool(fields & ENRICHED_FIELDS))
+
+    @classmethod
+    def for_export(cls, config: ExportConfig, engine: TemplateEngine) -> "FetchPlan":
+        # One fetch serves every output tree, so it must carry what any of them reads
+        fields: set[str] | None = set()
+        variants = [(config.variant_name, config.index_template_name)] + [
+            (extra.variant_name, extra.index_template_name) for extra in config.extra_outputs
+        ]
+        for variant_name, index_template_name in variants:
+            found = engine.referenced_fields(
+                variant_name,
+                config.folder_template_name,
+                None if config.no_index else index_template_name or "grouped",
+            )
+            if found is None:
+                fields = None
+                break
+            fields |= found
+        # The search index takes whatever was fetched, so it never costs a request
+        if fields is not None and not config.no_attachments:
+            fields.add("attachments")
+        return cls.for_fields(fields)
+
+
+async def fetch_challenge_details(
+    client: CTFClient, stub: Challenge, enrich: bool = True
+) -> Challenge:
+    """Turn a listing record into a detailed, optionally enriched challenge."""
+    if getattr(client.challenges, "base_has_details", False):
+        # The listing already carried everything; asking again would refetch the whole list.
+        return stub
+    # Platforms that fetch details separately ignore `enrich`, so it is applied here
+    detail = await client.challenges.get_by_id(stub.id, enrich=False)
+    return enrich_challenge(detail) if enrich else detail
@@ -0,0 +1,136 @@
+import base64
+import binascii
+import json
+from pathlib import Path
+
+import httpx
+from ctfbridge.models.challenge import Attachment
+
+DEFERRED_SUFFIX = ".deferred"
+
+
+class AttachmentDeferredError(Exception):
+    """Raised when an attachment is too large to download now and is left as a stub."""
+
+    def __init__(self, reason: str, size_bytes: int | None = None, sha256: str | None = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.size_bytes = size_bytes
+        self.sha256 = sha256
+
+
+def announced_sha256(headers: httpx.Headers) -> str | None:
+    """
+    The SHA-256 a server states for a response body, as hex, if it states one.
+
+    That is the `Repr-Digest`/`Content-Digest` headers of RFC 9530, the older `Digest`
+    header, or S3's `x-amz-checksum-sha256`. Encoded bodies are skipped, as their
+    digest may be of the encoded bytes.
+    """
+    if headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    candidates = [headers.get("x-amz-checksum-sha256")]
+    for name in ("Repr-Digest", "Content-Digest", "Digest"):
+        for item in headers.get(name, "").split(","):
+            algorithm, _, value = item.strip().partition("=")
+            if algorithm.lower() == "sha-256":
+                candidates.append(value.strip(":"))
+    for value in filter(None, candidates):
+        try:
+            digest = base64.b64decode(value, validate=True)
+        except binascii.Error:
+            continue
+        if len(digest) == 32:
+            return digest.hex()
+    return None
+
+
+class AttachmentBudget:
+    """
+    Tracks the per-file size limit and the per-category byte budgets of an export.
+
+    Files with a known size are charged before they download. Files whose size is only
+    discovered while streaming are charged afterwards, so concurrent downloads of
+    unknown size can overshoot a category budget by at most one file each.
+    """
+
+    def __init__(self, max_size: int | None, category_budgets: dict[str, int] | None):
+        self.max_size = max_size
+        self.remaining = dict(category_budgets or {})
+
+    def limit_for(self, category: str | None) -> int | None:
+        limits = [self.max_size, self.remaining.get(category or "")]
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
+
+    def check(self, category: str | None, size_bytes: int):
+        if self.max_size is not None and size_bytes > self.max_size:
+            raise AttachmentDeferredError("exceeds --max-attachment-size", size_bytes)
+        remaining = self.remaining.get(category or "")
+        if remaining is not None and size_bytes > remaining:
+            raise AttachmentDeferredError(f"exceeds the '{category}' category budget", size_bytes)
+
+    def charge(self, category: str | None, size_bytes: int):
+        if (category or "") in self.remaining:
+            self.remaining[category or ""] -= size_bytes
+
+
+def stub_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + DEFERRED_SUFFIX)
+
+
+def write_stub(
+    file_path: Path,
+    attachment: Attachment,
+    url: str,
+    reason: str,
+    size_bytes: int | None = None,
+    sha256: str | None = None,
+    platform_url: str | None = None,
+) -> Path:
+    """
+    Write a small JSON stub describing where a deferred attachment can be fetched from.
+
+    `platform_url` is the platform the export logged in to, so `ctf-dl fetch` can log
+    in again when the file needs the session.
+    """
+    path = stub_path(file_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    stub = {
+        "name": attachment.name or file_path.name,
+        "url": url,
+        "size_bytes": size_bytes if size_bytes is not None else attachment.size_bytes,
+        "sha256": sha256,
+        "reason": reason,
+        "platform_url": platform_url,
+    }
+    path.write_text(json.dumps(stub, indent=2), encoding="utf-8")
+    return path
+
+
+def read_stub(path: Path) -> dict:
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def expand_pattern(pattern: str) -> list[Path]:
+    path = Path(pattern)
+    if not any(c in pattern for c in "*?["):
+        return [path]
+    root = Path(path.anchor) if path.is_absolute() else Path()
+    return sorted(root.glob(str(path.relative_to(root)) if path.is_absolute() else pattern))
+
+
+def find_stubs(patterns: list[str]) -> list[Path]:
+    """Resolve paths, directories and glob patterns to the deferred stubs they cover."""
+    stubs: dict[Path, None] = {}
+    for pattern in patterns:
+        # Globs usually name the real file, which does not exist yet; match its stub too
+        for match in expand_pattern(pattern) + expand_pattern(pattern + DEFERRED_SUFFIX):
+            if match.is_dir():
+                for stub in sorted(match.rglob(f"*{DEFERRED_SUFFIX}")):
+                    stubs[stub] = None
+            elif match.name.endswith(DEFERRED_SUFFIX) and match.is_file():
+                stubs[match] = None
+            elif stub_path(match).is_file():
+                stubs[stub_path(match)] = None
+    return list(stubs)
@@ -0,0 +1,85 @@
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_FILE = "digests.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+def _stamp(stat: os.stat_result) -> tuple[int, int, int]:
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class DigestCache:
+    """
+    SHA-256 of the attachments in an output folder, keyed by path.
+
+    A digest is only trusted while the file keeps the size, mtime and inode it had when
+    the digest was recorded, so `--update` hashes a file again only after something
+    outside ctf-dl changed it. Any database error turns the cache off for the rest of
+    the run, since hashing without it is only slower.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._db: sqlite3.Connection | None = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+
+    def get(self, file: Path) -> tuple[int, str] | None:
+        """Size and digest of `file`, if one was recorded and the file has not changed since."""
+        if self._db is None:
+            return None
+        try:
+            stamp = _stamp(file.stat())
+        except FileNotFoundError:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT sha256 FROM digests WHERE path = ? AND size = ? AND mtime_ns = ? "
+                "AND inode = ?",
+                (str(file.absolute()), *stamp),
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._disable(e)
+            return None
+        return (stamp[0], row[0]) if row else None
+
+    def put(self, file: Path, sha256: str):
+        if self._db is None:
+            return
+        try:
+            stamp = _stamp(file.stat())
+        except FileNotFoundError:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)",
+                (str(file.absolute()), *stamp, sha256),
+            )
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def _disable(self, error: sqlite3.Error):
+        logger.warning("Attachment digest cache %s disabled: %s", self.path, error)
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,6 +1,11 @@
 import asyncio
+import logging
+import shutil
+import time
+from collections import deque
 from pathlib import Path
 
+import httpx
 from ctfbridge.base.client import CTFClient
 from ctfbridge.exceptions import (
     LoginError,
@@ -9,28 +14,79 @@ from ctfbridge.exceptions import (
     UnknownBaseURLError,
     UnknownPlatformError,
 )
-from ctfbridge.models.challenge import Challenge, ProgressData
+from ctfbridge.models.challenge import Challenge, DownloadType, ProgressData
 
-from ctfdl.challenges.client import get_authenticated_client
+from ctfdl.challenges.attachments import AttachmentDownloader, absolute_url
+from ctfdl.challenges.client import (
+    FetchPlan,
+    fetch_challenge_details,
+    get_authenticated_client,
+)
+from ctfdl.challenges.deferred import AttachmentBudget
+from ctfdl.challenges.digests import DIGESTS_FILE, DigestCache
+from ctfdl.challenges.dry_run import plan_export, probe_size
+from ctfdl.challenges.extractor import ArchiveExtractor, ExtractLimits
+from ctfdl.challenges.filters import ChallengeFilter
+from ctfdl.challenges.journal import RunJournal, journal_path
+from ctfdl.challenges.manifest import FolderManifest
+from ctfdl.challenges.planner import (
+    STAGING_DIR,
+    PathPlan,
+    commit_staged,
+    discard_folder,
+    link_tree,
+    staging_dir,
+    unstage_paths,
+)
+from ctfdl.challenges.scheduler import ChallengeScheduler
+from ctfdl.challenges.shard import shard_of
+from ctfdl.common.deadline import hedged, with_deadline
+from ctfdl.common.ratelimit import BandwidthLimiter
+from ctfdl.common.transport import make_download_client, make_platform_client
 from ctfdl.core import EventEmitter, ExportConfig
 from ctfdl.core.models import ChallengeEntry
-from ctfdl.rendering.context import TemplateEngineContext
 from ctfdl.rendering.engine import TemplateEngine
 
+logger = logging.getLogger(__name__)
+
+
+async def download_challenges(
+    config: ExportConfig,
+    emitter: EventEmitter,
+    template_engine: TemplateEngine,
+    limiter: BandwidthLimiter | None = None,
+) -> tuple[bool, list]:
+    # One pooled client carries detection, login and every API request of the run
+    limiter = limiter or BandwidthLimiter.from_profile(config.transport)
+    platform_http = make_platform_client(config.transport, limiter)
+    try:
+        return await _download_challenges(config, emitter, template_engine, platform_http, limiter)
+    finally:
+        await platform_http.aclose()
+
 
-async def download_challenges(config: ExportConfig, emitter: EventEmitter) -> tuple[bool, list]:
+async def connect(
+    config: ExportConfig, emitter: EventEmitter, platform_http: httpx.AsyncClient
+) -> CTFClient | None:
+    """Detect the platform and log in, reporting failures as `connect_fail` events."""
     try:
         await emitter.emit("connect_start", url=config.url)
         client = await get_authenticated_client(
-            config.url, config.username, config.password, config.token
+            config.url,
+            config.username,
+            config.password,
+            config.token,
+            http=platform_http,
+            # Cassettes must contain platform detection, so never answer it from the cache
+            cache_platform=not config.transport.cassette,
         )
         await emitter.emit("connect_success")
+        return client
     except UnknownPlatformError:
         await emitter.emit(
             "connect_fail",
             reason="Unsupported platform. You may suggest adding support here: https://github.com/bjornmorten/ctfbridge/issues",
         )
-        return False, []
     except UnknownBaseURLError:
         await emitter.emit(
             "connect_fail",
@@ -40,119 +96,437 @@ async def download_challenges(config: ExportConfig, emitter: EventEmitter) -> tu
                 "https://github.com/bjornmorten/ctfbridge/issues"
             ),
         )
-        return False, []
     except LoginError:
         await emitter.emit("connect_fail", reason="Authentication failed")
-        return False, []
     except MissingAuthMethodError:
         await emitter.emit("connect_fail", reason="Invalid authentication type")
-        return False, []
+    return None
 
-    challenges_iterator = client.challenges.iter_all(
-        categories=config.categories,
-        min_points=config.min_points,
-        max_points=config.max_points,
-        solved=True if config.solved else False if config.unsolved else None,
-        detailed=True,
-        enrich=True,
-    )
 
-    template_engine = TemplateEngineContext.get()
-    output_dir = config.output
-    output_dir.mkdir(parents=True, exist_ok=True)
-    all_challenges_data = []
+class ChallengeExporter:
+    """Exports single challenges: details, attachments, extraction and rendering."""
 
-    sem = asyncio.Semaphore(config.parallel)
-    tasks = []
-    challenge_count = 0
+    def __init__(
+        self,
+        client: CTFClient,
+        config: ExportConfig,
+        emitter: EventEmitter,
+        template_engine: TemplateEngine,
+        budget: AttachmentBudget | None = None,
+        extract_workers: int | None = None,
+        limiter: BandwidthLimiter | None = None,
+    ):
+        self.client = client
+        self.config = config
+        self.emitter = emitter
+        self.filter = ChallengeFilter(config)
+        self.template_engine = template_engine
+        self.fetch_plan = FetchPlan.for_export(config, self.template_engine)
+        self.http = make_download_client(config.transport, limiter)
+        if budget is None and (config.max_attachment_size is not None or config.category_budgets):
+            budget = AttachmentBudget(config.max_attachment_size, config.category_budgets)
+        self.downloader = AttachmentDownloader(
+            client,
+            self.http,
+            chunk_size=config.chunk_size,
+            fsync=config.fsync,
+            blake3=config.blake3,
+            budget=budget,
+            stall_timeout=config.deadlines.stall,
+            restarts=config.deadlines.restarts,
+            # Extraction reads the archives from disk, so they cannot go straight to a sink
+            sink=None if config.extract else template_engine.sink,
+            # Only updates find earlier downloads in place in the output folder
+            digests=DigestCache(config.state_dir / DIGESTS_FILE)
+            if config.update and template_engine.sink.stages_folders
+            else None,
+        )
+        self.extractor = (
+            ArchiveExtractor(
+                ExtractLimits(
+                    max_total_size=config.extract_max_size,
+                    max_files=config.extract_max_files,
+                    max_ratio=config.extract_max_ratio,
+                ),
+                workers=extract_workers or config.extract_workers,
+            )
+            if config.extract
+            else None
+        )
 
-    async def process(chal: Challenge):
+    async def export(
+        self, stub: Challenge, rel_path: str, existed_before: bool
+    ) -> ChallengeEntry | None:
+        emitter = self.emitter
         try:
-            await emitter.emit("challenge_start", challenge=chal)
-
-            entry = await process_challenge(
-                client,
-                emitter,
-                chal,
-                template_engine,
-                config,
-                output_dir,
+            await emitter.emit("challenge_start", challenge=stub)
+            entry = await with_deadline(
+                self._export(stub, rel_path, existed_before),
+                self.config.deadlines.challenge,
+                "challenge",
             )
             if entry:
-                all_challenges_data.append(entry)
-            await emitter.emit("challenge_success", challenge=chal)
+                await emitter.emit("challenge_exported", entry=entry)
+            await emitter.emit("challenge_success", challenge=stub)
+            return entry
         except Exception as e:
-            await emitter.emit("challenge_fail", challenge=chal, reason=str(e))
+            await emitter.emit("challenge_fail", challenge=stub, reason=str(e))
+            return None
         finally:
-            await emitter.emit("challenge_complete", challenge=chal)
+            await emitter.emit("challenge_complete", challenge=stub)
+
+    async def _details(self, stub: Challenge) -> Challenge:
+        # Phase 2: details are only fetched for the selected challenges, and only when
+        # the templates render more than the listing carries or a filter needs them.
+        if not self.fetch_plan.details and self.filter.matches(stub, strict=True):
+            return stub
+        deadlines = self.config.deadlines
+        return await with_deadline(
+            hedged(
+                lambda: fetch_challenge_details(self.client, stub, enrich=self.fetch_plan.enrich),
+                deadlines.hedge_after,
+            ),
+            deadlines.request,
+            "detail request",
+        )
 
-    async def worker(chal: Challenge):
-        async with sem:
-            await process(chal)
+    async def fetch_sizes(
+        self, queued: list[tuple[Challenge, tuple[Challenge, str, bool]]]
+    ) -> list[tuple[Challenge, tuple[Challenge, str, bool]]]:
+        """
+        Fetch the details of queued work up front, with HEAD requests for attachment
+        sizes they do not give, so the `size` policy orders by what will be downloaded.
+
+        The work then carries the detailed challenges, which `export` uses as they are.
+        Challenges whose details fail are reported and dropped, as during an export.
+        """
+        semaphore = asyncio.Semaphore(self.config.parallel)
+
+        async def sized(stub: Challenge, item: tuple[Challenge, str, bool]):
+            async with semaphore:
+                try:
+                    chal = await self._details(stub)
+                except Exception as e:
+                    await self.emitter.emit("challenge_fail", challenge=stub, reason=str(e))
+                    return None
+                if not self.filter.matches(chal, strict=True):
+                    return None
+                attachments = []
+                for att in chal.attachments:
+                    info = att.download_info
+                    if att.size_bytes is None and info.type == DownloadType.HTTP and info.url:
+                        url = absolute_url(self.client, info.url)
+                        att = att.model_copy(
+                            update={"size_bytes": await probe_size(self.http, url)}
+                        )
+                    attachments.append(att)
+            chal = chal.model_copy(
+                update={
+                    "attachments": chal.attachments.model_copy(update={"attachments": attachments})
+                }
+            )
+            _, rel_path, existed_before = item
+            return chal, (chal, rel_path, existed_before)
+
+        results = await asyncio.gather(*(sized(stub, item) for stub, item in queued))
+        return [result for result in results if result is not None]
+
+    async def _export(
+        self, stub: Challenge, rel_path: str, existed_before: bool
+    ) -> ChallengeEntry | None:
+        # With the size policy, the work already carries the details
+        chal = stub if self.config.schedule == "size" else await self._details(stub)
+        if not self.filter.matches(chal, strict=True):
+            if not existed_before:
+                discard_folder(self.config.output / rel_path)
+            return None
+
+        return await process_challenge(
+            self.downloader,
+            self.extractor,
+            self.emitter,
+            chal,
+            self.template_engine,
+            self.config,
+            self.config.output,
+            rel_path,
+            existed_before,
+        )
+
+    async def aclose(self):
+        await self.http.aclose()
+        if self.downloader.digests:
+            self.downloader.digests.close()
+        if self.extractor:
+            self.extractor.shutdown()
+
+
+async def _download_challenges(
+    config: ExportConfig,
+    emitter: EventEmitter,
+    template_engine: TemplateEngine,
+    platform_http: httpx.AsyncClient,
+    limiter: BandwidthLimiter | None = None,
+) -> tuple[bool, list]:
+    # The run budget counts from the start, so connecting and listing are part of it
+    budget = config.deadlines.run_budget
+    deadline = time.monotonic() + budget if budget is not None else None
+
+    client = await connect(config, emitter, platform_http)
+    if client is None:
+        return False, []
+
+    fetch_plan = FetchPlan.for_export(config, template_engine)
+    logger.debug("Fetch plan: %s", fetch_plan)
+
+    # Phase 1: the cheap listing. Every local filter, and the "already in output" skip,
+    # runs on these light records so that only survivors cost a detail request.
+    challenges_iterator = client.challenges.iter_all(detailed=False, enrich=fetch_plan.enrich)
+    challenge_filter = ChallengeFilter(config)
+
+    output_dir = config.output
+    if not config.dry_run:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    scheduler = ChallengeScheduler(
+        config.schedule, config.category_priority, config.category_weights
+    )
+    listed: list[Challenge] = []
+    queued: list[tuple[Challenge, tuple[Challenge, str, bool]]] = []
 
     await emitter.emit("fetch_start")
 
     try:
-        started = False
-        async for chal in challenges_iterator:
-            if not started:
-                await emitter.emit("download_start")
-                started = True
-
-            challenge_count += 1
-            task = asyncio.create_task(worker(chal))
-            tasks.append(task)
+        async for stub in challenges_iterator:
+            listed.append(stub)
     except NotAuthenticatedError:
         await emitter.emit("authentication_required")
         return False, []
 
-    if challenge_count == 0:
+    sink = template_engine.sink
+    # Exports into a temporary folder (zip, git) cannot be resumed
+    journal = (
+        RunJournal(journal_path(config), fsync=config.fsync != "none")
+        if sink.stages_folders and not config.zip_output
+        else None
+    )
+    resumed = journal.interrupted(config.url) if journal and config.resume else None
+
+    # Folders are planned over the whole listing, not just the filtered part, so
+    # collision suffixes stay the same whichever filters a run uses.
+    plan = PathPlan.build(
+        output_dir,
+        listed,
+        lambda chals: template_engine.render_paths(config.folder_template_name, chals),
+        existing=sink.existing_dirs(),
+    )
+
+    selected = [stub for stub in listed if challenge_filter.matches(stub)]
+    if config.shard:
+        index, count = config.shard
+        selected = [stub for stub in selected if shard_of(stub, count) == index]
+    if not selected:
         await emitter.emit("no_challenges_found")
         await emitter.emit("download_complete")
         return False, []
 
-    await asyncio.gather(*tasks)
+    # Folders the manifest knows under another path are moved instead of downloaded again.
+    # Shards share the output folder, so only unsharded runs keep a manifest.
+    manifest = None
+    if sink.stages_folders and not config.zip_output and not config.shard:
+        manifest = FolderManifest.for_export(config)
+        relocation = manifest.relocate(
+            plan,
+            listed,
+            selected,
+            [output_dir] + [extra.output for extra in config.extra_outputs],
+            prune=config.prune,
+            dry_run=config.dry_run,
+        )
+        if relocation.moved or relocation.orphans:
+            await emitter.emit("folders_relocated", relocation=relocation)
+
+    # An interrupted run's unfinished challenges keep the folders it planned for them, and
+    # the ones it finished count as done; the rest of the selection is planned as usual,
+    # so new filters, --update and newly released challenges still apply
+    pending = resumed.pending if resumed else {}
+    finished = {str(entry.data.id) for entry in resumed.entries} if resumed else set()
+    skipped: list[Challenge] = []
+    for stub in selected:
+        if str(stub.id) in pending:
+            item = pending[str(stub.id)]
+            queued.append((stub, (stub, item.path, item.existed_before)))
+            continue
+        if str(stub.id) in finished:
+            skipped.append(stub)
+            continue
+        existed_before = plan.exists(stub)
+        if existed_before and not config.update:
+            skipped.append(stub)
+            continue
+        queued.append((stub, (stub, plan.path_for(stub), existed_before)))
+
+    if config.dry_run:
+        async with make_download_client(config.transport, limiter) as http:
+            export_plan = await plan_export(
+                client, config, fetch_plan, [item for _, item in queued], skipped, http
+            )
+        await emitter.emit("export_planned", plan=export_plan)
+        await emitter.emit("download_complete")
+        return False, []
+
+    await emitter.emit("download_start")
+    for stub in skipped:
+        await emitter.emit("challenge_skipped", challenge=stub)
+
+    if config.schedule == "size":
+        # Listings rarely carry attachments, so sizes are only known after the details
+        exporter = ChallengeExporter(client, config, emitter, template_engine, limiter=limiter)
+        try:
+            queued = await exporter.fetch_sizes(queued)
+        finally:
+            await exporter.aclose()
+
+    if not sink.stages_folders:
+        plan.create(stub for stub, _ in queued)
+    work = scheduler.order(queued)
+
+    if manifest:
+        emitter.subscribe(manifest)
+    if journal:
+        if resumed:
+            await emitter.emit("run_resumed", finished=len(resumed.entries), remaining=len(work))
+        journal.begin(config.url, work, resumed.entries if resumed else [])
+        emitter.subscribe(journal)
+
+    try:
+        if config.workers > 1 and len(work) > 1:
+            from ctfdl.challenges.workers import run_worker_pool
+
+            all_challenges_data, left = await run_worker_pool(config, emitter, work, deadline)
+        else:
+            all_challenges_data, left = await _export_in_process(
+                client, config, emitter, template_engine, deque(work), deadline, limiter
+            )
+    finally:
+        if journal:
+            journal.close()
+
+    if resumed:
+        all_challenges_data = resumed.entries + all_challenges_data
+    if left:
+        # The journal stays, so the next run picks up exactly what was left
+        await emitter.emit("time_budget_exhausted", left=[stub for stub, _, _ in left])
+    elif journal:
+        journal.end()
+    discard_folder(config.state_dir / STAGING_DIR)
 
     await emitter.emit("download_complete")
     return True, all_challenges_data
 
 
-async def process_challenge(
+async def _export_in_process(
     client: CTFClient,
+    config: ExportConfig,
+    emitter: EventEmitter,
+    template_engine: TemplateEngine,
+    work: deque[tuple[Challenge, str, bool]],
+    deadline: float | None = None,
+    limiter: BandwidthLimiter | None = None,
+) -> tuple[list[ChallengeEntry], list[tuple[Challenge, str, bool]]]:
+    """Export the work in this process; returns the entries and the work left at the deadline."""
+    exporter = ChallengeExporter(client, config, emitter, template_engine, limiter=limiter)
+    entries = []
+
+    async def worker():
+        # Past the deadline no new challenge starts, and running ones finish normally
+        while work and (deadline is None or time.monotonic() < deadline):
+            entry = await exporter.export(*work.popleft())
+            if entry:
+                entries.append(entry)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(config.parallel, len(work)))))
+    finally:
+        await exporter.aclose()
+    return entries, list(work)
+
+
+async def process_challenge(
+    downloader: AttachmentDownloader,
+    extractor: ArchiveExtractor | None,
     emitter: EventEmitter,
     chal: Challenge,
     template_engine: TemplateEngine,
     config: ExportConfig,
     output_dir: Path,
+    rel_path_str: str,
+    existed_before: bool,
 ):
-    rel_path_str = template_engine.render_path(config.folder_template_name, chal)
     chal_folder = output_dir / rel_path_str
-
-    existed_before = chal_folder.exists()
-
-    if existed_before and not config.update:
-        await emitter.emit("challenge_skipped", challenge=chal)
-        return
+    sink = template_engine.sink
+    # New challenges are built aside, so a crash never leaves a half-written folder that
+    # later runs would take for a finished one
+    staged = sink.stages_folders and not existed_before
+    build_folder = staging_dir(output_dir, chal) if staged else chal_folder
+    if staged:
+        await asyncio.to_thread(shutil.rmtree, build_folder, True)
 
     async def progress_callback(pd: ProgressData):
         await emitter.emit("attachment_progress", progress_data=pd, challenge=chal)
 
-    chal_folder.mkdir(parents=True, exist_ok=True)
-    if not config.no_attachments and chal.attachments:
-        files_dir = chal_folder / "files"
-        files_dir.mkdir(exist_ok=True)
-        chal = await client.attachments.download_all(
-            chal,
-            save_dir=str(files_dir),
-            progress=progress_callback,
-            concurrency=config.parallel,
-        )
-    template_engine.render_challenge(config.variant_name, chal, chal_folder)
+    try:
+        files = []
+        if not config.no_attachments and chal.attachments:
+            chal, files = await downloader.download_all(
+                chal,
+                save_dir=build_folder / "files",
+                progress=progress_callback,
+                concurrency=config.parallel,
+            )
+            if staged:
+                chal = unstage_paths(chal, build_folder, chal_folder)
+        written = template_engine.render_challenge(config.variant_name, chal, build_folder, files)
+
+        if extractor and files:
+            for result in await extractor.extract_all(build_folder, files):
+                if result.status == "rejected":
+                    await emitter.emit("archive_rejected", challenge=chal, result=result)
+                elif result.status == "extracted":
+                    await emitter.emit("archive_extracted", challenge=chal, result=result)
+
+        if staged:
+            await asyncio.to_thread(commit_staged, build_folder, chal_folder)
+    except BaseException:
+        if staged:
+            await asyncio.to_thread(shutil.rmtree, build_folder, True)
+        sink.discard_folder(chal_folder)
+        raise
 
-    await emitter.emit("challenge_downloaded", challenge=chal, updated=existed_before)
+    # Further output trees render the same data and share the attachments through links
+    for extra in config.extra_outputs:
+        extra_folder = extra.output / rel_path_str
+        if (chal_folder / "files").is_dir():
+            written += await asyncio.to_thread(
+                link_tree, chal_folder / "files", extra_folder / "files"
+            )
+        written += template_engine.render_challenge(extra.variant_name, chal, extra_folder, files)
+
+    for file in files:
+        if file.deferred:
+            await emitter.emit("attachment_deferred", challenge=chal, file=file)
+
+    await asyncio.to_thread(sink.finish_folder, chal_folder)
+    unchanged = (
+        existed_before and not written and all(file.unchanged or file.deferred for file in files)
+    )
+    await emitter.emit(
+        "challenge_downloaded", challenge=chal, updated=existed_before, unchanged=unchanged
+    )
 
     return ChallengeEntry(
         data=chal,
         path=Path(rel_path_str),
         updated=existed_before,
+        files=files,
     )
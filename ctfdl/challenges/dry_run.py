@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import shutil
+import time
+from pathlib import Path
+
+import httpx
+from ctfbridge.base.client import CTFClient
+from ctfbridge.models.challenge import Attachment, Challenge, DownloadType
+from pydantic import BaseModel
+
+from ctfdl.challenges.attachments import absolute_url
+from ctfdl.challenges.client import FetchPlan, fetch_challenge_details
+from ctfdl.challenges.filters import ChallengeFilter
+from ctfdl.core.config import ExportConfig
+
+logger = logging.getLogger(__name__)
+
+# Throughput is measured on the first bytes of a few of the largest attachments
+SAMPLE_BYTES = 2 * 1024 * 1024
+SAMPLE_FILES = 8
+LARGEST_FILES = 5
+
+
+class CategoryPlan(BaseModel):
+    new: int = 0
+    update: int = 0
+    skip: int = 0
+    attachment_bytes: int = 0
+
+
+class PlannedFile(BaseModel):
+    challenge: str
+    name: str
+    url: str | None = None
+    size_bytes: int | None = None
+
+
+class ExportPlan(BaseModel):
+    """What an export would do, as found by `--dry-run` without writing anything."""
+
+    categories: dict[str, CategoryPlan] = {}
+    attachment_bytes: int = 0
+    attachment_count: int = 0
+    unknown_sizes: int = 0
+    largest: list[PlannedFile] = []
+    disk_path: Path | None = None
+    free_bytes: int | None = None
+    parallel: int = 1
+    metadata_seconds: float = 0.0
+    throughput: float | None = None
+    estimated_seconds: float | None = None
+
+    @property
+    def fits(self) -> bool | None:
+        if self.free_bytes is None:
+            return None
+        return self.attachment_bytes <= self.free_bytes
+
+
+def free_space(output: Path) -> tuple[Path, int] | None:
+    """Free bytes on the file system the output folder is (or would be) created on."""
+    path = output.resolve()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    try:
+        return path, shutil.disk_usage(path).free
+    except OSError:
+        return None
+
+
+async def probe_size(http: httpx.AsyncClient, url: str) -> int | None:
+    """Size of a remote file from a HEAD request, or a one-byte range request if HEAD fails."""
+    try:
+        response = await http.head(url)
+        length = response.headers.get("Content-Length")
+        if response.is_success and length and "Content-Encoding" not in response.headers:
+            return int(length)
+
+        async with http.stream("GET", url, headers={"Range": "bytes=0-0"}) as response:
+            if response.status_code == 206:
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                return int(total) if total.isdigit() else None
+            length = response.headers.get("Content-Length")
+            if response.is_success and length and "Content-Encoding" not in response.headers:
+                return int(length)
+    except (httpx.HTTPError, ValueError) as e:
+        logger.debug("Could not find the size of %s: %s", url, e)
+    return None
+
+
+async def measure_throughput(http: httpx.AsyncClient, urls: list[str]) -> float | None:
+    """Bytes per second when reading the start of `urls` at the same time."""
+
+    async def sample(url: str) -> int:
+        received = 0
+        try:
+            headers = {"Range": f"bytes=0-{SAMPLE_BYTES - 1}"}
+            async with http.stream("GET", url, headers=headers) as response:
+                if not response.is_success:
+                    return 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received >= SAMPLE_BYTES:
+                        break
+        except httpx.HTTPError as e:
+            logger.debug("Could not sample %s: %s", url, e)
+        return received
+
+    if not urls:
+        return None
+    start = time.monotonic()
+    received = sum(await asyncio.gather(*(sample(url) for url in urls)))
+    elapsed = time.monotonic() - start
+    return received / elapsed if received and elapsed > 0 else None
+
+
+def _planned_files(client: CTFClient, chal: Challenge) -> list[PlannedFile]:
+    def planned(att: Attachment) -> PlannedFile:
+        http = att.download_info and att.download_info.type == DownloadType.HTTP
+        return PlannedFile(
+            challenge=chal.name,
+            name=att.name or "",
+            url=absolute_url(client, att.download_info.url) if http else None,
+            size_bytes=att.size_bytes,
+        )
+
+    return [planned(att) for att in chal.attachments]
+
+
+async def plan_export(
+    client: CTFClient,
+    config: ExportConfig,
+    fetch_plan: FetchPlan,
+    work: list[tuple[Challenge, str, bool]],
+    skipped: list[Challenge],
+    http: httpx.AsyncClient,
+) -> ExportPlan:
+    """
+    Plan the export of `work` the way a real run would, without writing anything.
+
+    Challenge details are fetched when a real run would fetch them, or when they are
+    needed for attachments. Attachment sizes come from the platform or from HEAD
+    requests. The duration estimate adds the measured metadata time to the attachment
+    bytes divided by the throughput of a few sampled downloads at `--parallel`.
+    """
+    plan = ExportPlan(parallel=config.parallel)
+    for stub in skipped:
+        plan.categories.setdefault(stub.category or "uncategorized", CategoryPlan()).skip += 1
+
+    challenge_filter = ChallengeFilter(config)
+    semaphore = asyncio.Semaphore(config.parallel)
+    need_details = fetch_plan.details or not config.no_attachments
+
+    async def details(stub: Challenge) -> Challenge | None:
+        if not need_details and challenge_filter.matches(stub, strict=True):
+            return stub
+        async with semaphore:
+            try:
+                chal = await fetch_challenge_details(client, stub, enrich=fetch_plan.enrich)
+            except Exception as e:
+                logger.warning("Could not fetch details of %s: %s", stub.name, e)
+                return stub
+        # A real run drops challenges that only fail the filters on their details
+        return chal if challenge_filter.matches(chal, strict=True) else None
+
+    start = time.monotonic()
+    challenges = await asyncio.gather(*(details(stub) for stub, _, _ in work))
+    plan.metadata_seconds = time.monotonic() - start
+
+    files: list[tuple[str, PlannedFile]] = []
+    for chal, (_, _, existed_before) in zip(challenges, work, strict=True):
+        if chal is None:
+            continue
+        category = plan.categories.setdefault(chal.category or "uncategorized", CategoryPlan())
+        if existed_before:
+            category.update += 1
+        else:
+            category.new += 1
+        if not config.no_attachments:
+            files += [(chal.category or "uncategorized", f) for f in _planned_files(client, chal)]
+
+    async def sized(file: PlannedFile):
+        if file.size_bytes is None and file.url:
+            async with semaphore:
+                file.size_bytes = await probe_size(http, file.url)
+
+    await asyncio.gather(*(sized(file) for _, file in files))
+
+    for category, file in files:
+        plan.attachment_count += 1
+        if file.size_bytes is None:
+            plan.unknown_sizes += 1
+            continue
+        plan.attachment_bytes += file.size_bytes
+        plan.categories[category].attachment_bytes += file.size_bytes
+
+    known = sorted(
+        (file for _, file in files if file.size_bytes is not None),
+        key=lambda f: f.size_bytes,
+        reverse=True,
+    )
+    plan.largest = known[:LARGEST_FILES]
+
+    if disk := free_space(config.output):
+        plan.disk_path, plan.free_bytes = disk
+
+    samples = [f.url for f in known if f.url][: min(config.parallel, SAMPLE_FILES)]
+    plan.throughput = await measure_throughput(http, samples)
+    if plan.throughput:
+        plan.estimated_seconds = plan.metadata_seconds + plan.attachment_bytes / plan.throughput
+    elif not plan.attachment_bytes:
+        plan.estimated_seconds = plan.metadata_seconds
+    return plan
@@ -1,51 +1,250 @@
+import asyncio
+import contextlib
+import shutil
+import subprocess
 import tempfile
+from collections.abc import AsyncIterator
 from pathlib import Path
 
+import httpx
+
+import ctfdl.ui.messages as console_utils
 from ctfdl.challenges.downloader import download_challenges
-from ctfdl.common.archiver import zip_output_folder
+from ctfdl.challenges.shard import write_spool
+from ctfdl.common.archiver import commit_to_git, zip_output_folder
 from ctfdl.common.logging import setup_logging_with_rich
+from ctfdl.common.prettify_cache import open_prettify_cache
+from ctfdl.common.ratelimit import BandwidthLimiter
 from ctfdl.core.config import ExportConfig
 from ctfdl.core.events import EventEmitter
-from ctfdl.rendering.context import TemplateEngineContext
+from ctfdl.core.models import ChallengeEntry
+from ctfdl.rendering.dataset import DatasetHandler
+from ctfdl.rendering.engine import TemplateEngine
+from ctfdl.rendering.git_sink import GitFastImportSink
+from ctfdl.rendering.s3_sink import S3Sink
+from ctfdl.rendering.sinks import OutputSink
+from ctfdl.search.handler import SearchIndexHandler
+from ctfdl.search.index import default_index_path
 from ctfdl.ui.rich_handler import RichConsoleHandler
 
 
+class ExportError(Exception):
+    """An export that could not run, e.g. because the platform is unsupported or login failed."""
+
+
+def _subscribe_outputs(config: ExportConfig, emitter: EventEmitter):
+    """Attach the handlers that collect exported challenges beyond the folder layout."""
+    # Shards may run on other machines against shared storage, so `merge-index` fills the
+    # search index for them
+    if config.search_index and not (
+        config.zip_output or config.git_repo or config.s3 or config.shard
+    ):
+        SearchIndexHandler(
+            emitter,
+            config.search_index_path or default_index_path(config.output),
+            config.output,
+            config.url,
+        )
+
+    if config.datasets:
+        DatasetHandler(emitter, config.datasets, config.url)
+
+
+def _write_index(engine: TemplateEngine, config: ExportConfig, index_data: list[ChallengeEntry]):
+    if config.shard:
+        # The index of a sharded export is rendered by `ctf-dl merge-index`
+        write_spool(config.output, config.shard, config.url, index_data)
+    elif not config.no_index:
+        engine.render_index(
+            template_name=config.index_template_name or "grouped",
+            challenges=index_data,
+            output_path=config.output / "index.md",
+        )
+        # Every tree has the main tree's folders, so the same entries index them all
+        for extra in config.extra_outputs:
+            engine.render_index(
+                template_name=extra.index_template_name or "grouped",
+                challenges=index_data,
+                output_path=extra.output / "index.md",
+            )
+
+
 async def run_export(config: ExportConfig):
     setup_logging_with_rich(debug=config.debug)
 
-    TemplateEngineContext.initialize(
-        config.template_dir, Path(__file__).parent.parent / "resources" / "templates"
-    )
+    engine = TemplateEngine(config.template_dir)
 
     if config.list_templates:
-        TemplateEngineContext.get().list_templates()
+        engine.list_templates()
         return
 
+    prettify_cache = (
+        None
+        if config.dry_run
+        else open_prettify_cache(config.prettify_cache, config.prettify_cache_size)
+    )
+    engine.use_prettify_cache(prettify_cache)
+    try:
+        await _export(config, engine)
+    finally:
+        if prettify_cache:
+            prettify_cache.close()
+
+
+async def _export(config: ExportConfig, engine: TemplateEngine):
     emitter = EventEmitter()
 
     RichConsoleHandler(emitter)
 
-    temp_dir = Path(tempfile.mkdtemp()) if config.zip_output else None
+    if config.dry_run:
+        # Plans only: no handlers that write, no temporary output, no sinks
+        try:
+            await download_challenges(config, emitter, engine)
+        except Exception as e:
+            await emitter.emit("download_fail", str(e))
+            raise SystemExit(1)
+        return
+
+    _subscribe_outputs(config, emitter)
+
+    temp = config.zip_output or config.git_repo or config.s3
+    temp_dir = Path(tempfile.mkdtemp()) if temp else None
     output_dir = (temp_dir / "ctf-export") if temp_dir else config.output
     config.output = output_dir
 
     output_dir.mkdir(parents=True, exist_ok=True)
 
+    git_sink = None
+    if config.git_repo:
+        try:
+            git_sink = GitFastImportSink(
+                config.git_repo, output_dir, branch=config.git_branch, lfs=config.git_lfs
+            )
+        except (RuntimeError, subprocess.CalledProcessError) as e:
+            await emitter.emit("download_fail", f"Could not open the git repository: {e}")
+            raise SystemExit(1)
+        engine.use_sink(git_sink)
+
+    s3_sink = None
+    if config.s3:
+        try:
+            s3_sink = S3Sink(config.s3, output_dir)
+        except (RuntimeError, ValueError, httpx.HTTPError) as e:
+            await emitter.emit("download_fail", f"Could not open the bucket: {e}")
+            raise SystemExit(1)
+        engine.use_sink(s3_sink)
+
     try:
-        success, index_data = await download_challenges(config, emitter)
+        success, index_data = await download_challenges(config, emitter, engine)
     except Exception as e:
+        if git_sink:
+            git_sink.abort()
+        if s3_sink:
+            s3_sink.close()
         await emitter.emit("download_fail", str(e))
         raise SystemExit(1)
 
     if success:
         await emitter.emit("download_success")
 
-        if not config.no_index:
-            TemplateEngineContext.get().render_index(
-                template_name=config.index_template_name or "grouped",
-                challenges=index_data,
-                output_path=output_dir / "index.md",
-            )
+        _write_index(engine, config, index_data)
 
         if config.zip_output:
             zip_output_folder(output_dir, archive_name="ctf-export")
+
+    if git_sink:
+        if success:
+            commit_to_git(git_sink, config, index_data)
+        else:
+            git_sink.abort()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if s3_sink:
+        try:
+            s3_sink.flush()
+        except (RuntimeError, httpx.HTTPError) as e:
+            await emitter.emit("download_fail", f"Upload to the bucket failed: {e}")
+            raise SystemExit(1)
+        finally:
+            s3_sink.close()
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if success:
+            console_utils.uploaded_output(
+                f"s3://{config.s3.bucket}/{config.s3.prefix}",
+                s3_sink.uploaded,
+                s3_sink.skipped,
+            )
+
+
+async def stream(
+    config: ExportConfig,
+    sink: OutputSink | None = None,
+    emitter: EventEmitter | None = None,
+    limiter: BandwidthLimiter | None = None,
+) -> AsyncIterator[ChallengeEntry]:
+    """
+    Export challenges and yield their entries as they complete.
+
+    The library counterpart of `ctf-dl`: nothing is printed, logging is left to the
+    caller, and several streams can run side by side in one process. Rendered files go
+    to `sink`, by default straight into `config.output`. Listeners registered on
+    `emitter` see every event of the run. A `limiter` replaces the bandwidth limits of
+    `config.transport`, and its rates can be changed while the export runs. Entries an
+    interrupted run had already finished are yielded after the new ones, and the index
+    is written at the end.
+
+    Raises ExportError when the export cannot start, e.g. because logging in failed.
+
+    Example:
+        async for entry in ctfdl.stream(ExportConfig(url="https://demo.ctfd.io", token="...")):
+            print(entry.path)
+    """
+    if config.zip_output or config.git_repo or config.s3:
+        raise ValueError(
+            "zip_output, git_repo and s3 belong to the command line, pass a sink instead"
+        )
+    if sink is not None and config.workers > 1:
+        raise ValueError("Worker processes write to the output folder and cannot use a sink")
+    if limiter is not None and config.workers > 1:
+        raise ValueError("Worker processes share config.transport's limits, not a limiter")
+    if sink is not None and config.extra_outputs:
+        raise ValueError("extra_outputs link attachments on disk and cannot use a sink")
+
+    emitter = emitter or EventEmitter()
+    engine = TemplateEngine(config.template_dir)
+    if sink is not None:
+        engine.use_sink(sink)
+    _subscribe_outputs(config, emitter)
+
+    failures: list[str] = []
+    emitter.on("connect_fail", lambda reason: failures.append(reason))
+    emitter.on("authentication_required", lambda: failures.append("Authentication required"))
+    # None marks the end of the run
+    finished: asyncio.Queue[ChallengeEntry | None] = asyncio.Queue()
+    emitter.on("challenge_exported", lambda entry: finished.put_nowait(entry))
+
+    prettify_cache = open_prettify_cache(config.prettify_cache, config.prettify_cache_size)
+    engine.use_prettify_cache(prettify_cache)
+    task = asyncio.create_task(download_challenges(config, emitter, engine, limiter))
+    task.add_done_callback(lambda _: finished.put_nowait(None))
+    try:
+        yielded = set()
+        while (entry := await finished.get()) is not None:
+            yielded.add(id(entry))
+            yield entry
+
+        success, index_data = await task
+        if not success and failures:
+            raise ExportError(failures[0])
+        for entry in index_data:
+            if id(entry) not in yielded:
+                yield entry
+        if success:
+            _write_index(engine, config, index_data)
+    finally:
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        if prettify_cache:
+            prettify_cache.close()
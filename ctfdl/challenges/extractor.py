@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import shutil
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import IO, Literal
+
+from pydantic import BaseModel
+
+from ctfdl.core.models import AttachmentFile
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (
+    ".tar.gz",
+    ".tar.bz2",
+    ".tar.xz",
+    ".tgz",
+    ".tbz2",
+    ".txz",
+    ".tar",
+    ".zip",
+)
+MARKER_FILE = ".ctfdl-extracted"
+
+
+class ExtractLimits(BaseModel):
+    max_total_size: int = 1024**3
+    max_files: int = 10_000
+    max_ratio: float = 100.0
+
+
+class ExtractResult(BaseModel):
+    archive: Path
+    destination: Path
+    status: Literal["extracted", "skipped", "rejected"]
+    files: int = 0
+    size_bytes: int = 0
+    reason: str | None = None
+
+
+class UnsafeArchiveError(Exception):
+    pass
+
+
+def archive_suffix(name: str) -> str | None:
+    lower = name.lower()
+    return next((s for s in ARCHIVE_SUFFIXES if lower.endswith(s)), None)
+
+
+def extraction_dir(archive: Path) -> Path:
+    """The sibling directory an archive is extracted into, e.g. `chal.tar.gz` -> `chal/`."""
+    suffix = archive_suffix(archive.name) or archive.suffix
+    target = archive.with_name(archive.name[: -len(suffix)] or archive.name)
+    # Never take over a path that a previous extraction did not create
+    if target == archive or (target.exists() and not (target / MARKER_FILE).is_file()):
+        target = archive.with_name(f"{target.name}_extracted")
+    return target
+
+
+class _Budget:
+    def __init__(self, limits: ExtractLimits, archive_size: int):
+        self.limits = limits
+        self.archive_size = max(archive_size, 1)
+        self.files = 0
+        self.size = 0
+
+    def add_file(self):
+        self.files += 1
+        if self.files > self.limits.max_files:
+            raise UnsafeArchiveError(f"more than {self.limits.max_files} files")
+
+    def add_bytes(self, n: int):
+        self.size += n
+        if self.size > self.limits.max_total_size:
+            raise UnsafeArchiveError(f"more than {self.limits.max_total_size} bytes extracted")
+        if self.size / self.archive_size > self.limits.max_ratio:
+            raise UnsafeArchiveError(f"compression ratio above {self.limits.max_ratio:g}")
+
+
+def _safe_target(root: Path, name: str) -> Path:
+    name = name.replace("\\", "/")
+    target = (root / name).resolve()
+    if name.startswith("/") or not target.is_relative_to(root):
+        raise UnsafeArchiveError(f"path traversal in member '{name}'")
+    return target
+
+
+def _copy(src: IO[bytes], target: Path, budget: _Budget):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with target.open("wb") as dst:
+        while chunk := src.read(1024 * 1024):
+            budget.add_bytes(len(chunk))
+            dst.write(chunk)
+
+
+def _extract_zip(archive: Path, root: Path, budget: _Budget):
+    with zipfile.ZipFile(archive) as zf:
+        infos = zf.infolist()
+        # Declared sizes can lie, so they are only a first check before the real count
+        declared = _Budget(budget.limits, budget.archive_size)
+        for info in infos:
+            _safe_target(root, info.filename)
+            declared.add_file()
+            declared.add_bytes(info.file_size)
+
+        for info in infos:
+            target = _safe_target(root, info.filename)
+            if info.is_dir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            budget.add_file()
+            with zf.open(info) as src:
+                _copy(src, target, budget)
+
+
+def _extract_tar(archive: Path, root: Path, budget: _Budget):
+    with tarfile.open(archive) as tf:
+        for member in tf:
+            target = _safe_target(root, member.name)
+            if member.isdir():
+                target.mkdir(parents=True, exist_ok=True)
+            elif member.isfile():
+                budget.add_file()
+                src = tf.extractfile(member)
+                if src is not None:
+                    with src:
+                        _copy(src, target, budget)
+            else:
+                # Links and special files are never materialised
+                logger.debug("Skipping non-regular member %s in %s", member.name, archive)
+
+
+def extract_archive(
+    archive: Path, destination: Path, sha256: str | None, limits: ExtractLimits
+) -> ExtractResult:
+    """
+    Safely extract one archive. Runs in a worker process.
+
+    Extraction happens in a temporary sibling directory that is renamed into place only
+    once the whole archive passed the limits, and a marker records the archive hash so
+    unchanged archives are skipped next time.
+    """
+    marker = destination / MARKER_FILE
+    if sha256 and marker.is_file() and marker.read_text(encoding="utf-8").strip() == sha256:
+        return ExtractResult(archive=archive, destination=destination, status="skipped")
+
+    staging = destination.with_name(destination.name + ".partial")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    budget = _Budget(limits, archive.stat().st_size)
+
+    try:
+        if archive_suffix(archive.name) == ".zip":
+            _extract_zip(archive, staging.resolve(), budget)
+        else:
+            _extract_tar(archive, staging.resolve(), budget)
+    except (UnsafeArchiveError, zipfile.BadZipFile, tarfile.TarError, OSError) as e:
+        shutil.rmtree(staging, ignore_errors=True)
+        return ExtractResult(
+            archive=archive, destination=destination, status="rejected", reason=str(e)
+        )
+
+    (staging / MARKER_FILE).write_text(sha256 or "", encoding="utf-8")
+    shutil.rmtree(destination, ignore_errors=True)
+    staging.rename(destination)
+
+    return ExtractResult(
+        archive=archive,
+        destination=destination,
+        status="extracted",
+        files=budget.files,
+        size_bytes=budget.size,
+    )
+
+
+class ArchiveExtractor:
+    """Extracts downloaded archive attachments in a process pool."""
+
+    def __init__(self, limits: ExtractLimits, workers: int | None = None):
+        self.limits = limits
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+
+    async def extract_all(
+        self, chal_folder: Path, files: list[AttachmentFile]
+    ) -> list[ExtractResult]:
+        loop = asyncio.get_running_loop()
+        jobs = []
+        for file in files:
+            if file.deferred or not archive_suffix(file.name):
+                continue
+            archive = chal_folder / file.path
+            jobs.append(
+                loop.run_in_executor(
+                    self.pool,
+                    extract_archive,
+                    archive,
+                    extraction_dir(archive),
+                    file.sha256,
+                    self.limits,
+                )
+            )
+        return list(await asyncio.gather(*jobs))
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
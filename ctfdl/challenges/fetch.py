@@ -0,0 +1,163 @@
+import asyncio
+import contextlib
+import json
+import logging
+from pathlib import Path
+
+import httpx
+from ctfbridge.exceptions import CTFBridgeError
+from ctfbridge.models.challenge import Attachment, DownloadInfo
+
+import ctfdl.ui.messages as console_utils
+from ctfdl.challenges.attachments import AttachmentDownloader
+from ctfdl.challenges.client import get_authenticated_client
+from ctfdl.challenges.deferred import DEFERRED_SUFFIX, find_stubs, read_stub
+from ctfdl.common.ratelimit import BandwidthLimiter
+from ctfdl.common.transport import make_download_client, make_platform_client
+from ctfdl.core.config import TransportProfile
+from ctfdl.core.models import AttachmentFile
+
+logger = logging.getLogger(__name__)
+
+# How the built-in README template lists a deferred attachment, and a downloaded one
+DEFERRED_LINE = "- {name} _(deferred, download with `ctf-dl fetch`)_"
+FETCHED_LINE = "- [{name}](files/{name})"
+
+
+def mark_fetched(challenge_dir: Path, file: AttachmentFile):
+    """
+    Record a fetched attachment in the metadata the export wrote next to it.
+
+    JSON sidecars get the size and hashes of the file instead of the deferred flag,
+    and README lines of the built-in template link the file. Custom templates are
+    left as they are; exporting the challenge again renders them anew.
+    """
+    for path in challenge_dir.glob("*.json"):
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if not isinstance(data, dict) or not isinstance(data.get("attachments"), list):
+            continue
+        changed = False
+        for attachment in data["attachments"]:
+            if isinstance(attachment, dict) and attachment.get("name") == file.name:
+                attachment.pop("deferred", None)
+                attachment.update(size_bytes=file.size_bytes, sha256=file.sha256)
+                if file.blake3:
+                    attachment["blake3"] = file.blake3
+                changed = True
+        if changed:
+            path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    deferred_line = DEFERRED_LINE.format(name=file.name)
+    for path in challenge_dir.glob("*.md"):
+        text = path.read_text(encoding="utf-8")
+        if deferred_line in text:
+            path.write_text(
+                text.replace(deferred_line, FETCHED_LINE.format(name=file.name)), encoding="utf-8"
+            )
+
+
+async def _log_in(
+    platform_url: str,
+    transport: TransportProfile,
+    limiter: BandwidthLimiter | None,
+    credentials: dict,
+) -> httpx.AsyncClient | None:
+    """A platform client logged in again with `credentials`, or None if that failed."""
+    platform_http = make_platform_client(transport, limiter)
+    try:
+        await get_authenticated_client(platform_url, http=platform_http, **credentials)
+    except (CTFBridgeError, httpx.HTTPError) as e:
+        await platform_http.aclose()
+        console_utils.error(f"Could not log in to {platform_url}: {e}")
+        return None
+    return platform_http
+
+
+async def fetch_deferred(
+    patterns: list[str],
+    parallel: int = 10,
+    chunk_size: int = 1024 * 1024,
+    fsync: str = "none",
+    blake3: bool = False,
+    transport: TransportProfile | None = None,
+    stall_timeout: float | None = None,
+    username: str | None = None,
+    password: str | None = None,
+    token: str | None = None,
+) -> bool:
+    """
+    Download the deferred attachments matching `patterns`, replacing their stubs.
+
+    `transport` carries the network settings of the export (HTTP/2, timeouts, DNS
+    cache, team cache and bandwidth limits). With credentials, fetch logs in to the
+    platform each stub was exported from, the way the export did, and files on the
+    platform itself are downloaded with that session; files on other hosts never see it.
+    """
+    stubs = find_stubs(patterns)
+    if not stubs:
+        console_utils.warning("No deferred attachments matched")
+        return False
+
+    transport = transport or TransportProfile()
+    sem = asyncio.Semaphore(parallel)
+    ok = True
+    metas = {stub: read_stub(stub) for stub in stubs}
+    credentials = {"username": username, "password": password, "token": token}
+
+    limiter = BandwidthLimiter.from_profile(transport)
+    async with contextlib.AsyncExitStack() as stack:
+        http = await stack.enter_async_context(make_download_client(transport, limiter))
+        anonymous = AttachmentDownloader(
+            None, http, chunk_size, fsync, blake3, stall_timeout=stall_timeout
+        )
+        # Downloaders that carry the session, by the host of the platform
+        sessions: dict[str, AttachmentDownloader] = {}
+        if token or (username and password):
+            platforms = {
+                meta["platform_url"] for meta in metas.values() if meta.get("platform_url")
+            }
+            for platform_url in sorted(platforms):
+                platform_http = await _log_in(platform_url, transport, limiter, credentials)
+                if platform_http is None:
+                    return False
+                stack.push_async_callback(platform_http.aclose)
+                session = make_download_client(transport, limiter, session=platform_http)
+                await stack.enter_async_context(session)
+                sessions[httpx.URL(platform_url).host] = AttachmentDownloader(
+                    None, session, chunk_size, fsync, blake3, stall_timeout=stall_timeout
+                )
+
+        async def fetch_one(stub: Path):
+            nonlocal ok
+            async with sem:
+                meta = metas[stub]
+                attachment = Attachment(
+                    name=meta["name"],
+                    size_bytes=meta.get("size_bytes"),
+                    download_info=DownloadInfo(url=meta["url"]),
+                )
+                target = stub.with_name(stub.name.removesuffix(DEFERRED_SUFFIX))
+                downloader = sessions.get(httpx.URL(meta["url"]).host, anonymous)
+                _, files = await downloader.download(attachment, stub.parent)
+
+                if not files or files[0].deferred or not target.exists():
+                    console_utils.failed_attachment(str(target), "download failed")
+                    ok = False
+                    return
+                if meta.get("sha256") and meta["sha256"] != files[0].sha256:
+                    # Keep the stub, so a later fetch can try again
+                    target.unlink()
+                    stub.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+                    console_utils.failed_attachment(str(target), "SHA-256 mismatch")
+                    ok = False
+                    return
+
+                await asyncio.to_thread(mark_fetched, stub.parent.parent, files[0])
+                console_utils.fetched_attachment(str(target), files[0].size_bytes)
+
+        await asyncio.gather(*(fetch_one(stub) for stub in stubs))
+
+    return ok
@@ -0,0 +1,49 @@
+import re
+
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.core.config import ExportConfig
+
+
+class ChallengeFilter:
+    """
+    Applies the export filters locally, so they can run on the cheap listing records.
+
+    Listing records are often incomplete, so a missing value only rejects a challenge
+    when `strict` is set. The detail phase re-checks survivors strictly.
+    """
+
+    def __init__(self, config: ExportConfig):
+        self.categories = set(config.categories) if config.categories else None
+        self.min_points = config.min_points
+        self.max_points = config.max_points
+        self.solved = True if config.solved else False if config.unsolved else None
+        self.name_pattern = (
+            re.compile(config.name_pattern, re.IGNORECASE) if config.name_pattern else None
+        )
+
+    def matches(self, chal: Challenge, *, strict: bool = False) -> bool:
+        if self.categories is not None:
+            if chal.category is None:
+                if strict:
+                    return False
+            elif chal.category not in self.categories:
+                return False
+
+        if self.min_points is not None or self.max_points is not None:
+            if chal.value is None:
+                if strict:
+                    return False
+            elif (self.min_points is not None and chal.value < self.min_points) or (
+                self.max_points is not None and chal.value > self.max_points
+            ):
+                return False
+
+        if self.solved is not None:
+            if chal.solved is None:
+                if strict:
+                    return False
+            elif chal.solved is not self.solved:
+                return False
+
+        return not (self.name_pattern and not self.name_pattern.search(chal.name))
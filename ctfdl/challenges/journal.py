@@ -0,0 +1,124 @@
+import json
+import os
+from pathlib import Path
+from typing import IO
+
+from ctfbridge.models.challenge import Challenge
+from pydantic import BaseModel
+
+from ctfdl.core.config import ExportConfig
+from ctfdl.core.events import handles
+from ctfdl.core.models import ChallengeEntry
+
+JOURNAL_FILE = "journal.jsonl"
+
+
+class PendingChallenge(BaseModel):
+    path: str
+    existed_before: bool
+
+
+class InterruptedRun(BaseModel):
+    """What an interrupted run still had to do, and the entries it already finished."""
+
+    pending: dict[str, PendingChallenge] = {}
+    entries: list[ChallengeEntry] = []
+
+
+def journal_path(config: ExportConfig) -> Path:
+    # Shards may share one output folder, so each keeps its own journal
+    if config.shard:
+        index, count = config.shard
+        return config.state_dir / f"journal-{index}-of-{count}.jsonl"
+    return config.state_dir / JOURNAL_FILE
+
+
+class RunJournal:
+    """
+    Write-ahead log of an export run.
+
+    `begin` records the planned work before any challenge starts, and every challenge
+    is appended once it is in place in the output. `end` removes the journal, so a
+    journal found at the next start belongs to a run that was interrupted.
+    """
+
+    def __init__(self, path: Path, fsync: bool = False):
+        self.path = path
+        self.fsync = fsync
+        self._file: IO[str] | None = None
+
+    def interrupted(self, url: str) -> InterruptedRun | None:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            return None
+
+        begin = None
+        done: dict[str, dict] = {}
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The crash may have cut off the last line
+                continue
+            if record.get("type") == "begin":
+                begin, done = record, {}
+            elif record.get("type") == "done":
+                done[record["id"]] = record["entry"]
+
+        if begin is None or begin.get("url") != url:
+            return None
+        return InterruptedRun(
+            pending={
+                cid: PendingChallenge.model_validate(item)
+                for cid, item in begin["pending"].items()
+                if cid not in done
+            },
+            entries=[ChallengeEntry.load(entry) for entry in done.values()],
+        )
+
+    def _append(self, record: dict):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def begin(
+        self,
+        url: str,
+        work: list[tuple[Challenge, str, bool]],
+        finished: list[ChallengeEntry] = (),
+    ):
+        """Start a new journal; `finished` carries over what a resumed run already did."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self._append(
+            {
+                "type": "begin",
+                "url": url,
+                "pending": {
+                    str(chal.id): {"path": path, "existed_before": existed_before}
+                    for chal, path, existed_before in work
+                },
+            }
+        )
+        for entry in finished:
+            self.on_challenge_exported(entry)
+
+    @handles("challenge_exported")
+    def on_challenge_exported(self, entry: ChallengeEntry):
+        self._append(
+            {"type": "done", "id": str(entry.data.id), "entry": entry.model_dump(mode="json")}
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def end(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,159 @@
+import contextlib
+import json
+import logging
+import shutil
+from collections.abc import Iterable
+from pathlib import Path
+
+from ctfbridge.models.challenge import Challenge
+from pydantic import BaseModel
+
+from ctfdl.challenges.planner import PathPlan
+from ctfdl.core.config import ExportConfig
+from ctfdl.core.events import handles
+from ctfdl.core.models import ChallengeEntry
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+
+
+class Relocation(BaseModel):
+    """Folders moved to their new paths, and folders of challenges that are gone."""
+
+    moved: dict[str, str] = {}
+    orphans: list[str] = []
+    pruned: bool = False
+
+
+def _remove_empty_parents(folder: Path, root: Path):
+    """Remove the folders between `folder` and `root` that were left empty."""
+    for parent in folder.parents:
+        if parent == root or root not in parent.parents:
+            break
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+
+
+class FolderManifest:
+    """
+    Which folder every exported challenge is in, kept in the state folder.
+
+    A changed folder template or a renamed challenge gives a challenge a new path. The
+    manifest still knows the old one, so the folder is renamed into place instead of
+    being downloaded again. Folders of challenges that are no longer listed are orphans.
+    """
+
+    def __init__(self, path: Path, url: str):
+        self.path = path
+        self.url = url
+        self.folders: dict[str, str] = {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            logger.warning("Ignoring unreadable manifest %s: %s", path, e)
+            return
+        if data.get("url") == url:
+            self.folders = data.get("folders", {})
+
+    @classmethod
+    def for_export(cls, config: ExportConfig) -> "FolderManifest":
+        return cls(config.state_dir / MANIFEST_FILE, config.url)
+
+    def relocate(
+        self,
+        plan: PathPlan,
+        listed: Iterable[Challenge],
+        selected: Iterable[Challenge],
+        trees: list[Path],
+        prune: bool = False,
+        dry_run: bool = False,
+    ) -> Relocation:
+        """
+        Move the folders of `selected` challenges to their planned paths in every tree.
+
+        `plan` learns about the moved folders, so they count as already exported. Only
+        folders the manifest knows are touched, and nothing is written in a dry run.
+        """
+        listed = list(listed)
+        listed_ids = {str(chal.id) for chal in listed}
+        planned = set(plan.paths.values())
+        result = Relocation(pruned=prune and not dry_run)
+
+        # The plan only scanned as deep as the new paths go, so old paths are checked here
+        def present(path: str) -> bool:
+            return path in plan.existing or (trees[0] / path).is_dir()
+
+        for chal in selected:
+            cid = str(chal.id)
+            old, new = self.folders.get(cid), plan.path_for(chal)
+            if old is None or old == new or not present(old):
+                continue
+            if new in plan.existing:
+                # Something else took the new path; the old folder is left over
+                if old not in planned:
+                    result.orphans.append(old)
+                continue
+            if not dry_run:
+                for root in trees:
+                    self._move(root, old, new)
+            plan.existing.discard(old)
+            plan.existing.add(new)
+            result.moved[old] = new
+
+        result.orphans += [
+            path
+            for cid, path in self.folders.items()
+            if cid not in listed_ids and path not in planned and present(path)
+        ]
+        if result.pruned:
+            for path in result.orphans:
+                for root in trees:
+                    shutil.rmtree(root / path, ignore_errors=True)
+                    _remove_empty_parents(root / path, root)
+                plan.existing.discard(path)
+
+        # Folders under their planned path are adopted, which includes folders from before
+        # there was a manifest; the rest keep their old path until they are moved
+        folders = {
+            cid: path
+            for cid, path in self.folders.items()
+            if not (cid in listed_ids and path in planned) and present(path)
+        }
+        for chal in listed:
+            if plan.exists(chal):
+                folders[str(chal.id)] = plan.path_for(chal)
+        self.folders = folders
+        if not dry_run:
+            self.save()
+        return result
+
+    @staticmethod
+    def _move(root: Path, old: str, new: str):
+        source, target = root / old, root / new
+        if not source.is_dir() or target.exists():
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        source.rename(target)
+        _remove_empty_parents(source, root)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps({"url": self.url, "folders": self.folders}, indent=1), encoding="utf-8"
+        )
+        tmp.replace(self.path)
+
+    @handles("challenge_exported")
+    def on_challenge_exported(self, entry: ChallengeEntry):
+        self.folders[str(entry.data.id)] = entry.path.as_posix()
+
+    @handles("download_complete")
+    def on_download_complete(self):
+        with contextlib.suppress(OSError):
+            self.save()
@@ -0,0 +1,181 @@
+import contextlib
+import hashlib
+import os
+import shutil
+from collections.abc import Callable, Iterable
+from pathlib import Path, PurePosixPath
+
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.core.config import STATE_DIR_NAME, state_dir
+
+STAGING_DIR = "staging"
+
+
+def _id_key(chal: Challenge) -> tuple:
+    # Numeric ids sort numerically, so the oldest challenge keeps the plain name
+    cid = str(chal.id)
+    return (len(cid), cid) if cid.isdigit() else (float("inf"), cid)
+
+
+def _scan_dirs(root: Path, depth: int) -> set[str]:
+    """Every directory under root down to `depth` levels, as relative POSIX paths."""
+    found: set[str] = set()
+    level = [("", root)]
+    for _ in range(depth):
+        next_level = []
+        for rel, path in level:
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name == STATE_DIR_NAME or not entry.is_dir(follow_symlinks=False):
+                    continue
+                child = f"{rel}/{entry.name}" if rel else entry.name
+                found.add(child)
+                next_level.append((child, Path(entry.path)))
+        level = next_level
+    return found
+
+
+def discard_folder(folder: Path):
+    """Remove a planned folder again, unless something was written into it."""
+    with contextlib.suppress(OSError):
+        folder.rmdir()
+
+
+def staging_dir(output_dir: Path, chal: Challenge) -> Path:
+    """Where a new challenge folder is built before it is moved into place."""
+    key = hashlib.sha256(str(chal.id).encode()).hexdigest()[:16]
+    return state_dir(output_dir) / STAGING_DIR / key
+
+
+def unstage_paths(chal: Challenge, staged: Path, folder: Path) -> Challenge:
+    """Point attachment paths inside a staging folder at where the folder will end up."""
+    attachments = []
+    for att in chal.attachments:
+        if att.local_path and Path(att.local_path).is_relative_to(staged):
+            att = att.model_copy(
+                update={"local_path": str(folder / Path(att.local_path).relative_to(staged))}
+            )
+        attachments.append(att)
+    return chal.model_copy(
+        update={"attachments": chal.attachments.model_copy(update={"attachments": attachments})}
+    )
+
+
+def commit_staged(staged: Path, folder: Path):
+    """
+    Move a fully built challenge folder into place with one rename.
+
+    A folder already at the target, left by a run that died after its rename but before
+    the journal recorded it, is swapped out.
+    """
+    folder.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        staged.rename(folder)
+    except OSError:
+        if not folder.exists():
+            raise
+        stale = staged.with_name(staged.name + ".old")
+        shutil.rmtree(stale, ignore_errors=True)
+        folder.rename(stale)
+        staged.rename(folder)
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def link_tree(source: Path, target: Path) -> int:
+    """
+    Mirror every file under `source` into `target` as hard links.
+
+    Across file systems, where hard links are impossible, relative symlinks are made,
+    and copies where those fail too. Returns how many files were linked anew.
+    """
+    linked = 0
+    for path in source.rglob("*"):
+        if path.is_dir():
+            continue
+        dest = target / path.relative_to(source)
+        try:
+            if path.samefile(dest):
+                continue
+            dest.unlink()
+        except FileNotFoundError:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, dest)
+        except OSError:
+            try:
+                dest.symlink_to(os.path.relpath(path, dest.parent))
+            except OSError:
+                shutil.copy2(path, dest)
+        linked += 1
+    return linked
+
+
+class PathPlan:
+    """
+    Folder of every listed challenge, decided before anything is downloaded.
+
+    Paths are rendered once from the light listing. Challenges whose folders collide,
+    including ones that only differ in case, keep the plain path for the lowest id and
+    get `-<id>` appended otherwise, so the result does not depend on listing order.
+    The existing tree is scanned once (or its directories are passed in by a sink that
+    keeps no working tree), which turns the per-challenge "already exported?" check
+    into a set lookup.
+    """
+
+    def __init__(self, output_dir: Path, paths: dict[str, str], existing: set[str]):
+        self.output_dir = output_dir
+        self.paths = paths
+        self.existing = existing
+
+    @classmethod
+    def build(
+        cls,
+        output_dir: Path,
+        challenges: Iterable[Challenge],
+        render: Callable[[list[Challenge]], list[str]],
+        existing: set[str] | None = None,
+    ) -> "PathPlan":
+        challenges = list(challenges)
+        rendered = [str(PurePosixPath(path.strip().strip("/"))) for path in render(challenges)]
+
+        groups: dict[str, list[tuple[Challenge, str]]] = {}
+        for chal, path in zip(challenges, rendered, strict=True):
+            groups.setdefault(path.casefold(), []).append((chal, path))
+
+        paths: dict[str, str] = {}
+        taken = set(groups)
+        for group in groups.values():
+            group.sort(key=lambda item: _id_key(item[0]))
+            paths[str(group[0][0].id)] = group[0][1]
+            for chal, path in group[1:]:
+                candidate = path
+                while candidate.casefold() in taken:
+                    candidate = f"{candidate}-{chal.id}"
+                taken.add(candidate.casefold())
+                paths[str(chal.id)] = candidate
+
+        if existing is None:
+            depth = max((path.count("/") + 1 for path in paths.values()), default=0)
+            existing = _scan_dirs(output_dir, depth)
+        return cls(output_dir, paths, existing)
+
+    def path_for(self, chal: Challenge) -> str:
+        return self.paths[str(chal.id)]
+
+    def exists(self, chal: Challenge) -> bool:
+        return self.path_for(chal) in self.existing
+
+    def create(self, challenges: Iterable[Challenge]):
+        """Create the folders of the given challenges in one pass over the sorted paths."""
+        for path in sorted({self.path_for(chal) for chal in challenges} - self.existing):
+            (self.output_dir / path).mkdir(parents=True, exist_ok=True)
+
+    def discard(self, chal: Challenge):
+        """Remove a folder created by `create` that ended up unused."""
+        path = self.path_for(chal)
+        if path not in self.existing:
+            discard_folder(self.output_dir / path)
@@ -0,0 +1,97 @@
+import itertools
+from collections import deque
+from typing import TypeVar
+
+from ctfbridge.models.challenge import Challenge
+
+T = TypeVar("T")
+
+SCHEDULE_POLICIES = ("listing", "size", "category", "points", "unsolved")
+
+
+def estimated_size(chal: Challenge) -> int:
+    """Attachment bytes known for a challenge; unknown sizes count as zero."""
+    return sum(att.size_bytes or 0 for att in chal.attachments)
+
+
+class ChallengeScheduler:
+    """
+    Orders queued challenge work by a policy.
+
+    `size`, `points` and `unsolved` order all work by their key. Challenges with equal
+    keys are interleaved across categories with a smooth weighted round-robin, so a
+    run of ties from one category cannot hold back the others. `category` instead
+    drains categories strictly in `category_priority` order. `listing` keeps the
+    platform's order.
+
+    Most platforms only list attachments in challenge details, so for `size` the
+    exporter fetches details and probes attachment sizes before ordering.
+    """
+
+    def __init__(
+        self,
+        policy: str = "listing",
+        category_priority: list[str] | None = None,
+        category_weights: dict[str, int] | None = None,
+    ):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"Unknown schedule policy: {policy}")
+        self.policy = policy
+        self.category_priority = category_priority or []
+        self.category_weights = category_weights or {}
+
+    def _key(self, chal: Challenge) -> tuple:
+        if self.policy == "size":
+            return (estimated_size(chal),)
+        if self.policy == "points":
+            return (chal.value is None, chal.value or 0)
+        if self.policy == "unsolved":
+            return (bool(chal.solved),)
+        return ()
+
+    def _category_rank(self, category: str | None) -> int:
+        try:
+            return self.category_priority.index(category)
+        except ValueError:
+            return len(self.category_priority)
+
+    def order(self, items: list[tuple[Challenge, T]]) -> list[T]:
+        if self.policy == "listing":
+            return [item for _, item in items]
+
+        if self.policy == "category":
+            ranked = sorted(
+                enumerate(items), key=lambda e: (self._category_rank(e[1][0].category), e[0])
+            )
+            return [item for _, (_, item) in ranked]
+
+        ordered = []
+        ranked = sorted(enumerate(items), key=lambda e: (self._key(e[1][0]), e[0]))
+        for _, ties in itertools.groupby(ranked, key=lambda e: self._key(e[1][0])):
+            ordered += self._interleave([item for _, item in ties])
+        return ordered
+
+    def _interleave(self, items: list[tuple[Challenge, T]]) -> list[T]:
+        """Items in order within their category, with categories taking weighted turns."""
+        queues: dict[str | None, deque] = {}
+        for chal, item in items:
+            queues.setdefault(chal.category, deque()).append(item)
+
+        # Ties between categories go to the one earlier in the priority list
+        categories = sorted(queues, key=self._category_rank)
+        weights = {c: max(1, self.category_weights.get(c or "", 1)) for c in categories}
+        current = dict.fromkeys(categories, 0)
+
+        ordered = []
+        while categories:
+            total = sum(weights[c] for c in categories)
+            for c in categories:
+                current[c] += weights[c]
+            chosen = max(categories, key=lambda c: current[c])
+            current[chosen] -= total
+
+            ordered.append(queues[chosen].popleft())
+            if not queues[chosen]:
+                categories.remove(chosen)
+
+        return ordered
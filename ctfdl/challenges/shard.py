@@ -0,0 +1,80 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from ctfbridge.models.challenge import Challenge
+from pydantic import BaseModel
+
+from ctfdl.core.config import state_dir
+from ctfdl.core.models import ChallengeEntry
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIR = "index-spool"
+
+
+def shard_of(challenge: Challenge, count: int) -> int:
+    """The 1-based shard a challenge belongs to, stable across runs, machines and Pythons."""
+    digest = hashlib.sha256(str(challenge.id).encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def spool_dir(output: Path) -> Path:
+    return state_dir(output) / SPOOL_DIR
+
+
+def write_spool(output: Path, shard: tuple[int, int], url: str, entries: list[ChallengeEntry]):
+    """Write the index entries of one shard for `ctf-dl merge-index` to combine later."""
+    index, count = shard
+    path = spool_dir(output) / f"shard-{index}-of-{count}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    spool = {
+        "shard": index,
+        "shards": count,
+        "url": url,
+        "entries": [entry.model_dump(mode="json") for entry in entries],
+    }
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(spool), encoding="utf-8")
+    tmp.replace(path)
+    return path
+
+
+class MergedSpools(BaseModel):
+    entries: list[ChallengeEntry] = []
+    missing: list[int] = []
+    url: str | None = None
+
+
+def read_spools(output: Path) -> MergedSpools:
+    """
+    Combine every shard spool of an output folder.
+
+    Entries are ordered by path and deduplicated on it, and `missing` lists the shards
+    that have not written a spool yet. Spools left over from a run with a different
+    shard count than the most recently written one are ignored.
+    """
+    spools = []
+    for path in spool_dir(output).glob("shard-*.json"):
+        try:
+            spools.append((path.stat().st_mtime, json.loads(path.read_text(encoding="utf-8"))))
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable spool %s: %s", path, e)
+    if not spools:
+        return MergedSpools()
+
+    count = max(spools, key=lambda s: s[0])[1]["shards"]
+    spools = [spool for _, spool in spools if spool["shards"] == count]
+    missing = sorted(set(range(1, count + 1)) - {spool["shard"] for spool in spools})
+
+    entries: dict[str, ChallengeEntry] = {}
+    for spool in spools:
+        for data in spool["entries"]:
+            entry = ChallengeEntry.load(data)
+            entries[entry.path.as_posix()] = entry
+    return MergedSpools(
+        entries=[entries[path] for path in sorted(entries)],
+        missing=missing,
+        url=spools[0].get("url"),
+    )
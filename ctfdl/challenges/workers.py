@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.challenges.deferred import AttachmentBudget
+from ctfdl.challenges.downloader import ChallengeExporter, connect
+from ctfdl.common.logging import setup_logging_with_rich
+from ctfdl.common.prettify_cache import open_prettify_cache
+from ctfdl.common.ratelimit import BandwidthLimiter
+from ctfdl.common.transport import make_platform_client
+from ctfdl.core import EventEmitter, ExportConfig
+from ctfdl.core.models import ChallengeEntry
+from ctfdl.rendering.engine import TemplateEngine
+
+logger = logging.getLogger(__name__)
+
+# End-of-work marker. A puller that takes it puts it back, so a single marker stops
+# every puller of every worker.
+DONE = None
+
+WorkItem = tuple[Challenge, str, bool]
+
+
+class QueueEmitter(EventEmitter):
+    """Forwards every event of a worker process to the parent over a queue."""
+
+    def __init__(self, queue: Any):
+        super().__init__()
+        self._queue = queue
+
+    async def emit(self, event_name: str, *args: Any, **kwargs: Any):
+        self._queue.put((event_name, args, kwargs))
+
+
+def split_budget(config: ExportConfig, workers: int) -> AttachmentBudget | None:
+    """Give each worker an equal share of the category budgets; the per-file limit stays."""
+    if config.max_attachment_size is None and not config.category_budgets:
+        return None
+    shares = {c: budget // workers for c, budget in (config.category_budgets or {}).items()}
+    return AttachmentBudget(config.max_attachment_size, shares)
+
+
+async def forward_events(
+    events: Any,
+    emitter: EventEmitter,
+    entries: list[ChallengeEntry],
+    completed: set[str] | None = None,
+) -> list[str]:
+    """
+    Re-emit worker events in this process until DONE.
+
+    Exported entries are collected into `entries` and the ids of challenges that were
+    attempted, successfully or not, into `completed`; the reasons of workers that could
+    not connect are returned.
+    """
+    loop = asyncio.get_running_loop()
+    failures = []
+    while (message := await loop.run_in_executor(None, events.get)) is not DONE:
+        event_name, args, kwargs = message
+        if event_name == "worker_fail":
+            logger.warning("A worker process could not connect: %s", kwargs["reason"])
+            failures.append(kwargs["reason"])
+            continue
+        if event_name == "challenge_exported":
+            entries.append(kwargs["entry"])
+        elif event_name == "challenge_complete" and completed is not None:
+            completed.add(str(kwargs["challenge"].id))
+        await emitter.emit(event_name, *args, **kwargs)
+    return failures
+
+
+async def _pull(work: Any, exporter: ChallengeExporter, pool: ThreadPoolExecutor):
+    loop = asyncio.get_running_loop()
+    while (item := await loop.run_in_executor(pool, work.get)) is not DONE:
+        await exporter.export(*item)
+    work.put(DONE)
+
+
+async def _worker(config: ExportConfig, engine: TemplateEngine, work: Any, events: Any):
+    emitter = QueueEmitter(events)
+    failures: list[str] = []
+    # Connecting is reported once by the parent; workers only pass on why they failed
+    quiet = EventEmitter()
+    quiet.on("connect_fail", lambda reason: failures.append(reason))
+
+    # Every worker gets an equal share of the bandwidth limits
+    limiter = BandwidthLimiter.from_profile(config.transport, share=config.workers)
+    platform_http = make_platform_client(config.transport, limiter)
+    try:
+        client = await connect(config, quiet, platform_http)
+        if client is None:
+            await emitter.emit("worker_fail", reason=failures[0] if failures else "unknown")
+            return
+
+        exporter = ChallengeExporter(
+            client,
+            config,
+            emitter,
+            engine,
+            budget=split_budget(config, config.workers),
+            extract_workers=config.extract_workers
+            or max(1, (os.cpu_count() or 1) // config.workers),
+            limiter=limiter,
+        )
+        concurrency = math.ceil(config.parallel / config.workers)
+        try:
+            with ThreadPoolExecutor(concurrency, thread_name_prefix="ctfdl-queue") as pool:
+                await asyncio.gather(*(_pull(work, exporter, pool) for _ in range(concurrency)))
+        finally:
+            await exporter.aclose()
+    finally:
+        await platform_http.aclose()
+
+
+def _worker_main(config: ExportConfig, work: Any, events: Any):
+    setup_logging_with_rich(debug=config.debug)
+    engine = TemplateEngine(config.template_dir)
+    prettify_cache = open_prettify_cache(config.prettify_cache, config.prettify_cache_size)
+    engine.use_prettify_cache(prettify_cache)
+    try:
+        asyncio.run(_worker(config, engine, work, events))
+    finally:
+        if prettify_cache:
+            prettify_cache.close()
+
+
+async def _expire(work: Any, deadline: float, left: list[WorkItem]):
+    """At the deadline, take back the work no worker has started yet."""
+    await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+    while True:
+        try:
+            item = work.get_nowait()
+        except queue.Empty:
+            break
+        if item is not DONE:
+            left.append(item)
+    work.put(DONE)
+
+
+async def run_worker_pool(
+    config: ExportConfig,
+    emitter: EventEmitter,
+    work: list[WorkItem],
+    deadline: float | None = None,
+) -> tuple[list[ChallengeEntry], list[WorkItem]]:
+    """
+    Export the scheduled work in `config.workers` processes.
+
+    Each worker has its own event loop, login and connection pools, and pulls work in
+    schedule order from a shared queue, so a slow challenge never holds up the others.
+    Events come back over a second queue and are re-emitted here for the UI and the
+    search index. Returns the exported entries and the work left at the deadline or
+    by workers that crashed, so a journaled run can pick it up again.
+    """
+    # Forked children would inherit this process's running loop and connection pools
+    ctx = multiprocessing.get_context("spawn")
+    work_queue = ctx.Queue()
+    events = ctx.Queue()
+    for item in work:
+        work_queue.put(item)
+    work_queue.put(DONE)
+
+    processes = [
+        ctx.Process(
+            target=_worker_main,
+            args=(config, work_queue, events),
+            name=f"ctfdl-worker-{i + 1}",
+        )
+        for i in range(min(config.workers, len(work)))
+    ]
+    for process in processes:
+        process.start()
+
+    entries: list[ChallengeEntry] = []
+    completed: set[str] = set()
+    left: list[WorkItem] = []
+    forwarder = asyncio.create_task(forward_events(events, emitter, entries, completed))
+    expiry = asyncio.create_task(_expire(work_queue, deadline, left)) if deadline else None
+    loop = asyncio.get_running_loop()
+    try:
+        for process in processes:
+            await loop.run_in_executor(None, process.join)
+            if process.exitcode:
+                logger.warning("%s exited with code %s", process.name, process.exitcode)
+        # Children flush their queued events before exiting, so DONE arrives last
+        events.put(DONE)
+        failures = await forwarder
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        forwarder.cancel()
+        if expiry:
+            expiry.cancel()
+        # Work left behind by failed workers must not keep this process from exiting
+        work_queue.cancel_join_thread()
+
+    crashed = [process for process in processes if process.exitcode]
+    if failures and len(failures) == len(processes):
+        raise RuntimeError(f"No worker process could connect: {failures[0]}")
+    if crashed:
+        # What a crashed worker had in progress, or never got to, is left for the next run
+        taken = completed | {str(chal.id) for chal, _, _ in left}
+        left += [item for item in work if str(item[0].id) not in taken]
+        if len(failures) + len(crashed) == len(processes):
+            raise RuntimeError(
+                f"Every worker process failed, {len(left)} challenges left; "
+                "run the same command again to continue"
+            )
+        await emitter.emit("workers_crashed", count=len(crashed))
+    return entries, left
@@ -1,13 +1,94 @@
+import re
+from collections.abc import Callable
 from pathlib import Path
 
 import typer
+from typer.core import TyperGroup
 
 from ctfdl.common.updates import check_updates
 from ctfdl.common.version import show_version
-from ctfdl.core.config import ExportConfig
+from ctfdl.core.config import (
+    DeadlinePolicy,
+    ExportConfig,
+    OutputVariant,
+    S3Target,
+    TransportProfile,
+)
 from ctfdl.rendering.inspector import list_available_templates
 
 
+class DefaultCommandGroup(TyperGroup):
+    """Routes arguments that do not name a subcommand to the export command."""
+
+    default_command = "export"
+
+    def parse_args(self, ctx, args):
+        if not args or args[0] not in self.commands:
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(value: str) -> int:
+    """Parse sizes such as `512`, `200K`, `1.5G` or `10GB` into bytes."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*", value, re.IGNORECASE)
+    if not m:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).upper()])
+
+
+def parse_datasets(values: list[str]) -> list[Path]:
+    from ctfdl.rendering.dataset import dataset_format
+
+    paths = [Path(value) for value in values]
+    for path in paths:
+        dataset_format(path)
+    return paths
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse `i/n` (1-based) into (i, n)."""
+    index, sep, count = value.partition("/")
+    try:
+        shard = (int(index), int(count))
+    except ValueError:
+        shard = None
+    if not sep or shard is None or not 1 <= shard[0] <= shard[1]:
+        raise ValueError(f"Invalid shard '{value}', expected i/n with 1 <= i <= n")
+    return shard
+
+
+def parse_s3_url(url: str) -> tuple[str, str]:
+    """Bucket and key prefix of an `s3://bucket/prefix` URL."""
+    if not url.startswith("s3://"):
+        raise ValueError(f"Invalid S3 URL '{url}', expected s3://bucket/prefix")
+    bucket, _, prefix = url.removeprefix("s3://").partition("/")
+    if not bucket:
+        raise ValueError(f"Invalid S3 URL '{url}', the bucket is missing")
+    prefix = prefix.strip("/")
+    return bucket, f"{prefix}/" if prefix else ""
+
+
+def parse_category_values(
+    values: list[str] | None, parse: Callable[[str], int], what: str, key: str = "CATEGORY"
+) -> dict[str, int] | None:
+    """Parse repeated `CATEGORY=VALUE` (or `<key>=VALUE`) options into a dictionary."""
+    if not values:
+        return None
+    parsed = {}
+    for value in values:
+        category, sep, raw = value.rpartition("=")
+        if not sep or not category:
+            raise ValueError(f"Invalid {what}: {value} (expected {key}=VALUE)")
+        try:
+            parsed[category] = parse(raw)
+        except ValueError:
+            raise ValueError(f"Invalid {what}: {value}")
+    return parsed
+
+
 def resolve_output_format(name: str) -> tuple[str, str, str]:
     output_format_map = {
         "json": ("json", "json", "flat"),
@@ -19,10 +100,85 @@ def resolve_output_format(name: str) -> tuple[str, str, str]:
     return output_format_map[name.lower()]
 
 
+def split_values(values: list[str] | None) -> list[str]:
+    """Flatten options that may be repeated and may hold comma-separated values."""
+    return [part.strip() for value in values or [] for part in value.split(",") if part.strip()]
+
+
+def resolve_output_variants(
+    output_formats: list[str], variant_names: list[str], index_template_names: list[str]
+) -> list[tuple[str, str, str, str | None]]:
+    """
+    Name, variant, index template and folder template of every output tree to render.
+
+    Output formats bring their own templates. Otherwise variants and index templates are
+    paired in order, and one given once is used for every tree.
+    """
+    if output_formats:
+        outputs = [(name.lower(), *resolve_output_format(name)) for name in output_formats]
+    else:
+        count = max(len(variant_names), len(index_template_names), 1)
+        for option, values in (
+            ("--template", variant_names),
+            ("--index-template", index_template_names),
+        ):
+            if len(values) not in (1, count):
+                raise ValueError(f"Give {option} once or {count} times, once per output")
+        variants = variant_names * count if len(variant_names) == 1 else variant_names
+        indexes = (
+            index_template_names * count if len(index_template_names) == 1 else index_template_names
+        )
+        names = (
+            variants
+            if len(set(variants)) == count
+            else [f"{v}-{i}" for v, i in zip(variants, indexes)]
+        )
+        outputs = [(name, v, i, None) for name, v, i in zip(names, variants, indexes)]
+
+    names = [name for name, _, _, _ in outputs]
+    if len(set(names)) < len(names):
+        raise ValueError(f"Output selected twice: {', '.join(names)}")
+    return outputs
+
+
+def build_s3_target(args: dict) -> S3Target:
+    bucket, prefix = parse_s3_url(args["s3"])
+    return S3Target(
+        bucket=bucket,
+        prefix=prefix,
+        endpoint=args["s3_endpoint"],
+        region=args["s3_region"],
+        access_key=args["s3_access_key"],
+        secret_key=args["s3_secret_key"],
+    )
+
+
+def build_transport_profile(args: dict) -> TransportProfile:
+    """Network settings from command options; ones a command does not have keep their default."""
+    values = {
+        name: args[name]
+        for name in TransportProfile.model_fields
+        if args.get(name) is not None and name != "host_bandwidth"
+    }
+    for name in ("record", "replay"):
+        if name in values:
+            values[name] = Path(values[name])
+    if "max_bandwidth" in values:
+        values["max_bandwidth"] = parse_size(values["max_bandwidth"])
+    host_bandwidth = parse_category_values(
+        args.get("host_bandwidth"), parse_size, "host bandwidth", key="HOST"
+    )
+    return TransportProfile(**values, host_bandwidth=host_bandwidth or {})
+
+
 def build_export_config(args: dict) -> ExportConfig:
+    # With several outputs, every tree gets a folder of its own inside the output folder
+    output = Path(args["output"])
+    outputs = args["outputs"]
+
     return ExportConfig(
         url=args["url"],
-        output=Path(args["output"]),
+        output=output / outputs[0][0] if len(outputs) > 1 else output,
         token=args["token"],
         username=args["username"],
         password=args["password"],
@@ -31,16 +187,62 @@ def build_export_config(args: dict) -> ExportConfig:
         variant_name=args["variant_name"],
         folder_template_name=args["folder_template_name"],
         index_template_name=args["index_template_name"],
+        extra_outputs=[
+            OutputVariant(output=output / name, variant_name=variant, index_template_name=index)
+            for name, variant, index, _ in outputs[1:]
+        ],
         no_index=args["no_index"],
         categories=args["categories"],
         min_points=args["min_points"],
         max_points=args["max_points"],
-        status=args["status"],
+        solved=args["status"] == "solved",
+        unsolved=args["status"] == "unsolved",
+        name_pattern=args["name_pattern"],
         update=args["update"],
+        prune=args["prune"],
         no_attachments=args["no_attachments"],
         parallel=args["parallel"],
+        workers=args["workers"],
+        resume=not args["no_resume"],
+        dry_run=args["dry_run"],
+        schedule=args["schedule"].value,
+        category_priority=args["category_priority"],
+        category_weights=parse_category_values(args["category_weights"], int, "category weight"),
+        chunk_size=args["chunk_size"],
+        fsync=args["fsync"].value,
+        blake3=args["blake3"],
+        max_attachment_size=(
+            parse_size(args["max_attachment_size"]) if args["max_attachment_size"] else None
+        ),
+        category_budgets=parse_category_values(
+            args["category_budgets"], parse_size, "category budget"
+        ),
+        transport=build_transport_profile(args),
+        deadlines=DeadlinePolicy(
+            request=args["request_timeout"],
+            challenge=args["challenge_timeout"],
+            stall=args["stall_timeout"],
+            restarts=args["stall_restarts"],
+            hedge_after=args["hedge_after"],
+            run_budget=args["time_budget"],
+        ),
+        extract=args["extract"],
+        extract_workers=args["extract_workers"],
+        extract_max_size=parse_size(args["extract_max_size"]),
+        extract_max_files=args["extract_max_files"],
+        extract_max_ratio=args["extract_max_ratio"],
+        shard=parse_shard(args["shard"]) if args["shard"] else None,
+        prettify_cache=Path(args["prettify_cache"]) if args["prettify_cache"] else None,
+        prettify_cache_size=parse_size(args["prettify_cache_size"]),
+        search_index=not args["no_search_index"],
+        search_index_path=Path(args["search_index_path"]) if args["search_index_path"] else None,
+        datasets=parse_datasets(args["dataset"] or []),
         list_templates=args["list_templates"],
         zip_output=args["zip_output"],
+        git_repo=Path(args["git_repo"]) if args["git_repo"] else None,
+        s3=build_s3_target(args) if args["s3"] else None,
+        git_branch=args["git_branch"],
+        git_lfs=args["git_lfs"],
         debug=args["debug"],
     )
 
@@ -55,6 +257,149 @@ def handle_check_update():
     raise typer.Exit()
 
 
+def handle_fetch(
+    paths: list[str],
+    parallel: int,
+    chunk_size: int,
+    fsync: str,
+    blake3: bool,
+    network: dict,
+    stall_timeout: float | None,
+    credentials: dict,
+):
+    import asyncio
+
+    from ctfdl.challenges.fetch import fetch_deferred
+
+    try:
+        transport = build_transport_profile(network)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    ok = asyncio.run(
+        fetch_deferred(
+            paths, parallel, chunk_size, fsync, blake3, transport, stall_timeout, **credentials
+        )
+    )
+    raise typer.Exit(code=0 if ok else 1)
+
+
+def handle_search(
+    query: str,
+    output: str,
+    index_path: str | None,
+    category: str | None,
+    limit: int,
+    raw: bool,
+    reindex: bool,
+    ctf: str | None,
+):
+    import sqlite3
+
+    import ctfdl.ui.messages as console_utils
+    from ctfdl.search.index import SearchIndex, default_index_path, reindex_tree
+
+    path = Path(index_path) if index_path else default_index_path(Path(output))
+    if not reindex and not path.exists():
+        console_utils.error(f"No search index at {path} (use --reindex to build one)")
+        raise typer.Exit(code=1)
+
+    try:
+        index = SearchIndex(path)
+    except RuntimeError as e:
+        console_utils.error(str(e))
+        raise typer.Exit(code=1)
+
+    try:
+        if reindex:
+            count = reindex_tree(index, Path(output), ctf)
+            console_utils.success(f"Indexed {count} challenges from {output}")
+        if query:
+            try:
+                hits = index.search(query, limit=limit, category=category, raw=raw)
+            except sqlite3.OperationalError as e:
+                raise typer.BadParameter(f"Invalid search query: {e}")
+            console_utils.search_results(hits)
+    finally:
+        index.close()
+    raise typer.Exit()
+
+
+def handle_serve_cache(host: str, port: int, cache_dir: str, key: str | None, api_ttl: float):
+    import ipaddress
+    import secrets
+    import socket
+
+    import ctfdl.ui.messages as console_utils
+    from ctfdl.common.cache_server import make_cache_server
+
+    key = key or secrets.token_urlsafe(16)
+    try:
+        server = make_cache_server(host, port, Path(cache_dir), key, api_ttl)
+    except OSError as e:
+        console_utils.error(f"Could not start the cache on {host}:{port}: {e}")
+        raise typer.Exit(code=1)
+
+    console_utils.success(f"Serving the cache in {cache_dir} on http://{host}:{port}")
+    if ipaddress.ip_address(socket.gethostbyname(host)).is_loopback:
+        console_utils.warning(
+            "Only this machine can connect; pass --host 0.0.0.0 to serve the team "
+            "(the cache is plain HTTP, so only do that on a network you trust)"
+        )
+    console_utils.info(
+        f"Teammates run: ctf-dl <url> --via http://<this host>:{port} --via-key {key}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    raise typer.Exit()
+
+
+def handle_merge_index(
+    output: str, template_dir: str | None, index_template_name: str, no_search_index: bool
+):
+    import ctfdl.ui.messages as console_utils
+    from ctfdl.challenges.shard import read_spools
+    from ctfdl.rendering.engine import TemplateEngine
+
+    output_dir = Path(output)
+    merged = read_spools(output_dir)
+    entries, missing = merged.entries, merged.missing
+    if not entries:
+        console_utils.error(f"No index spools found in {output_dir}")
+        raise typer.Exit(code=1)
+    if missing:
+        console_utils.warning(
+            f"No spool from shard {', '.join(map(str, missing))} yet; "
+            f"those challenges are missing from the index"
+        )
+
+    engine = TemplateEngine(Path(template_dir) if template_dir else None)
+    engine.render_index(index_template_name, entries, output_dir / "index.md")
+
+    if not no_search_index:
+        from ctfdl.search.index import SearchIndex, ctf_label, default_index_path, record_source
+
+        try:
+            index = SearchIndex(default_index_path(output_dir))
+        except RuntimeError as e:
+            console_utils.warning(f"Search index not updated: {e}")
+        else:
+            ctf = None
+            if merged.url:
+                ctf = ctf_label(merged.url)
+                record_source(output_dir, merged.url)
+            index.add_many(
+                (output_dir, entry.path, entry.data.model_dump(), ctf) for entry in entries
+            )
+            index.close()
+
+    console_utils.success(f"Merged the index of {len(entries)} challenges into {output_dir}")
+    raise typer.Exit()
+
+
 def handle_list_templates(template_dir):
     list_available_templates(
         Path(template_dir) if template_dir else Path(),
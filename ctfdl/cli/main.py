@@ -1,5 +1,6 @@
 import asyncio
 import getpass
+import re
 import sys
 from enum import Enum
 
@@ -7,11 +8,17 @@ import typer
 from rich.console import Console
 
 from ctfdl.cli.helpers import (
+    DefaultCommandGroup,
     build_export_config,
     handle_check_update,
+    handle_fetch,
     handle_list_templates,
+    handle_merge_index,
+    handle_search,
+    handle_serve_cache,
     handle_version,
-    resolve_output_format,
+    resolve_output_variants,
+    split_values,
 )
 
 
@@ -21,11 +28,33 @@ class ChallengeStatus(str, Enum):
     unsolved = "unsolved"
 
 
+class SchedulePolicy(str, Enum):
+    listing = "listing"
+    size = "size"
+    category = "category"
+    points = "points"
+    unsolved = "unsolved"
+
+
+class FsyncPolicy(str, Enum):
+    none = "none"
+    file = "file"
+    full = "full"
+
+
 console = Console(log_path=False)
 app = typer.Typer(
+    cls=DefaultCommandGroup,
     add_completion=False,
     no_args_is_help=False,
     invoke_without_command=True,
+    context_settings={"help_option_names": ["-h", "--help"]},
+)
+
+
+@app.command(
+    name="export",
+    epilog="Other commands: fetch, search, merge-index",
     context_settings={
         "help_option_names": ["-h", "--help"],
         "allow_extra_args": False,
@@ -33,9 +62,6 @@ app = typer.Typer(
         "token_normalize_func": lambda x: x,
     },
 )
-
-
-@app.command(name=None)
 def cli(
     version: bool = typer.Option(
         False,
@@ -73,11 +99,63 @@ def cli(
         help="Compress output folder after download",
         rich_help_panel="Output",
     ),
-    output_format: str | None = typer.Option(
+    git_repo: str | None = typer.Option(
+        None,
+        "--git",
+        help="Commit the export into this git repository instead of writing a folder",
+        rich_help_panel="Output",
+    ),
+    git_branch: str = typer.Option(
+        "ctf-dl",
+        "--git-branch",
+        help="Branch that --git commits to",
+        rich_help_panel="Output",
+    ),
+    git_lfs: bool = typer.Option(
+        False,
+        "--git-lfs",
+        help="Store attachments as Git LFS objects when using --git",
+        rich_help_panel="Output",
+    ),
+    s3: str | None = typer.Option(
+        None,
+        "--s3",
+        help="Upload the export to an S3-compatible bucket (s3://bucket/prefix) instead of a folder",
+        rich_help_panel="Output",
+    ),
+    s3_endpoint: str | None = typer.Option(
+        None,
+        "--s3-endpoint",
+        envvar="AWS_ENDPOINT_URL",
+        help="Endpoint of an S3-compatible service, e.g. http://localhost:9000 (default: AWS)",
+        rich_help_panel="Output",
+    ),
+    s3_region: str = typer.Option(
+        "us-east-1",
+        "--s3-region",
+        envvar="AWS_REGION",
+        help="Region of the bucket",
+        rich_help_panel="Output",
+    ),
+    s3_access_key: str | None = typer.Option(
+        None,
+        "--s3-access-key",
+        envvar="AWS_ACCESS_KEY_ID",
+        help="Access key for --s3",
+        rich_help_panel="Output",
+    ),
+    s3_secret_key: str | None = typer.Option(
+        None,
+        "--s3-secret-key",
+        envvar="AWS_SECRET_ACCESS_KEY",
+        help="Secret key for --s3",
+        rich_help_panel="Output",
+    ),
+    output_format: list[str] | None = typer.Option(
         None,
         "--output-format",
         "-f",
-        help="Preset output format (json, markdown, minimal)",
+        help="Preset output format (json, markdown, minimal); several render one tree each",
         rich_help_panel="Output",
     ),
     template_dir: str | None = typer.Option(
@@ -86,10 +164,10 @@ def cli(
         help="Directory containing custom templates",
         rich_help_panel="Templating",
     ),
-    variant_name: str = typer.Option(
-        "default",
+    variant_name: list[str] = typer.Option(
+        ["default"],
         "--template",
-        help="Challenge template variant to use",
+        help="Challenge template variant to use; several render one tree each",
         rich_help_panel="Templating",
     ),
     folder_template_name: str = typer.Option(
@@ -98,10 +176,10 @@ def cli(
         help="Template for folder structure",
         rich_help_panel="Templating",
     ),
-    index_template_name: str | None = typer.Option(
-        "grouped",
+    index_template_name: list[str] = typer.Option(
+        ["grouped"],
         "--index-template",
-        help="Template for challenge index",
+        help="Template for challenge index, one per --template when several are given",
         rich_help_panel="Templating",
     ),
     no_index: bool = typer.Option(
@@ -110,6 +188,36 @@ def cli(
         help="Do not generate an index file",
         rich_help_panel="Templating",
     ),
+    prettify_cache: str | None = typer.Option(
+        None,
+        "--prettify-cache",
+        help="Cache of prettified outputs (default: ~/.cache/ctf-dl/prettify.sqlite)",
+        rich_help_panel="Templating",
+    ),
+    prettify_cache_size: str = typer.Option(
+        "64M",
+        "--prettify-cache-size",
+        help="Size limit of the prettify cache, e.g. 256M (0 disables it)",
+        rich_help_panel="Templating",
+    ),
+    no_search_index: bool = typer.Option(
+        False,
+        "--no-search-index",
+        help="Do not update the full-text search index",
+        rich_help_panel="Output",
+    ),
+    search_index_path: str | None = typer.Option(
+        None,
+        "--search-index",
+        help="Search index to update, e.g. one shared by several exports",
+        rich_help_panel="Output",
+    ),
+    dataset: list[str] | None = typer.Option(
+        None,
+        "--dataset",
+        help="Also collect all challenges into an NDJSON (.ndjson/.jsonl) or SQLite (.sqlite/.db) file (repeatable)",
+        rich_help_panel="Output",
+    ),
     list_templates: bool = typer.Option(
         False,
         "--list-templates",
@@ -156,6 +264,12 @@ def cli(
     max_points: int | None = typer.Option(
         None, "--max-points", help="Maximum challenge points", rich_help_panel="Filters"
     ),
+    name_pattern: str | None = typer.Option(
+        None,
+        "--name",
+        help="Only download challenges whose name matches this regular expression",
+        rich_help_panel="Filters",
+    ),
     status: ChallengeStatus = typer.Option(
         ChallengeStatus.all,
         "--status",
@@ -169,6 +283,24 @@ def cli(
         help="Update existing challenges instead of skipping them (overwrites existing files)",
         rich_help_panel="Behavior",
     ),
+    no_resume: bool = typer.Option(
+        False,
+        "--no-resume",
+        help="Start over instead of resuming an interrupted run",
+        rich_help_panel="Behavior",
+    ),
+    prune: bool = typer.Option(
+        False,
+        "--prune",
+        help="Delete folders of challenges that are no longer on the platform",
+        rich_help_panel="Behavior",
+    ),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        help="Print the export plan with sizes and an estimated duration, without writing anything",
+        rich_help_panel="Behavior",
+    ),
     no_attachments: bool = typer.Option(
         False,
         "--no-attachments",
@@ -181,6 +313,228 @@ def cli(
         help="Number of parallel downloads",
         rich_help_panel="Behavior",
     ),
+    workers: int = typer.Option(
+        1,
+        "--workers",
+        min=1,
+        help="Worker processes to spread challenges over, each with its own connections",
+        rich_help_panel="Behavior",
+    ),
+    max_connections: int = typer.Option(
+        20,
+        "--max-connections",
+        min=1,
+        help="Maximum open connections per client",
+        rich_help_panel="Network",
+    ),
+    keepalive_expiry: float = typer.Option(
+        30.0,
+        "--keepalive-expiry",
+        min=0,
+        help="Seconds an idle connection is kept open",
+        rich_help_panel="Network",
+    ),
+    http2: bool = typer.Option(
+        False,
+        "--http2",
+        help="Multiplex requests over HTTP/2 (needs the h2 package)",
+        rich_help_panel="Network",
+    ),
+    connect_timeout: float = typer.Option(
+        10.0,
+        "--connect-timeout",
+        min=0.1,
+        help="Seconds to wait for a connection",
+        rich_help_panel="Network",
+    ),
+    read_timeout: float = typer.Option(
+        30.0,
+        "--read-timeout",
+        min=0.1,
+        help="Seconds to wait for data on an open connection",
+        rich_help_panel="Network",
+    ),
+    dns_cache_ttl: float = typer.Option(
+        300.0,
+        "--dns-cache-ttl",
+        min=0,
+        help="Seconds to cache DNS lookups (0 disables)",
+        rich_help_panel="Network",
+    ),
+    request_timeout: float | None = typer.Option(
+        None,
+        "--request-timeout",
+        min=0.1,
+        help="Seconds an API request may take in total",
+        rich_help_panel="Network",
+    ),
+    hedge_after: float | None = typer.Option(
+        None,
+        "--hedge-after",
+        min=0.1,
+        help="Send a second copy of an API request still unanswered after this many seconds",
+        rich_help_panel="Network",
+    ),
+    stall_timeout: float | None = typer.Option(
+        None,
+        "--stall-timeout",
+        min=0.1,
+        help="Restart a download that received no data for this many seconds",
+        rich_help_panel="Network",
+    ),
+    stall_restarts: int = typer.Option(
+        2,
+        "--stall-restarts",
+        min=0,
+        help="How often a stalled download is restarted (resuming with a range if possible)",
+        rich_help_panel="Network",
+    ),
+    challenge_timeout: float | None = typer.Option(
+        None,
+        "--challenge-timeout",
+        min=0.1,
+        help="Give up on a challenge that takes longer than this many seconds",
+        rich_help_panel="Behavior",
+    ),
+    time_budget: float | None = typer.Option(
+        None,
+        "--time-budget",
+        min=1,
+        help="Stop starting challenges after this many seconds and report what is left",
+        rich_help_panel="Behavior",
+    ),
+    record: str | None = typer.Option(
+        None,
+        "--record",
+        help="Record all HTTP traffic of the export into a cassette directory",
+        rich_help_panel="Network",
+    ),
+    replay: str | None = typer.Option(
+        None,
+        "--replay",
+        help="Replay a recorded cassette instead of using the network",
+        rich_help_panel="Network",
+    ),
+    replay_scale: float = typer.Option(
+        1.0,
+        "--replay-scale",
+        min=0,
+        help="Multiply replayed latencies (0 replays as fast as possible)",
+        rich_help_panel="Network",
+    ),
+    via: str | None = typer.Option(
+        None,
+        "--via",
+        help="Send all requests through a team cache started with `ctf-dl serve-cache`",
+        rich_help_panel="Network",
+    ),
+    via_key: str | None = typer.Option(
+        None,
+        "--via-key",
+        envvar="CTFDL_VIA_KEY",
+        help="Key printed by `ctf-dl serve-cache`",
+        rich_help_panel="Network",
+    ),
+    max_bandwidth: str | None = typer.Option(
+        None,
+        "--max-bandwidth",
+        help="Limit attachment downloads to this many bytes per second (e.g. 5M)",
+        rich_help_panel="Network",
+    ),
+    host_bandwidth: list[str] | None = typer.Option(
+        None,
+        "--host-bandwidth",
+        help="Bytes per second for one host, e.g. files.example.com=1M (repeatable)",
+        rich_help_panel="Network",
+    ),
+    shard: str | None = typer.Option(
+        None,
+        "--shard",
+        help="Only export shard i of n (e.g. 2/4), for splitting a job across machines",
+        rich_help_panel="Behavior",
+    ),
+    schedule: SchedulePolicy = typer.Option(
+        SchedulePolicy.listing,
+        "--schedule",
+        case_sensitive=False,
+        help="Order of challenge downloads: listing, size (small first), category, points, unsolved",
+        rich_help_panel="Behavior",
+    ),
+    category_priority: list[str] | None = typer.Option(
+        None,
+        "--category-priority",
+        help="Categories to download first, in order (repeatable)",
+        rich_help_panel="Behavior",
+    ),
+    category_weights: list[str] | None = typer.Option(
+        None,
+        "--category-weight",
+        help="Share of download slots for a category, e.g. pwn=3 (repeatable)",
+        rich_help_panel="Behavior",
+    ),
+    chunk_size: int = typer.Option(
+        1024 * 1024,
+        "--chunk-size",
+        min=1,
+        help="Read size in bytes when streaming attachments",
+        rich_help_panel="Attachments",
+    ),
+    fsync: FsyncPolicy = typer.Option(
+        FsyncPolicy.none,
+        "--fsync",
+        case_sensitive=False,
+        help="Flush attachments to disk: none, file (each file), full (files and directories)",
+        rich_help_panel="Attachments",
+    ),
+    blake3: bool = typer.Option(
+        False,
+        "--blake3",
+        help="Also record BLAKE3 digests of attachments (requires the blake3 package)",
+        rich_help_panel="Attachments",
+    ),
+    max_attachment_size: str | None = typer.Option(
+        None,
+        "--max-attachment-size",
+        help="Defer attachments larger than this (e.g. 500M, 2G) to `ctf-dl fetch`",
+        rich_help_panel="Attachments",
+    ),
+    category_budgets: list[str] | None = typer.Option(
+        None,
+        "--category-budget",
+        help="Total attachment size per category, e.g. pwn=2G (repeatable)",
+        rich_help_panel="Attachments",
+    ),
+    extract: bool = typer.Option(
+        False,
+        "--extract",
+        help="Extract archive attachments (.zip, .tar.*) next to the archive",
+        rich_help_panel="Attachments",
+    ),
+    extract_workers: int | None = typer.Option(
+        None,
+        "--extract-workers",
+        min=1,
+        help="Processes used for extraction (default: one per CPU)",
+        rich_help_panel="Attachments",
+    ),
+    extract_max_size: str = typer.Option(
+        "1G",
+        "--extract-max-size",
+        help="Refuse archives that would extract to more than this",
+        rich_help_panel="Attachments",
+    ),
+    extract_max_files: int = typer.Option(
+        10_000,
+        "--extract-max-files",
+        help="Refuse archives with more files than this",
+        rich_help_panel="Attachments",
+    ),
+    extract_max_ratio: float = typer.Option(
+        100.0,
+        "--extract-max-ratio",
+        help="Refuse archives whose compression ratio is above this",
+        rich_help_panel="Attachments",
+    ),
 ):
     if version:
         handle_version()
@@ -201,20 +555,235 @@ def cli(
             typer.secho("Error: password required but not provided", fg=typer.colors.RED)
             raise typer.Exit(code=1)
 
-    if output_format:
+    if name_pattern:
         try:
-            variant_name, index_template_name, folder_template_name = resolve_output_format(
-                output_format
-            )
-        except ValueError as e:
-            raise typer.BadParameter(str(e))
+            re.compile(name_pattern)
+        except re.error as e:
+            raise typer.BadParameter(f"Invalid --name pattern: {e}")
+
+    if record and replay:
+        raise typer.BadParameter("--record and --replay cannot be used together")
+
+    if git_repo and zip_output:
+        raise typer.BadParameter("--git and --zip cannot be used together")
+
+    if s3 and (git_repo or zip_output):
+        raise typer.BadParameter("--s3 cannot be used with --git or --zip")
+
+    if s3 and not (s3_access_key and s3_secret_key):
+        raise typer.BadParameter(
+            "--s3 needs --s3-access-key and --s3-secret-key "
+            "(or AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY)"
+        )
+
+    if workers > 1 and (git_repo or s3 or record):
+        raise typer.BadParameter("--workers cannot be used with --git, --s3 or --record")
 
-    config = build_export_config(locals())
+    if via and not via_key:
+        raise typer.BadParameter("--via needs the cache's key (--via-key or CTFDL_VIA_KEY)")
+
+    try:
+        outputs = resolve_output_variants(
+            split_values(output_format),
+            split_values(variant_name),
+            split_values(index_template_name),
+        )
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    if len(outputs) > 1 and (git_repo or zip_output or s3):
+        raise typer.BadParameter("Several output formats cannot be used with --git, --zip or --s3")
+    _, variant_name, index_template_name, folder = outputs[0]
+    folder_template_name = folder or folder_template_name
+
+    try:
+        config = build_export_config(locals())
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
 
     from ctfdl.challenges.entry import run_export
 
     asyncio.run(run_export(config))
 
 
+@app.command(name="fetch")
+def fetch(
+    paths: list[str] = typer.Argument(
+        ..., help="Challenge folders, deferred files or glob patterns to fetch", show_default=False
+    ),
+    parallel: int = typer.Option(4, "--parallel", help="Number of parallel downloads"),
+    chunk_size: int = typer.Option(
+        1024 * 1024, "--chunk-size", min=1, help="Read size in bytes when streaming attachments"
+    ),
+    fsync: FsyncPolicy = typer.Option(
+        FsyncPolicy.none, "--fsync", case_sensitive=False, help="Flush attachments to disk"
+    ),
+    blake3: bool = typer.Option(False, "--blake3", help="Also record BLAKE3 digests"),
+    token: str | None = typer.Option(
+        None,
+        "--token",
+        "-t",
+        help="Authentication token, to log in again for files that need the session",
+        rich_help_panel="Authentication",
+    ),
+    username: str | None = typer.Option(
+        None,
+        "--username",
+        "-u",
+        help="Login username",
+        rich_help_panel="Authentication",
+    ),
+    password: str | None = typer.Option(
+        None,
+        "--password",
+        "-p",
+        help="Login password",
+        rich_help_panel="Authentication",
+    ),
+    http2: bool = typer.Option(
+        False,
+        "--http2",
+        help="Multiplex requests over HTTP/2 (needs the h2 package)",
+        rich_help_panel="Network",
+    ),
+    connect_timeout: float = typer.Option(
+        10.0,
+        "--connect-timeout",
+        min=0.1,
+        help="Seconds to wait for a connection",
+        rich_help_panel="Network",
+    ),
+    read_timeout: float = typer.Option(
+        30.0,
+        "--read-timeout",
+        min=0.1,
+        help="Seconds to wait for data on an open connection",
+        rich_help_panel="Network",
+    ),
+    dns_cache_ttl: float = typer.Option(
+        300.0,
+        "--dns-cache-ttl",
+        min=0,
+        help="Seconds to cache DNS lookups (0 disables)",
+        rich_help_panel="Network",
+    ),
+    stall_timeout: float | None = typer.Option(
+        None,
+        "--stall-timeout",
+        min=0.1,
+        help="Restart a download that received no data for this many seconds",
+        rich_help_panel="Network",
+    ),
+    via: str | None = typer.Option(
+        None,
+        "--via",
+        help="Send all requests through a team cache started with `ctf-dl serve-cache`",
+        rich_help_panel="Network",
+    ),
+    via_key: str | None = typer.Option(
+        None,
+        "--via-key",
+        envvar="CTFDL_VIA_KEY",
+        help="Key printed by `ctf-dl serve-cache`",
+        rich_help_panel="Network",
+    ),
+    max_bandwidth: str | None = typer.Option(
+        None,
+        "--max-bandwidth",
+        help="Limit downloads to this many bytes per second (e.g. 5M)",
+        rich_help_panel="Network",
+    ),
+    host_bandwidth: list[str] | None = typer.Option(
+        None,
+        "--host-bandwidth",
+        help="Bytes per second for one host, e.g. files.example.com=1M (repeatable)",
+        rich_help_panel="Network",
+    ),
+):
+    """Download attachments that an export deferred because of size limits."""
+    if via and not via_key:
+        raise typer.BadParameter("--via needs the cache's key (--via-key or CTFDL_VIA_KEY)")
+    network = {
+        "http2": http2,
+        "connect_timeout": connect_timeout,
+        "read_timeout": read_timeout,
+        "dns_cache_ttl": dns_cache_ttl,
+        "via": via,
+        "via_key": via_key,
+        "max_bandwidth": max_bandwidth,
+        "host_bandwidth": host_bandwidth,
+    }
+    credentials = {"username": username, "password": password, "token": token}
+    handle_fetch(
+        paths, parallel, chunk_size, fsync.value, blake3, network, stall_timeout, credentials
+    )
+
+
+@app.command(name="search")
+def search(
+    query: list[str] | None = typer.Argument(
+        None, help="Words to search for (prefix matches)", show_default=False
+    ),
+    output: str = typer.Option(
+        "challenges", "--output", "-o", help="Output directory of the export to search"
+    ),
+    index: str | None = typer.Option(None, "--index", help="Search index to use"),
+    category: str | None = typer.Option(None, "--category", help="Only show this category"),
+    limit: int = typer.Option(20, "--limit", "-n", help="Maximum number of results"),
+    raw: bool = typer.Option(False, "--raw", help="Pass the query to SQLite FTS5 unchanged"),
+    reindex: bool = typer.Option(
+        False, "--reindex", help="Index the output directory from its JSON files first"
+    ),
+    ctf: str | None = typer.Option(
+        None, "--ctf", help="CTF name to record when reindexing (default: the exported CTF's host)"
+    ),
+):
+    """Search exported challenges by name, category, description, tags and files."""
+    handle_search(" ".join(query or []), output, index, category, limit, raw, reindex, ctf)
+
+
+@app.command(name="merge-index")
+def merge_index(
+    output: str = typer.Option(
+        "challenges", "--output", "-o", help="Output directory the shards exported into"
+    ),
+    template_dir: str | None = typer.Option(
+        None, "--template-dir", help="Directory containing custom templates"
+    ),
+    index_template_name: str = typer.Option(
+        "grouped", "--index-template", help="Template for challenge index"
+    ),
+    no_search_index: bool = typer.Option(
+        False, "--no-search-index", help="Do not update the full-text search index"
+    ),
+):
+    """Combine the index spools of a sharded export into the final index."""
+    handle_merge_index(output, template_dir, index_template_name, no_search_index)
+
+
+@app.command(name="serve-cache")
+def serve_cache(
+    host: str = typer.Option(
+        "127.0.0.1",
+        "--host",
+        help="Address to listen on; use 0.0.0.0 to let teammates on the network connect",
+    ),
+    port: int = typer.Option(8765, "--port", help="Port to listen on"),
+    cache_dir: str = typer.Option(
+        "ctf-dl-cache", "--cache-dir", help="Folder that holds the cached responses"
+    ),
+    key: str | None = typer.Option(
+        None,
+        "--key",
+        envvar="CTFDL_VIA_KEY",
+        help="Key clients must send (default: a random one, printed at start)",
+    ),
+    api_ttl: float = typer.Option(
+        300.0, "--api-ttl", min=0, help="Seconds API responses are served from the cache"
+    ),
+):
+    """Share one download of every challenge and attachment with the whole team."""
+    handle_serve_cache(host, port, cache_dir, key, api_ttl)
+
+
 if __name__ == "__main__":
     app()
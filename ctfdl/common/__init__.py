@@ -5,9 +5,9 @@ from .updates import check_updates
 from .version import show_version
 
 __all__ = [
-    "zip_output_folder",
+    "check_updates",
     "format_output",
     "setup_logging_with_rich",
-    "check_updates",
     "show_version",
+    "zip_output_folder",
 ]
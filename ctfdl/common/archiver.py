@@ -1,8 +1,13 @@
 import shutil
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from rich.console import Console
 
+if TYPE_CHECKING:
+    from ctfdl.core.config import ExportConfig
+    from ctfdl.rendering.git_sink import GitFastImportSink
+
 console = Console()
 
 
@@ -13,3 +18,13 @@ def zip_output_folder(output_dir: Path, archive_name="ctf-export"):
     )
     console.print(f"🗂️ [green]Output saved to:[/] [bold underline]{archive_path}[/]")
     shutil.rmtree(parent_dir)
+
+
+def commit_to_git(sink: "GitFastImportSink", config: "ExportConfig", entries: list):
+    updated = sum(1 for entry in entries if entry.updated)
+    message = f"Export {config.url}\n\n{len(entries) - updated} new, {updated} updated challenges\n"
+    commit = sink.commit(message)
+    console.print(
+        f"🗂️ [green]Committed to[/] [bold underline]{config.git_repo}[/] "
+        f"[dim]({config.git_branch} {commit[:10]})[/]"
+    )
@@ -0,0 +1,433 @@
+import hashlib
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Headers `ctf-dl --via` adds to every request it sends to the cache
+UPSTREAM_HEADER = "X-Ctfdl-Upstream"
+KEY_HEADER = "X-Ctfdl-Cache-Key"
+KIND_HEADER = "X-Ctfdl-Cache-Kind"
+# Tells clients whether a response came from the cache
+STATUS_HEADER = "X-Ctfdl-Cache"
+
+KINDS = ("api", "file")
+OBJECTS_DIR = "objects"
+READ_SIZE = 256 * 1024
+
+HOP_BY_HOP = {
+    "connection",
+    "content-length",
+    "host",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+# A shared fill downloads the whole object once, whatever the first client asked for
+FILL_DROPPED = {"range", "if-range", "if-none-match", "if-modified-since"}
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+# Per-user credentials in attachment URLs; the file behind them is the same for everyone
+AUTH_PARAMS = {"token", "access_token", "auth", "key", "signature", "expires"}
+# Request headers that tell users apart; API responses are only shared between equals
+IDENTITY_HEADERS = ("authorization", "cookie")
+
+
+def _is_api(url: str) -> bool:
+    return "/api/" in f"{urlsplit(url).path}/"
+
+
+def _without_auth(url: str) -> str:
+    parts = urlsplit(url)
+    query = [
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in AUTH_PARAMS and not k.lower().startswith("x-amz-")
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _forwarded(headers, dropped: set[str] = frozenset()) -> list[tuple[str, str]]:
+    # httpx joins repeated headers in items(), which would merge Set-Cookie lines
+    items = headers.multi_items() if isinstance(headers, httpx.Headers) else headers.items()
+    return [
+        (name, value)
+        for name, value in items
+        if name.lower() not in HOP_BY_HOP
+        and name.lower() not in dropped
+        and not name.lower().startswith("x-ctfdl-")
+    ]
+
+
+class Fill:
+    """
+    One upstream response on its way into the cache.
+
+    Readers follow the body while it grows, so concurrent misses share one upstream
+    request and the first bytes reach every client without waiting for the rest.
+    A completed cache entry is a Fill that is already done.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.cond = threading.Condition()
+        self.status: int | None = None
+        self.headers: list[tuple[str, str]] = []
+        self.total: int | None = None
+        self.size = 0
+        self.done = False
+        self.error: str | None = None
+
+    @classmethod
+    def completed(cls, path: Path, meta: dict) -> "Fill":
+        fill = cls(path)
+        fill.status = meta["status"]
+        fill.headers = [tuple(h) for h in meta["headers"]]
+        fill.total = fill.size = meta["size"]
+        fill.done = True
+        return fill
+
+    def header(self, name: str) -> str | None:
+        return next((v for k, v in self.headers if k.lower() == name), None)
+
+    def wait_headers(self):
+        with self.cond:
+            self.cond.wait_for(lambda: self.status is not None or self.done)
+
+    def available(self, offset: int) -> int:
+        """Bytes readable from `offset` on; waits for more while the fill is running."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.size > offset or self.done)
+            return max(0, self.size - offset)
+
+
+class PullThroughCache:
+    """
+    Responses of GET requests, stored under a hash of their URL.
+
+    `file` responses (attachments) are kept until the cache folder is removed, under
+    their URL without per-user tokens so the whole team shares one copy. `api`
+    responses (listings, challenge details) also depend on who asks, so their key
+    includes the credentials of the request; they are refetched after `api_ttl`
+    seconds so new challenges and changed descriptions still come through. Responses
+    that set cookies are never stored.
+    """
+
+    def __init__(self, root: Path, upstream: httpx.Client, api_ttl: float = 300.0):
+        self.objects = root / OBJECTS_DIR
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.upstream = upstream
+        self.api_ttl = api_ttl
+        self._fills: dict[str, Fill] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind: str, url: str, headers: list[tuple[str, str]] = ()) -> str:
+        if kind == "file":
+            return hashlib.sha256(f"file {_without_auth(url)}".encode()).hexdigest()
+        identity = sorted((k.lower(), v) for k, v in headers if k.lower() in IDENTITY_HEADERS)
+        return hashlib.sha256(f"{kind} {url} {identity}".encode()).hexdigest()
+
+    def _cached(self, key: str, kind: str) -> Fill | None:
+        body = self.objects / key
+        try:
+            meta = json.loads((self.objects / f"{key}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if kind == "api" and time.time() - meta["stored_at"] > self.api_ttl:
+            return None
+        if not body.is_file():
+            return None
+        return Fill.completed(body, meta)
+
+    def open(
+        self, kind: str, url: str, headers: list[tuple[str, str]]
+    ) -> tuple[Fill, BinaryIO, str]:
+        """
+        The response for `url`, an open reader of its body, and where it came from.
+
+        That is `HIT` for the cache, `MISS` for a new upstream request and `SHARED` for
+        one that another client already started.
+        """
+        key = self.key(kind, url, headers)
+        with self._lock:
+            fill = self._fills.get(key)
+            status = "SHARED"
+            if fill is None:
+                fill = self._cached(key, kind)
+                status = "HIT"
+            if fill is None:
+                status = "MISS"
+                fill = Fill(self.objects / f"{key}.part")
+                writer = fill.path.open("wb")
+                self._fills[key] = fill
+                threading.Thread(
+                    target=self._fill,
+                    args=(key, kind, url, headers, fill, writer),
+                    name=f"ctfdl-fill-{key[:8]}",
+                    daemon=True,
+                ).start()
+            # A running fill is unregistered before its part file goes away, so opening
+            # under the lock always finds the file
+            with fill.cond:
+                reader = fill.path.open("rb")
+        return fill, reader, status
+
+    def _fill(
+        self,
+        key: str,
+        kind: str,
+        url: str,
+        headers: list[tuple[str, str]],
+        fill: Fill,
+        writer: BinaryIO,
+    ):
+        if kind == "file":
+            # Byte offsets must mean the same to every client, so files are never encoded
+            headers = [*headers, ("Accept-Encoding", "identity")]
+        try:
+            with self.upstream.stream("GET", url, headers=headers) as response:
+                with fill.cond:
+                    fill.status = response.status_code
+                    fill.headers = [
+                        (k, v)
+                        for k, v in _forwarded(response.headers)
+                        if k.lower() != "accept-ranges"
+                    ]
+                    length = response.headers.get("Content-Length")
+                    fill.total = int(length) if length and length.isdigit() else None
+                    fill.cond.notify_all()
+                for chunk in response.iter_raw(READ_SIZE):
+                    writer.write(chunk)
+                    writer.flush()
+                    with fill.cond:
+                        fill.size += len(chunk)
+                        fill.cond.notify_all()
+        except Exception as e:
+            # Whatever went wrong, the readers waiting on this fill must be released
+            logger.warning("Upstream request for %s failed: %s", url, e)
+            fill.error = str(e)
+        finally:
+            writer.close()
+
+        complete = fill.total is None or fill.size == fill.total
+        # A cookie belongs to one session, so such a response is only good for its client
+        cacheable = (
+            fill.error is None
+            and fill.status == 200
+            and complete
+            and fill.header("set-cookie") is None
+        )
+        part = fill.path
+        with fill.cond:
+            if cacheable:
+                body = self.objects / key
+                meta = {
+                    "url": url,
+                    "kind": kind,
+                    "status": fill.status,
+                    "headers": fill.headers,
+                    "size": fill.size,
+                    "stored_at": time.time(),
+                }
+                tmp = self.objects / f"{key}.json.tmp"
+                tmp.write_text(json.dumps(meta), encoding="utf-8")
+                part.replace(body)
+                tmp.replace(self.objects / f"{key}.json")
+                fill.path = body
+            fill.total = fill.size
+            fill.done = True
+            fill.cond.notify_all()
+        with self._lock:
+            self._fills.pop(key, None)
+        if not cacheable:
+            part.unlink(missing_ok=True)
+
+
+class CacheRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "CacheServer"
+
+    def log_message(self, format: str, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _refuse(self, status: int, reason: str):
+        body = reason.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _upstream(self) -> str | None:
+        key = self.headers.get(KEY_HEADER, "")
+        if not hmac.compare_digest(key.encode(), self.server.key.encode()):
+            self._refuse(401, "Missing or wrong cache key")
+            return None
+        url = self.headers.get(UPSTREAM_HEADER, "")
+        if not url.startswith(("http://", "https://")):
+            self._refuse(400, f"Missing {UPSTREAM_HEADER} header")
+            return None
+        return url
+
+    def do_GET(self):
+        url = self._upstream()
+        if url is None:
+            return
+        kind = self.headers.get(KIND_HEADER, "api")
+        if kind not in KINDS:
+            self._refuse(400, f"Unknown cache kind: {kind}")
+            return
+        if kind == "api" and not _is_api(url):
+            # Login forms and other pages carry nonces and sessions, so they are not shared
+            self._pass_through()
+            return
+
+        fill, reader, status = self.server.cache.open(
+            kind, url, _forwarded(self.headers, FILL_DROPPED)
+        )
+        with reader:
+            fill.wait_headers()
+            if fill.status is None:
+                self._refuse(502, f"Upstream request failed: {fill.error}")
+                return
+            self._send(fill, reader, status)
+
+    def _range(self, fill: Fill) -> tuple[int, int] | None | bool:
+        """The requested (start, end) byte range, None for the whole body, False if invalid."""
+        spec = self.headers.get("Range")
+        if not spec or fill.status != 200 or fill.total is None:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range not in (fill.header("etag"), fill.header("last-modified")):
+            return None
+        m = RANGE_RE.fullmatch(spec.strip())
+        if not m or not (m.group(1) or m.group(2)):
+            return None
+        if m.group(1):
+            start = int(m.group(1))
+            end = min(int(m.group(2)), fill.total - 1) if m.group(2) else fill.total - 1
+        else:
+            start, end = max(0, fill.total - int(m.group(2))), fill.total - 1
+        if start >= fill.total or start > end:
+            return False
+        return start, end
+
+    def _send(self, fill: Fill, reader: BinaryIO, cache_status: str):
+        byte_range = self._range(fill)
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{fill.total}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, length = 0, fill.total
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{fill.total}")
+        else:
+            self.send_response(fill.status)
+        for name, value in fill.headers:
+            # Only the client whose request reached the platform gets its cookies
+            if cache_status == "MISS" or name.lower() != "set-cookie":
+                self.send_header(name, value)
+        if fill.status == 200 and fill.total is not None and not fill.header("content-encoding"):
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header(STATUS_HEADER, cache_status)
+        if length is None:
+            # Upstream sent no length, so the end of the body is the end of the connection
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        else:
+            self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+        offset, remaining = start, length
+        while remaining is None or remaining > 0:
+            available = fill.available(offset)
+            if not available:
+                break
+            reader.seek(offset)
+            data = reader.read(min(READ_SIZE, available, remaining or READ_SIZE))
+            self.wfile.write(data)
+            offset += len(data)
+            if remaining is not None:
+                remaining -= len(data)
+        if remaining:
+            # The upstream response broke off; closing tells the client it is incomplete
+            self.close_connection = True
+
+    def _pass_through(self):
+        url = self._upstream()
+        if url is None:
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        try:
+            with self.server.cache.upstream.stream(
+                self.command, url, headers=_forwarded(self.headers), content=body
+            ) as response:
+                data = b"".join(response.iter_raw())
+        except httpx.HTTPError as e:
+            self._refuse(502, f"Upstream request failed: {e}")
+            return
+        self.send_response(response.status_code)
+        for name, value in _forwarded(response.headers):
+            self.send_header(name, value)
+        self.send_header(STATUS_HEADER, "BYPASS")
+        if self.command == "HEAD":
+            length = response.headers.get("Content-Length", "0")
+        else:
+            length = str(len(data))
+        self.send_header("Content-Length", length)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def do_HEAD(self):
+        self._pass_through()
+
+    def do_POST(self):
+        self._pass_through()
+
+    def do_PUT(self):
+        self._pass_through()
+
+    def do_PATCH(self):
+        self._pass_through()
+
+    def do_DELETE(self):
+        self._pass_through()
+
+
+class CacheServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], cache: PullThroughCache, key: str):
+        super().__init__(address, CacheRequestHandler)
+        self.cache = cache
+        self.key = key
+
+
+def make_cache_server(
+    host: str, port: int, root: Path, key: str, api_ttl: float = 300.0
+) -> CacheServer:
+    # Redirects go back to the client, which follows them through the cache again
+    upstream = httpx.Client(follow_redirects=False, timeout=httpx.Timeout(60.0, connect=10.0))
+    return CacheServer((host, port), PullThroughCache(root, upstream, api_ttl), key)
@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "cassette.jsonl"
+BODIES_DIR = "bodies"
+REDACTED = "<redacted>"
+SECRET_HEADERS = {"authorization", "cookie", "proxy-authorization"}
+# Query parameters that carry credentials, like the per-user `?token=` of CTFd files
+SECRET_PARAMS = {
+    "token",
+    "access_token",
+    "api_key",
+    "apikey",
+    "auth",
+    "key",
+    "signature",
+    "x-amz-credential",
+    "x-amz-security-token",
+    "x-amz-signature",
+}
+# Form and JSON fields of login requests. CSRF nonces change every session, so they
+# could never be matched on replay anyway.
+SECRET_FIELDS = SECRET_PARAMS | {
+    "password",
+    "passwd",
+    "pass",
+    "teamtoken",
+    "otp",
+    "nonce",
+    "csrf_token",
+}
+
+
+def _redact_url(url: httpx.URL) -> str:
+    """The URL as recorded; requests are matched on this too, so replays still find them."""
+    if not any(name.lower() in SECRET_PARAMS for name in url.params):
+        return str(url)
+    params = [
+        (name, REDACTED if name.lower() in SECRET_PARAMS else value)
+        for name, value in url.params.multi_items()
+    ]
+    return str(url.copy_with(params=params))
+
+
+def _redact_headers(headers: httpx.Headers) -> list[list[str]]:
+    redacted = []
+    for name, value in headers.multi_items():
+        lower = name.lower()
+        if lower in SECRET_HEADERS:
+            value = REDACTED
+        elif lower == "set-cookie":
+            # Keep the cookie's name and attributes so login flows still see it on replay
+            cookie, _, attributes = value.partition(";")
+            value = f"{cookie.partition('=')[0]}={REDACTED}" + (
+                f";{attributes}" if attributes else ""
+            )
+        redacted.append([name, value])
+    return redacted
+
+
+def _redact_body(body: bytes, content_type: str) -> bytes:
+    """
+    A form or JSON body with its credential fields redacted.
+
+    Only a hash of the body is recorded, but a hash of a short password is easily
+    brute-forced, so credentials are taken out before hashing.
+    """
+    media_type = content_type.partition(";")[0].strip().lower()
+    try:
+        if media_type == "application/x-www-form-urlencoded":
+            fields = parse_qsl(body.decode(), keep_blank_values=True)
+            return urlencode(
+                [(k, REDACTED if k.lower() in SECRET_FIELDS else v) for k, v in fields]
+            ).encode()
+        if media_type == "application/json":
+            data = json.loads(body)
+            if isinstance(data, dict):
+                data = {k: REDACTED if k.lower() in SECRET_FIELDS else v for k, v in data.items()}
+            return json.dumps(data, sort_keys=True).encode()
+    except ValueError:
+        pass
+    return body
+
+
+def _request_key(request: httpx.Request, url: str, body: bytes) -> str:
+    body = _redact_body(body, request.headers.get("Content-Type", ""))
+    return f"{request.method} {url} {hashlib.sha256(body).hexdigest()}"
+
+
+class Cassette:
+    """A directory of recorded HTTP exchanges: a JSON-lines index plus deduplicated bodies."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.index = path / INDEX_FILE
+        self.bodies = path / BODIES_DIR
+
+    def body_path(self, sha256: str) -> Path:
+        return self.bodies / sha256
+
+    def append(self, exchange: dict):
+        with self.index.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(exchange) + "\n")
+
+    def load(self) -> list[dict]:
+        if not self.index.is_file():
+            raise FileNotFoundError(f"No cassette found at {self.path}")
+        with self.index.open(encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class _TeeStream(httpx.AsyncByteStream):
+    """Passes a response body through while writing it to the cassette."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, cassette: Cassette, exchange: dict):
+        self._stream = stream
+        self._cassette = cassette
+        self._exchange = exchange
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._complete = False
+        fd, tmp = tempfile.mkstemp(dir=cassette.bodies, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._tmp = Path(tmp)
+        self._started = time.monotonic()
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._hash.update(chunk)
+            self._size += len(chunk)
+            self._file.write(chunk)
+            yield chunk
+        self._complete = True
+
+    async def aclose(self):
+        await self._stream.aclose()
+        if self._file.closed:
+            return
+        self._file.close()
+        sha256 = self._hash.hexdigest()
+        self._tmp.replace(self._cassette.body_path(sha256))
+        self._exchange.update(
+            body=sha256,
+            size=self._size,
+            truncated=not self._complete,
+            elapsed=self._exchange["ttfb"] + time.monotonic() - self._started,
+        )
+        self._cassette.append(self._exchange)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Forwards requests to a real transport and records every exchange into a cassette.
+
+    Credential headers, token query parameters and the credential fields of form and
+    JSON bodies are redacted, and request bodies are only kept as a hash. Response
+    bodies are stored verbatim, including any tokens or nonces a platform sends back.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, path: Path):
+        self._transport = transport
+        self.cassette = Cassette(path)
+        self.cassette.bodies.mkdir(parents=True, exist_ok=True)
+        self._epoch = time.monotonic()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        started = time.monotonic()
+        response = await self._transport.handle_async_request(request)
+        url = _redact_url(request.url)
+        exchange = {
+            "key": _request_key(request, url, body),
+            "method": request.method,
+            "url": url,
+            "request_headers": _redact_headers(request.headers),
+            "status": response.status_code,
+            "headers": _redact_headers(response.headers),
+            "http_version": response.extensions.get("http_version", b"HTTP/1.1").decode(),
+            "started": started - self._epoch,
+            "ttfb": time.monotonic() - started,
+        }
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_TeeStream(response.stream, self.cassette, exchange),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class _ReplayStream(httpx.AsyncByteStream):
+    def __init__(self, path: Path, duration: float, size: int, chunk_size: int = 64 * 1024):
+        self._path = path
+        self._duration = duration
+        self._size = max(size, 1)
+        self._chunk_size = chunk_size
+
+    async def __aiter__(self):
+        with self._path.open("rb") as f:
+            while chunk := f.read(self._chunk_size):
+                if self._duration > 0:
+                    await asyncio.sleep(self._duration * len(chunk) / self._size)
+                yield chunk
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serves recorded exchanges back without touching the network.
+
+    Requests are matched on method, URL and body. Repeated requests get the recorded
+    responses in order, and the last one again once they run out. Recorded latencies
+    are multiplied by `scale`; 0 replays as fast as possible.
+    """
+
+    def __init__(self, path: Path, scale: float = 1.0):
+        self.cassette = Cassette(path)
+        self.scale = scale
+        self._exchanges: dict[str, deque[dict]] = {}
+        for exchange in self.cassette.load():
+            self._exchanges.setdefault(exchange["key"], deque()).append(exchange)
+
+    def _next(self, key: str) -> dict | None:
+        queue = self._exchanges.get(key)
+        if not queue:
+            return None
+        return queue.popleft() if len(queue) > 1 else queue[0]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        exchange = self._next(_request_key(request, _redact_url(request.url), body))
+        if exchange is None:
+            raise httpx.ConnectError(
+                f"No recorded response for {request.method} {request.url}", request=request
+            )
+
+        if self.scale > 0:
+            await asyncio.sleep(exchange["ttfb"] * self.scale)
+        transfer = max(exchange.get("elapsed", 0) - exchange["ttfb"], 0) * self.scale
+        return httpx.Response(
+            exchange["status"],
+            headers=exchange["headers"],
+            stream=_ReplayStream(
+                self.cassette.body_path(exchange["body"]), transfer, exchange.get("size", 0)
+            ),
+            extensions={"http_version": exchange.get("http_version", "HTTP/1.1").encode()},
+        )
@@ -0,0 +1,48 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+async def with_deadline(aw: Awaitable[T], seconds: float | None, what: str = "operation") -> T:
+    """Await `aw`, cancelling it once `seconds` have passed."""
+    if seconds is None:
+        return await aw
+    try:
+        return await asyncio.wait_for(aw, seconds)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError(f"{what} took longer than {seconds:g}s") from None
+
+
+async def hedged(factory: Callable[[], Awaitable[T]], delay: float | None) -> T:
+    """
+    Run `factory()`, and start a second attempt if the first is still running after
+    `delay` seconds. The first attempt to succeed wins and the other is cancelled.
+
+    Only for idempotent requests: both attempts may reach the server.
+    """
+    first = asyncio.ensure_future(factory())
+    if delay is None:
+        return await first
+
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            pending.add(asyncio.ensure_future(factory()))
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
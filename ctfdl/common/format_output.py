@@ -1,22 +1,53 @@
 import json
+from importlib.metadata import version
 from pathlib import Path
 
 import mdformat
 
+from ctfdl.common.prettify_cache import PrettifyCache
 
-def format_output(text: str, output_file: str | Path, prettify: bool = False) -> str:
-    if not prettify:
+MARKDOWN_EXTENSIONS = {"tables"}
+
+
+def _format_markdown(text: str) -> str:
+    return mdformat.text(text, extensions=MARKDOWN_EXTENSIONS)
+
+
+def _format_json(text: str) -> str:
+    try:
+        obj = json.loads(text)
+        return json.dumps(obj, indent=2, ensure_ascii=False)
+    except Exception:
         return text
 
-    ext = Path(output_file).suffix.lower()
 
-    if ext == ".md":
-        return mdformat.text(text, extensions={"tables"})
-    elif ext == ".json":
-        try:
-            obj = json.loads(text)
-            return json.dumps(obj, indent=2, ensure_ascii=False)
-        except Exception:
-            return text
+FORMATTERS = {".md": _format_markdown, ".json": _format_json}
+
+
+def _formatter_ids() -> dict[str, str]:
+    """What identifies each formatter's output, so upgrading one invalidates its cache entries."""
+    extensions = ",".join(
+        f"{name}-{version(f'mdformat_{name}')}" for name in sorted(MARKDOWN_EXTENSIONS)
+    )
+    return {".md": f"mdformat-{mdformat.__version__}+{extensions}", ".json": "json-indent2"}
 
-    return text
+
+FORMATTER_IDS = _formatter_ids()
+
+
+def format_output(
+    text: str,
+    output_file: str | Path,
+    prettify: bool = False,
+    cache: PrettifyCache | None = None,
+) -> str:
+    if not prettify:
+        return text
+
+    ext = Path(output_file).suffix.lower()
+    formatter = FORMATTERS.get(ext)
+    if formatter is None:
+        return text
+    if cache is None:
+        return formatter(text)
+    return cache.get_or_format(FORMATTER_IDS[ext], text, formatter)
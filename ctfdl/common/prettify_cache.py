@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = "prettify.sqlite"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Evict down to this share of the limit, so a full cache does not evict on every store
+EVICT_TO = 0.9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS formatted (
+    key TEXT PRIMARY KEY,
+    output TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS formatted_by_use ON formatted (used);
+"""
+
+
+def default_cache_path() -> Path:
+    """`prettify.sqlite` in the user cache folder, shared by every export."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "ctf-dl" / CACHE_FILE
+
+
+class PrettifyCache:
+    """
+    Formatted output keyed by a hash of the input text and the formatter that ran on it.
+
+    Entries are evicted least recently used first once the stored output grows past
+    `max_bytes`. Any database error turns the cache off for the rest of the run, since
+    formatting without it is only slower.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._db: sqlite3.Connection | None = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM formatted").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(formatter: str, text: str) -> str:
+        return hashlib.sha256(f"{formatter}\0{text}".encode()).hexdigest()
+
+    def get_or_format(self, formatter: str, text: str, format_: Callable[[str], str]) -> str:
+        if self._db is None:
+            return format_(text)
+
+        key = self.key(formatter, text)
+        try:
+            row = self._db.execute("SELECT output FROM formatted WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE formatted SET used = ? WHERE key = ?", (time.time(), key))
+                self.hits += 1
+                return row[0]
+        except sqlite3.Error as e:
+            self._disable(e)
+            return format_(text)
+
+        self.misses += 1
+        output = format_(text)
+        self._store(key, output)
+        return output
+
+    def _store(self, key: str, output: str):
+        size = len(output.encode())
+        if size > self.max_bytes:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO formatted VALUES (?, ?, ?, ?)",
+                (key, output, size, time.time()),
+            )
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+        except sqlite3.Error as e:
+            self._disable(e)
+
+    def _evict(self):
+        # Other processes share the file, so recount before deciding what to drop
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM formatted").fetchone()[0]
+        excess = self._size - int(self.max_bytes * EVICT_TO)
+        if excess <= 0:
+            return
+
+        victims = []
+        rows = self._db.execute("SELECT key, size FROM formatted ORDER BY used").fetchall()
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+            self._size -= size
+        self._db.execute("BEGIN")
+        self._db.executemany("DELETE FROM formatted WHERE key = ?", victims)
+        self._db.execute("COMMIT")
+
+    def _disable(self, error: sqlite3.Error):
+        logger.warning("Prettify cache %s disabled: %s", self.path, error)
+        self.close()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def open_prettify_cache(path: Path | None, max_bytes: int) -> PrettifyCache | None:
+    """The cache at `path` (or the default one), or None if disabled or unusable."""
+    if max_bytes <= 0:
+        return None
+    path = path or default_cache_path()
+    try:
+        return PrettifyCache(path, max_bytes)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Could not open prettify cache %s: %s", path, e)
+        return None
@@ -0,0 +1,174 @@
+import asyncio
+import time
+
+import httpx
+
+from ctfdl.core.config import TransportProfile
+
+# Unused allowance is kept for at most this many seconds of traffic
+BURST_SECONDS = 0.5
+STREAM_EXTENSION = "ctfdl.limited_stream"
+
+
+class TokenBucket:
+    """
+    Byte budget that refills at `rate` bytes per second.
+
+    Taking more than is available puts the bucket in debt and makes the caller sleep it
+    off, so chunks of any size can pass and concurrent takers queue up behind each other.
+    `set_rate` changes the rate while transfers are running.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate: float):
+        # Time so far is credited at the old rate, so a change is never retroactive
+        self._refill()
+        self.rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        burst = self.rate * BURST_SECONDS
+        self._tokens = min(burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def charge(self, n: int):
+        """Count `n` bytes without waiting; later takers pay for them."""
+        self._refill()
+        self._tokens -= n
+
+    def delay(self) -> float:
+        """Seconds until the bucket is out of debt."""
+        return max(0.0, -self._tokens / self.rate)
+
+    async def take(self, n: int):
+        self.charge(n)
+        if delay := self.delay():
+            await asyncio.sleep(delay)
+
+
+class BandwidthLimiter:
+    """
+    A global byte-rate limit plus optional limits per host.
+
+    Bulk transfers (attachments) wait for their bytes. Metadata requests never wait:
+    their bytes are only charged, so challenge text stays fast and bulk transfers
+    absorb the difference. `set_rate` changes or removes a limit while transfers run.
+    """
+
+    def __init__(self, rate: float | None = None, host_rates: dict[str, float] | None = None):
+        self.total = TokenBucket(rate) if rate else None
+        self.hosts = {host.lower(): TokenBucket(r) for host, r in (host_rates or {}).items()}
+
+    @classmethod
+    def from_profile(cls, profile: TransportProfile, share: int = 1) -> "BandwidthLimiter | None":
+        """A limiter for one of `share` processes that split the limits, or None if unlimited."""
+        if not profile.max_bandwidth and not profile.host_bandwidth:
+            return None
+        return cls(
+            profile.max_bandwidth / share if profile.max_bandwidth else None,
+            {host: rate / share for host, rate in profile.host_bandwidth.items()},
+        )
+
+    def _buckets(self, host: str) -> list[TokenBucket]:
+        buckets = [self.total] if self.total else []
+        if bucket := self.hosts.get(host.lower()):
+            buckets.append(bucket)
+        return buckets
+
+    def set_rate(self, rate: float | None, host: str | None = None):
+        """Set the global limit, or the limit of `host`, in bytes per second; None lifts it."""
+        if host is None:
+            if not rate:
+                self.total = None
+            elif self.total:
+                self.total.set_rate(rate)
+            else:
+                self.total = TokenBucket(rate)
+            return
+        host = host.lower()
+        if not rate:
+            self.hosts.pop(host, None)
+        elif host in self.hosts:
+            self.hosts[host].set_rate(rate)
+        else:
+            self.hosts[host] = TokenBucket(rate)
+
+    async def throttle(self, host: str, n: int):
+        # Every bucket is charged at once, so the waits overlap instead of adding up
+        buckets = self._buckets(host)
+        for bucket in buckets:
+            bucket.charge(n)
+        if delay := max((bucket.delay() for bucket in buckets), default=0.0):
+            await asyncio.sleep(delay)
+
+    def charge(self, host: str, n: int):
+        for bucket in self._buckets(host):
+            bucket.charge(n)
+
+
+class _LimitedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, limiter: BandwidthLimiter, host: str, bulk):
+        self._stream = stream
+        self._limiter = limiter
+        self._host = host
+        self._bulk = bulk
+        self._paused = 0.0
+        self._paused_at: float | None = None
+
+    def paused(self) -> float:
+        """Seconds this stream has spent waiting for the limiter, including a current wait."""
+        if self._paused_at is None:
+            return self._paused
+        return self._paused + time.monotonic() - self._paused_at
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            if self._bulk:
+                self._paused_at = time.monotonic()
+                try:
+                    await self._limiter.throttle(self._host, len(chunk))
+                finally:
+                    self._paused += time.monotonic() - self._paused_at
+                    self._paused_at = None
+            else:
+                self._limiter.charge(self._host, len(chunk))
+            yield chunk
+
+    async def aclose(self):
+        await self._stream.aclose()
+
+
+def paused_seconds(response: httpx.Response) -> float:
+    """
+    Seconds the body of `response` has been held back by a BandwidthLimiter.
+
+    Readers that time out slow streams leave this time out, so a low bandwidth limit is
+    never taken for a stall.
+    """
+    stream = response.extensions.get(STREAM_EXTENSION)
+    return stream.paused() if stream else 0.0
+
+
+class LimitedTransport(httpx.AsyncBaseTransport):
+    """Meters response bodies against a BandwidthLimiter; `bulk` bodies are slowed down."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, limiter: BandwidthLimiter, bulk: bool):
+        self._transport = transport
+        self._limiter = limiter
+        self._bulk = bulk
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        response.stream = _LimitedStream(
+            response.stream, self._limiter, request.url.host, self._bulk
+        )
+        # httpx wraps the stream again, so readers find it through the extensions
+        response.extensions[STREAM_EXTENSION] = response.stream
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
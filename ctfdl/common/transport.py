@@ -0,0 +1,197 @@
+import asyncio
+import functools
+import ipaddress
+import logging
+import socket
+import time
+
+import httpcore
+import httpx
+from ctfbridge.core.http import make_http_client
+
+from ctfdl.common.cache_server import KEY_HEADER, KIND_HEADER, UPSTREAM_HEADER
+from ctfdl.common.cassette import RecordingTransport, ReplayTransport
+from ctfdl.common.ratelimit import BandwidthLimiter, LimitedTransport
+from ctfdl.core.config import TransportProfile
+
+logger = logging.getLogger(__name__)
+
+# Same connect retry count ctfbridge uses for its own clients
+CONNECT_RETRIES = 5
+
+
+class CachingResolverBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that remembers name lookups for `ttl` seconds."""
+
+    def __init__(self, ttl: float, backend: httpcore.AsyncNetworkBackend | None = None):
+        self.ttl = ttl
+        self._backend = backend or httpcore.AnyIOBackend()
+        self._cache: dict[tuple[str, int], tuple[float, list[str]]] = {}
+
+    async def _resolve(self, host: str, port: int) -> list[str]:
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            pass
+        else:
+            return [host]
+
+        now = time.monotonic()
+        cached = self._cache.get((host, port))
+        if cached and cached[0] > now:
+            return cached[1]
+
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                host, port, type=socket.SOCK_STREAM
+            )
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (now + self.ttl, addresses)
+        return addresses
+
+    async def connect_tcp(
+        self, host, port, timeout=None, local_address=None, socket_options=None
+    ) -> httpcore.AsyncNetworkStream:
+        # TLS still verifies against the request's host name; only the lookup is cached
+        error: Exception | None = None
+        for address in await self._resolve(host, port):
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout, local_address, socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error or httpcore.ConnectError(f"No addresses for {host}")
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class ViaTransport(httpx.AsyncBaseTransport):
+    """
+    Sends every request to a `ctf-dl serve-cache` server instead of its own host.
+
+    The original URL travels in a header, and `kind` tells the cache how long it may
+    keep the response. Responses still belong to the original request, so cookies and
+    redirects work as without the cache.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, via: str, key: str, kind: str):
+        self._transport = transport
+        self._via = httpx.URL(via)
+        self._key = key
+        self._kind = kind
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        headers = [(k, v) for k, v in request.headers.multi_items() if k.lower() != "host"]
+        headers += [
+            ("Host", self._via.netloc.decode("ascii")),
+            (UPSTREAM_HEADER, str(request.url)),
+            (KEY_HEADER, self._key),
+            (KIND_HEADER, self._kind),
+        ]
+        proxied = httpx.Request(
+            request.method,
+            self._via.copy_with(raw_path=request.url.raw_path),
+            headers=headers,
+            stream=request.stream,
+            extensions=request.extensions,
+        )
+        return await self._transport.handle_async_request(proxied)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+@functools.cache
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning(
+            "HTTP/2 needs the 'h2' package (pip install 'ctf-dl[http2]'), using HTTP/1.1"
+        )
+        return False
+    return True
+
+
+def build_timeout(profile: TransportProfile) -> httpx.Timeout:
+    # Waiting for a pooled connection is expected when the pool is smaller than --parallel
+    return httpx.Timeout(
+        connect=profile.connect_timeout,
+        read=profile.read_timeout,
+        write=profile.read_timeout,
+        pool=None,
+    )
+
+
+def build_transport(
+    profile: TransportProfile, kind: str = "api", limiter: BandwidthLimiter | None = None
+) -> httpx.AsyncBaseTransport:
+    if profile.replay is not None:
+        replay = ReplayTransport(profile.replay, profile.replay_scale)
+        return LimitedTransport(replay, limiter, bulk=kind == "file") if limiter else replay
+
+    transport = httpx.AsyncHTTPTransport(
+        http2=profile.http2 and _http2_available(),
+        limits=httpx.Limits(
+            max_connections=profile.max_connections,
+            max_keepalive_connections=profile.max_connections,
+            keepalive_expiry=profile.keepalive_expiry,
+        ),
+        retries=CONNECT_RETRIES,
+    )
+
+    # httpx has no resolver hook, so the cache goes into the pool's network backend
+    pool = getattr(transport, "_pool", None)
+    if profile.dns_cache_ttl > 0 and hasattr(pool, "_network_backend"):
+        pool._network_backend = CachingResolverBackend(profile.dns_cache_ttl)
+
+    if profile.via is not None:
+        transport = ViaTransport(transport, profile.via, profile.via_key or "", kind)
+    # Metadata is only counted against the limits; attachments wait for their bytes
+    if limiter is not None:
+        transport = LimitedTransport(transport, limiter, bulk=kind == "file")
+    # Cassettes record the platform's URLs, not the cache's
+    if profile.record is not None:
+        return RecordingTransport(transport, profile.record)
+    return transport
+
+
+def make_platform_client(
+    profile: TransportProfile, limiter: BandwidthLimiter | None = None
+) -> httpx.AsyncClient:
+    """The one client ctfbridge uses for detection, login and every API request."""
+    return make_http_client(
+        config={
+            "timeout": build_timeout(profile),
+            "transport": build_transport(profile, limiter=limiter),
+        }
+    )
+
+
+def make_download_client(
+    profile: TransportProfile,
+    limiter: BandwidthLimiter | None = None,
+    session: httpx.AsyncClient | None = None,
+) -> httpx.AsyncClient:
+    """
+    Client for attachment downloads, with the same profile.
+
+    It is kept apart from the platform client so session headers are never sent to the
+    third-party hosts attachments are often served from. With a `limiter`, it shares
+    the bandwidth limits with the platform client. With a logged-in `session`, it
+    carries that session's headers and cookies, for files on the platform itself.
+    """
+    return httpx.AsyncClient(
+        transport=build_transport(profile, kind="file", limiter=limiter),
+        timeout=build_timeout(profile),
+        follow_redirects=True,
+        headers=session.headers if session else None,
+        cookies=session.cookies if session else None,
+    )
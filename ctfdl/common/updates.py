@@ -10,23 +10,23 @@ def check_updates():
     packages_to_check = ["ctf-dl", "ctfbridge"]
     outdated = []
 
-    def get_latest_version(pkg):
+    def get_latest_version(http: httpx.Client, pkg):
         try:
-            resp = httpx.get(f"https://pypi.org/pypi/{pkg}/json", timeout=5)
+            resp = http.get(f"https://pypi.org/pypi/{pkg}/json")
             resp.raise_for_status()
             return resp.json()["info"]["version"]
         except Exception as e:
             console.print(f"⚠️ Failed to fetch version for [yellow]{pkg}[/]: {e}")
             return None
 
-    def compare_versions(pkg):
+    def compare_versions(http: httpx.Client, pkg):
         try:
             installed = version(pkg)
         except PackageNotFoundError:
             console.print(f"❌ [red]{pkg}[/] is not installed.")
             return
 
-        latest = get_latest_version(pkg)
+        latest = get_latest_version(http, pkg)
         if not latest:
             return
 
@@ -39,8 +39,10 @@ def check_updates():
             console.print(f"✅ {pkg} is up to date ([green]{installed}[/])")
 
     console.print("🔍 Checking for updates...\n")
-    for pkg in packages_to_check:
-        compare_versions(pkg)
+    # One client, so both lookups share a single connection to PyPI
+    with httpx.Client(timeout=5) as http:
+        for pkg in packages_to_check:
+            compare_versions(http, pkg)
 
     if outdated:
         upgrade_cmd = "pip install --upgrade " + " ".join(outdated)
@@ -1,7 +1,88 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel, Field
 
+STATE_DIR_NAME = ".ctfdl"
+
+
+def state_dir(output: Path) -> Path:
+    """Where ctf-dl keeps its own bookkeeping for an output folder."""
+    return output / STATE_DIR_NAME
+
+
+class TransportProfile(BaseModel):
+    """Connection pool and timeout settings shared by every HTTP request of an export."""
+
+    max_connections: int = Field(default=20, gt=0)
+    keepalive_expiry: float = Field(default=30.0, ge=0)
+    http2: bool = False
+    connect_timeout: float = Field(default=10.0, gt=0)
+    read_timeout: float = Field(default=30.0, gt=0)
+    dns_cache_ttl: float = Field(default=300.0, ge=0, description="0 disables the DNS cache")
+    record: Path | None = Field(default=None, description="Record all traffic into a cassette")
+    replay: Path | None = Field(default=None, description="Serve all traffic from a cassette")
+    replay_scale: float = Field(default=1.0, ge=0, description="Multiplier for replayed latency")
+    via: str | None = Field(default=None, description="URL of a `ctf-dl serve-cache` server")
+    via_key: str | None = Field(default=None, description="Key of the serve-cache server")
+    max_bandwidth: int | None = Field(
+        default=None, gt=0, description="Bytes per second over all hosts"
+    )
+    host_bandwidth: dict[str, int] = Field(
+        default_factory=dict, description="Bytes per second for single hosts"
+    )
+
+    @property
+    def cassette(self) -> bool:
+        return self.record is not None or self.replay is not None
+
+
+class DeadlinePolicy(BaseModel):
+    """Bounds on single operations and on the whole run, to keep slow stragglers short."""
+
+    request: float | None = Field(
+        default=None, gt=0, description="Seconds one API request may take, hedges included"
+    )
+    challenge: float | None = Field(
+        default=None, gt=0, description="Seconds one challenge may take from start to finish"
+    )
+    stall: float | None = Field(
+        default=None, gt=0, description="Seconds without data before a download is restarted"
+    )
+    restarts: int = Field(default=2, ge=0, description="Restarts of a stalled download")
+    hedge_after: float | None = Field(
+        default=None, gt=0, description="Seconds before a slow API request is sent a second time"
+    )
+    run_budget: float | None = Field(
+        default=None, gt=0, description="Seconds after which no further challenges are started"
+    )
+
+
+class S3Target(BaseModel):
+    """An S3-compatible bucket the export is uploaded to instead of a folder."""
+
+    bucket: str
+    prefix: str = ""
+    endpoint: str | None = Field(
+        default=None, description="Endpoint URL, by default AWS S3 in `region`"
+    )
+    region: str = "us-east-1"
+    access_key: str | None = None
+    secret_key: str | None = None
+    session_token: str | None = None
+    part_size: int = Field(
+        default=16 * 1024 * 1024, ge=5 * 1024 * 1024, description="Multipart upload part size"
+    )
+    upload_workers: int = Field(default=4, gt=0, description="Parts uploaded at the same time")
+
+
+class OutputVariant(BaseModel):
+    """A further output tree rendered from the same challenges as the main one."""
+
+    output: Path
+    variant_name: str = "default"
+    index_template_name: str | None = "grouped"
+
 
 class ExportConfig(BaseModel):
     url: str = Field(..., description="Base URL of the CTF platform")
@@ -17,7 +98,19 @@ class ExportConfig(BaseModel):
     variant_name: str = "default"
     folder_template_name: str = "default"
     index_template_name: str | None = "grouped"
+    extra_outputs: list[OutputVariant] = Field(
+        default_factory=list,
+        description="More trees with the main tree's folders, attachments linked from it",
+    )
     no_index: bool = False
+    search_index: bool = True
+    search_index_path: Path | None = None
+    prettify_cache: Path | None = Field(
+        default=None, description="Cache of formatted outputs, by default in the user cache"
+    )
+    prettify_cache_size: int = Field(
+        default=64 * 1024 * 1024, ge=0, description="0 disables the prettify cache"
+    )
 
     # Filters
     categories: list[str] | None = None
@@ -25,12 +118,52 @@ class ExportConfig(BaseModel):
     max_points: int | None = None
     solved: bool = False
     unsolved: bool = False
-    # status...
+    name_pattern: str | None = None
 
     # Behavior
     update: bool = False
+    prune: bool = Field(
+        default=False, description="Delete folders of challenges that are no longer listed"
+    )
+    resume: bool = Field(default=True, description="Resume an interrupted run from its journal")
+    dry_run: bool = Field(default=False, description="Only print what an export would do")
     no_attachments: bool = False
     parallel: int = 30
+    workers: int = Field(default=1, ge=1, description="Worker processes that export challenges")
+    shard: tuple[int, int] | None = Field(
+        default=None, description="Only export shard i of n (1-based), by challenge id hash"
+    )
+    schedule: Literal["listing", "size", "category", "points", "unsolved"] = "listing"
+    category_priority: list[str] | None = None
+    category_weights: dict[str, int] | None = None
+
+    transport: TransportProfile = Field(default_factory=TransportProfile)
+    deadlines: DeadlinePolicy = Field(default_factory=DeadlinePolicy)
+
+    # Attachments
+    chunk_size: int = Field(default=1024 * 1024, gt=0, description="Download chunk size in bytes")
+    fsync: Literal["none", "file", "full"] = "none"
+    blake3: bool = False
+    max_attachment_size: int | None = None
+    category_budgets: dict[str, int] | None = None
+    extract: bool = False
+    extract_workers: int | None = None
+    extract_max_size: int = 1024**3
+    extract_max_files: int = 10_000
+    extract_max_ratio: float = 100.0
+
+    datasets: list[Path] = Field(
+        default_factory=list, description="NDJSON or SQLite files that collect every challenge"
+    )
+
     list_templates: bool = False
     zip_output: bool = False
+    git_repo: Path | None = None
+    git_branch: str = "ctf-dl"
+    git_lfs: bool = False
+    s3: S3Target | None = None
     debug: bool = False
+
+    @property
+    def state_dir(self) -> Path:
+        return state_dir(self.output)
@@ -7,6 +7,16 @@ from typing import Any
 logger = logging.getLogger(__name__)
 
 
+def handles(event_name: str):
+    """Decorator to mark a method as an event handler for `event_name`."""
+
+    def decorator(func):
+        func._event_name = event_name
+        return func
+
+    return decorator
+
+
 class EventEmitter:
     """A simple event emitter class for decoupling components."""
 
@@ -24,6 +34,13 @@ class EventEmitter:
         """
         self._listeners[event_name].append(listener)
 
+    def subscribe(self, handler: Any):
+        """Registers every method of `handler` that is marked with `@handles`."""
+        for attr_name in dir(handler):
+            fn = getattr(handler, attr_name)
+            if callable(fn) and hasattr(fn, "_event_name"):
+                self.on(fn._event_name, fn)
+
     async def emit(self, event_name: str, *args: Any, **kwargs: Any):
         """
         Emits an event, calling all registered listeners for that event.
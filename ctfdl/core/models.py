@@ -4,7 +4,38 @@ from ctfbridge.models.challenge import Challenge
 from pydantic import BaseModel, Field
 
 
+class AttachmentFile(BaseModel):
+    name: str = Field(..., description="Name of the attachment")
+    path: Path = Field(..., description="Path to the file, relative to the challenge's directory")
+    size_bytes: int | None = Field(default=None, description="Size of the file in bytes, if known")
+    sha256: str | None = Field(
+        default=None, description="SHA-256 digest computed while downloading"
+    )
+    blake3: str | None = Field(default=None, description="BLAKE3 digest, if enabled")
+    deferred: bool = Field(
+        default=False, description="If only a stub was written, to be fetched with `ctf-dl fetch`"
+    )
+    unchanged: bool = Field(
+        default=False, description="If the existing file already had this content and was kept"
+    )
+
+
 class ChallengeEntry(BaseModel):
     data: Challenge = Field(..., description="The CTFBridge Challenge object")
     path: Path = Field(..., description="Path to the challenge's directory")
     updated: bool = Field(default=False, description="If the challenge was updated instead of new")
+    files: list[AttachmentFile] = Field(
+        default_factory=list, description="Downloaded attachments with their hashes"
+    )
+
+    @classmethod
+    def load(cls, data: dict) -> "ChallengeEntry":
+        """Validate an entry written with `model_dump(mode="json")`."""
+        # AttachmentCollection dumps as a plain list but only validates from its wrapper,
+        # and an unset download_info dumps as None but is not accepted back
+        attachments = data["data"].get("attachments")
+        if isinstance(attachments, list):
+            data["data"]["attachments"] = {
+                "attachments": [{k: v for k, v in a.items() if v is not None} for a in attachments]
+            }
+        return cls.model_validate(data)
@@ -0,0 +1,255 @@
+import json
+import logging
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from ctfdl.core.events import EventEmitter, handles
+from ctfdl.core.models import ChallengeEntry
+
+logger = logging.getLogger(__name__)
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS challenges (
+    ctf TEXT NOT NULL,
+    challenge_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    category TEXT,
+    subcategory TEXT,
+    value INTEGER,
+    solved INTEGER,
+    description TEXT,
+    tags TEXT,
+    authors TEXT,
+    services TEXT,
+    path TEXT NOT NULL,
+    data TEXT NOT NULL,
+    exported_at REAL NOT NULL,
+    PRIMARY KEY (ctf, challenge_id)
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    ctf TEXT NOT NULL,
+    challenge_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT,
+    url TEXT,
+    size_bytes INTEGER,
+    sha256 TEXT,
+    blake3 TEXT,
+    deferred INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (ctf, challenge_id) REFERENCES challenges (ctf, challenge_id)
+);
+CREATE INDEX IF NOT EXISTS attachments_by_challenge ON attachments (ctf, challenge_id);
+"""
+
+
+def dataset_format(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix in NDJSON_SUFFIXES:
+        return "ndjson"
+    if suffix in SQLITE_SUFFIXES:
+        return "sqlite"
+    raise ValueError(
+        f"Unknown dataset format for '{path.name}', "
+        f"use one of {', '.join(NDJSON_SUFFIXES + SQLITE_SUFFIXES)}"
+    )
+
+
+def attachment_rows(entry: ChallengeEntry) -> list[dict]:
+    """Attachment metadata of an entry: what the platform announced plus what was saved."""
+    urls = {
+        att.name: att.download_info.url if att.download_info else None
+        for att in entry.data.attachments
+    }
+    rows = [
+        {
+            "name": file.name,
+            "path": (entry.path / file.path).as_posix(),
+            "url": urls.pop(file.name, None),
+            "size_bytes": file.size_bytes,
+            "sha256": file.sha256,
+            "blake3": file.blake3,
+            "deferred": file.deferred,
+        }
+        for file in entry.files
+    ]
+    # Attachments that were not downloaded (e.g. --no-attachments) still get their row
+    rows += [
+        {
+            "name": name or "",
+            "path": None,
+            "url": url,
+            "size_bytes": None,
+            "sha256": None,
+            "blake3": None,
+            "deferred": False,
+        }
+        for name, url in urls.items()
+    ]
+    return rows
+
+
+def _record_key(line: str) -> tuple[str, str] | None:
+    try:
+        record = json.loads(line)
+        return record["ctf"], str(record["challenge"]["id"])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class NdjsonDataset:
+    """
+    One JSON object per challenge in a newline-delimited JSON file.
+
+    New records go to a temporary file as they come. Closing adds the records of the
+    old file for challenges that were not exported again and then replaces it, so
+    reruns keep one record per challenge and an interrupted run leaves the old file.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._new = path.with_name(f"{path.name}.new")
+        self._file = self._new.open("w", encoding="utf-8")
+        self._written: set[tuple[str, str]] = set()
+
+    def write(self, ctf: str, entries: list[ChallengeEntry]):
+        lines = []
+        for entry in entries:
+            record = {
+                "ctf": ctf,
+                "path": entry.path.as_posix(),
+                "challenge": entry.data.model_dump(mode="json"),
+                "attachments": attachment_rows(entry),
+            }
+            self._written.add((ctf, str(entry.data.id)))
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.writelines(lines)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        with tmp.open("w", encoding="utf-8") as out:
+            if self.path.is_file():
+                with self.path.open(encoding="utf-8") as old:
+                    out.writelines(line for line in old if _record_key(line) not in self._written)
+            with self._new.open(encoding="utf-8") as new:
+                shutil.copyfileobj(new, out)
+        tmp.replace(self.path)
+        self._new.unlink()
+
+
+class SqliteDataset:
+    """Challenges and their attachments in two SQLite tables, upserted per challenge."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=10000")
+        self._db.executescript(SCHEMA)
+
+    def write(self, ctf: str, entries: list[ChallengeEntry]):
+        now = time.time()
+        challenges = []
+        attachments = []
+        for entry in entries:
+            chal = entry.data
+            data = chal.model_dump(mode="json")
+            challenges.append(
+                (
+                    ctf,
+                    str(chal.id),
+                    chal.name,
+                    chal.category,
+                    chal.subcategory,
+                    chal.value,
+                    chal.solved,
+                    chal.description,
+                    json.dumps(chal.tags),
+                    json.dumps(chal.authors),
+                    json.dumps(data.get("services") or []),
+                    entry.path.as_posix(),
+                    json.dumps(data, ensure_ascii=False),
+                    now,
+                )
+            )
+            attachments += [
+                (
+                    ctf,
+                    str(chal.id),
+                    row["name"],
+                    row["path"],
+                    row["url"],
+                    row["size_bytes"],
+                    row["sha256"],
+                    row["blake3"],
+                    row["deferred"],
+                )
+                for row in attachment_rows(entry)
+            ]
+
+        # One transaction per batch instead of one per challenge
+        with self._db:
+            self._db.executemany(
+                "DELETE FROM attachments WHERE ctf = ? AND challenge_id = ?",
+                [row[:2] for row in challenges],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO challenges VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                challenges,
+            )
+            self._db.executemany(
+                "INSERT INTO attachments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", attachments
+            )
+
+    def close(self):
+        self._db.close()
+
+
+def open_dataset(path: Path) -> NdjsonDataset | SqliteDataset:
+    return NdjsonDataset(path) if dataset_format(path) == "ndjson" else SqliteDataset(path)
+
+
+class DatasetHandler:
+    """Streams exported challenges into dataset files, in batches, as they complete."""
+
+    def __init__(self, emitter: EventEmitter, paths: list[Path], url: str, batch_size: int = 500):
+        self._paths = paths
+        self._ctf = urlparse(url).netloc or url
+        self._batch_size = batch_size
+        self._datasets: list[NdjsonDataset | SqliteDataset] | None = None
+        self._pending: list[ChallengeEntry] = []
+        emitter.subscribe(self)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        if self._datasets is None:
+            self._datasets = [open_dataset(path) for path in self._paths]
+        for dataset in self._datasets:
+            try:
+                dataset.write(self._ctf, self._pending)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("Could not write to dataset %s: %s", dataset.path, e)
+        self._pending = []
+
+    @handles("challenge_exported")
+    def on_challenge_exported(self, entry: ChallengeEntry):
+        self._pending.append(entry)
+        if len(self._pending) >= self._batch_size:
+            self._flush()
+
+    @handles("download_complete")
+    def on_download_complete(self):
+        self._flush()
+        for dataset in self._datasets or []:
+            dataset.close()
+        self._datasets = None
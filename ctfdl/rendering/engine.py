@@ -1,21 +1,39 @@
+from functools import lru_cache
 from pathlib import Path
 
 from ctfbridge.models.challenge import Challenge as CTFBridgeChallenge
-from jinja2 import ChoiceLoader, Environment, FileSystemLoader, TemplateNotFound
+from jinja2 import ChoiceLoader, Environment, FileSystemLoader, TemplateNotFound, meta, nodes
 from slugify import slugify
 
-from ctfdl.core.models import ChallengeEntry
+from ctfdl.common.prettify_cache import PrettifyCache
+from ctfdl.core.models import AttachmentFile, ChallengeEntry
 from ctfdl.rendering.inspector import list_available_templates, validate_template_dir
 from ctfdl.rendering.metadata_loader import parse_template_metadata
+from ctfdl.rendering.projection import challenge_fields, index_fields
 from ctfdl.rendering.renderers import ChallengeRenderer, FolderRenderer, IndexRenderer
+from ctfdl.rendering.sinks import FileSink, OutputSink
 from ctfdl.rendering.variant_loader import VariantLoader
 
+BUILTIN_TEMPLATES = Path(__file__).parent.parent / "resources" / "templates"
+
+
+@lru_cache(maxsize=8192)
+def _cached_slugify(text: str) -> str:
+    return slugify(text)
+
+
+def cached_slugify(text, **kwargs) -> str:
+    """`slugify` memoized for the plain calls folder templates make for every challenge."""
+    if isinstance(text, str) and not kwargs:
+        return _cached_slugify(text)
+    return slugify(text, **kwargs)
+
 
 class TemplateEngine:
     def __init__(
         self,
         user_template_dir: Path | None,
-        builtin_template_dir: Path,
+        builtin_template_dir: Path = BUILTIN_TEMPLATES,
     ):
         self.user_template_dir = user_template_dir
         self.builtin_template_dir = builtin_template_dir
@@ -31,12 +49,24 @@ class TemplateEngine:
             lstrip_blocks=True,
             autoescape=True,
         )
-        self.env.filters["slugify"] = slugify
+        self.env.filters["slugify"] = cached_slugify
 
         self.variant_loader = VariantLoader(user_template_dir, builtin_template_dir)
-        self.challenge_renderer = ChallengeRenderer()
+        self.sink: OutputSink = FileSink()
+        self.challenge_renderer = ChallengeRenderer(self.sink)
         self.folder_renderer = FolderRenderer(self.env)
-        self.index_renderer = IndexRenderer()
+        self.index_renderer = IndexRenderer(self.sink)
+
+    def use_sink(self, sink: OutputSink):
+        """Send rendered output to `sink` instead of writing it to disk."""
+        self.sink = sink
+        self.challenge_renderer.sink = sink
+        self.index_renderer.sink = sink
+
+    def use_prettify_cache(self, cache: PrettifyCache | None):
+        """Reuse earlier formatting results from `cache` for prettified outputs."""
+        self.challenge_renderer.cache = cache
+        self.index_renderer.cache = cache
 
     def _load_with_metadata(self, template_file: str) -> tuple:
         try:
@@ -49,19 +79,89 @@ class TemplateEngine:
 
         return template, metadata
 
-    def render_challenge(self, variant_name: str, challenge: CTFBridgeChallenge, output_dir: Path):
+    def _parse_with_references(self, template_file: str) -> list[nodes.Template] | None:
+        """Parse a template and every template it includes, extends or imports."""
+        asts = []
+        pending, seen = [template_file], set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            try:
+                source, _, _ = self.env.loader.get_source(self.env, name)
+            except TemplateNotFound:
+                raise FileNotFoundError(f"Template '{name}' not found.")
+            ast = self.env.parse(source)
+            asts.append(ast)
+            for ref in meta.find_referenced_templates(ast):
+                # A template chosen at render time could read anything
+                if ref is None:
+                    return None
+                pending.append(ref)
+        return asts
+
+    def referenced_fields(
+        self,
+        variant_name: str,
+        folder_template_name: str,
+        index_template_name: str | None = None,
+    ) -> set[str] | None:
+        """
+        The challenge fields the selected templates read, found from their Jinja AST.
+
+        Returns None when a template may read any field.
+        """
+        variant = self.variant_loader.resolve_variant(variant_name)
+        templates = [
+            (f"challenge/_components/{comp['template']}", challenge_fields)
+            for comp in variant["components"]
+        ]
+        templates.append((f"folder_structure/{folder_template_name}.jinja", challenge_fields))
+        if index_template_name:
+            templates.append((f"index/{index_template_name}.jinja", index_fields))
+
+        fields: set[str] = set()
+        for template_file, analyze in templates:
+            asts = self._parse_with_references(template_file)
+            if asts is None:
+                return None
+            for ast in asts:
+                found = analyze(ast)
+                if found is None:
+                    return None
+                fields |= found
+        return fields
+
+    def render_challenge(
+        self,
+        variant_name: str,
+        challenge: CTFBridgeChallenge,
+        output_dir: Path,
+        files: list[AttachmentFile] | None = None,
+    ) -> int:
+        """Render every component of a variant; returns how many files were written."""
         variant = self.variant_loader.resolve_variant(variant_name)
+        written = 0
         for comp in variant["components"]:
             template_file = f"challenge/_components/{comp['template']}"
             template, config = self._load_with_metadata(template_file)
             config["output_file"] = comp["file"]
-            self.challenge_renderer.render(template, config, challenge, output_dir)
+            written += self.challenge_renderer.render(
+                template, config, challenge, output_dir, files
+            )
+        return written
 
     def render_path(self, template_name: str, challenge: CTFBridgeChallenge) -> str:
         template_file = f"folder_structure/{template_name}.jinja"
         template, _ = self._load_with_metadata(template_file)
         return self.folder_renderer.render(template, challenge)
 
+    def render_paths(self, template_name: str, challenges: list[CTFBridgeChallenge]) -> list[str]:
+        template_file = f"folder_structure/{template_name}.jinja"
+        template, _ = self._load_with_metadata(template_file)
+        return [self.folder_renderer.render(template, challenge) for challenge in challenges]
+
     def render_index(self, template_name: str, challenges: list[ChallengeEntry], output_path: Path):
         template_file = f"index/{template_name}.jinja"
         template, config = self._load_with_metadata(template_file)
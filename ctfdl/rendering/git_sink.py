@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from ctfdl.challenges.attachments import hash_file
+from ctfdl.core.config import STATE_DIR_NAME
+from ctfdl.rendering.sinks import OutputSink, StoredFile
+
+LFS_ATTRIBUTES = "**/files/** filter=lfs diff=lfs merge=lfs -text\n"
+READ_SIZE = 1024 * 1024
+STATE_PATH = f"{STATE_DIR_NAME}/attachments.json"
+# LFS pointer files are a few lines; anything bigger is real content
+MAX_POINTER_SIZE = 1024
+
+
+def _git_executable() -> str:
+    git = shutil.which("git")
+    if git is None:
+        raise RuntimeError("git is not installed")
+    return git
+
+
+def _git(repo: Path, *args: str, check: bool = True) -> subprocess.CompletedProcess:
+    # Arguments are passed as a list to the resolved git binary, never through a shell
+    return subprocess.run(  # noqa: S603
+        [_git_executable(), "-C", str(repo), *args], capture_output=True, text=True, check=check
+    )
+
+
+def blob_id(size: int, chunks) -> str:
+    """The object id git gives a blob with this content."""
+    digest = hashlib.sha1(f"blob {size}\0".encode())  # noqa: S324
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _quote_path(path: str) -> str:
+    if not any(c in path for c in '"\\\n') and not path.startswith('"'):
+        return path
+    escaped = path.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def lfs_pointer(oid: str, size: int) -> bytes:
+    return f"version https://git-lfs.github.com/spec/v1\noid sha256:{oid}\nsize {size}\n".encode()
+
+
+def parse_lfs_pointer(text: str) -> StoredFile | None:
+    fields = dict(line.split(" ", 1) for line in text.splitlines() if " " in line)
+    oid, size = fields.get("oid", ""), fields.get("size", "")
+    if not fields.get("version", "").startswith("https://git-lfs") or not size.isdigit():
+        return None
+    if not oid.startswith("sha256:"):
+        return None
+    return StoredFile(size=int(size), sha256=oid.removeprefix("sha256:"))
+
+
+class GitFastImportSink(OutputSink):
+    """
+    Streams the export into a `git fast-import` process instead of a working tree.
+
+    The files of a challenge become blobs once the challenge is complete, so a challenge
+    that fails partway leaves nothing behind. `commit` records them all as one commit on
+    `branch`, on top of its previous tip, so files from earlier runs are kept. Files
+    whose blob is already in that tip are not sent again. With `lfs`, attachments are
+    moved into the repository's LFS object store and committed as LFS pointer files.
+
+    The digests and origin validators of attachments are committed along with them in
+    `.ctfdl/attachments.json`, so an update skips the body of any the tip still holds.
+    Without a record, an LFS pointer still gives the size and SHA-256.
+    """
+
+    def __init__(self, repo: Path, root: Path, branch: str = "ctf-dl", lfs: bool = False):
+        self.repo = repo
+        self.root = root
+        self.ref = f"refs/heads/{branch}"
+        self.lfs = lfs
+
+        if _git(repo, "rev-parse", "--git-dir", check=False).returncode != 0:
+            repo.mkdir(parents=True, exist_ok=True)
+            _git(repo, "init", "--quiet")
+        self.git_dir = (repo / _git(repo, "rev-parse", "--git-dir").stdout.strip()).resolve()
+        self.parent = _git(repo, "rev-parse", "--verify", "--quiet", self.ref, check=False)
+        self.has_parent = self.parent.returncode == 0
+        self._tree = self._read_tree()
+        self._attachments = self._load_state()
+        self._state_changed = False
+
+        self._lock = threading.Lock()
+        self._marks = 0
+        self._files: dict[str, tuple[str, int]] = {}
+        self._pending: dict[str, bytes] = {}
+        self._kept: dict[str, StoredFile] = {}
+        # fast-import is only read at the end, so its messages must not fill a pipe
+        self._stderr = tempfile.TemporaryFile()  # noqa: SIM115 - closed by commit or abort
+        self._proc = subprocess.Popen(  # noqa: S603
+            [_git_executable(), "-C", str(repo), "fast-import", "--quiet", "--done"],
+            stdin=subprocess.PIPE,
+            stderr=self._stderr,
+        )
+
+    def _read_tree(self) -> dict[str, tuple[str, str]]:
+        """Mode and blob id of every file on the branch tip."""
+        if not self.has_parent:
+            return {}
+        listing = _git(self.repo, "ls-tree", "-r", "--full-tree", "-z", self.ref).stdout
+        tree = {}
+        for line in filter(None, listing.split("\0")):
+            info, path = line.split("\t", 1)
+            mode, _, oid = info.split()
+            tree[path] = (mode, oid)
+        return tree
+
+    def _load_state(self) -> dict[str, dict]:
+        if STATE_PATH not in self._tree:
+            return {}
+        return json.loads(_git(self.repo, "cat-file", "blob", self._tree[STATE_PATH][1]).stdout)
+
+    def _unchanged(self, rel_path: str, mode: str, oid: str) -> bool:
+        return self._tree.get(rel_path) == (mode, oid)
+
+    def _relative(self, path: Path) -> str:
+        return path.resolve().relative_to(self.root.resolve()).as_posix()
+
+    def _blob(self, size: int, chunks) -> int:
+        stdin = self._proc.stdin
+        self._marks += 1
+        stdin.write(f"blob\nmark :{self._marks}\ndata {size}\n".encode())
+        for chunk in chunks:
+            stdin.write(chunk)
+        stdin.write(b"\n")
+        return self._marks
+
+    def _add_bytes(self, rel_path: str, data: bytes, mode: str = "100644") -> str:
+        oid = blob_id(len(data), [data])
+        if not self._unchanged(rel_path, mode, oid):
+            with self._lock:
+                self._files[rel_path] = (mode, self._blob(len(data), [data]))
+        return oid
+
+    def write_text(self, path: Path, text: str) -> bool:
+        """Keep a rendered file until its challenge is finished; False if it is unchanged."""
+        rel_path = self._relative(path)
+        data = text.encode("utf-8")
+        if self._unchanged(rel_path, "100644", blob_id(len(data), [data])):
+            return False
+        with self._lock:
+            self._pending[rel_path] = data
+        return True
+
+    def stored(self, path: Path) -> StoredFile | None:
+        rel_path = self._relative(path)
+        if rel_path not in self._tree:
+            return None
+        oid = self._tree[rel_path][1]
+        info = self._attachments.get(rel_path)
+        # Only while the blob is still the one that was recorded
+        if info is not None and info.get("oid") == oid:
+            return StoredFile.model_validate(info)
+        if not self.lfs:
+            return None
+        size = _git(self.repo, "cat-file", "-s", oid, check=False).stdout.strip()
+        if not size.isdigit() or int(size) > MAX_POINTER_SIZE:
+            return None
+        return parse_lfs_pointer(_git(self.repo, "cat-file", "blob", oid).stdout)
+
+    def keep(self, path: Path, file: StoredFile):
+        with self._lock:
+            self._kept[self._relative(path)] = file
+
+    def _record(self, rel_path: str, oid: str):
+        """Remember the digests of the attachment committed as blob `oid`."""
+        with self._lock:
+            file = self._kept.pop(rel_path, None)
+            if file is None:
+                return
+            info = {**file.model_dump(), "oid": oid}
+            if self._attachments.get(rel_path) != info:
+                self._attachments[rel_path] = info
+                self._state_changed = True
+
+    def _take_pending(self, prefix: str | None = None) -> dict[str, bytes]:
+        with self._lock:
+            taken = {
+                path: data
+                for path, data in self._pending.items()
+                if prefix is None or path.startswith(prefix)
+            }
+            for path in taken:
+                del self._pending[path]
+        return taken
+
+    def _add_file(self, path: Path):
+        rel_path = self._relative(path)
+        mode = "100755" if os.access(path, os.X_OK) else "100644"
+        size = path.stat().st_size
+
+        if self.lfs:
+            oid = hash_file(path, READ_SIZE).sha256
+            target = self.git_dir / "lfs" / "objects" / oid[:2] / oid[2:4] / oid
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(path, target)
+            self._record(rel_path, self._add_bytes(rel_path, lfs_pointer(oid, size), mode))
+            return
+
+        with path.open("rb") as f:
+            oid = blob_id(size, iter(lambda: f.read(READ_SIZE), b""))
+            if not self._unchanged(rel_path, mode, oid):
+                f.seek(0)
+                with self._lock:
+                    mark = self._blob(size, iter(lambda: f.read(READ_SIZE), b""))
+                    self._files[rel_path] = (mode, mark)
+        self._record(rel_path, oid)
+
+    def finish_folder(self, folder: Path):
+        """Add the rendered files and attachments of a finished challenge, then drop the folder."""
+        for rel_path, data in self._take_pending(f"{self._relative(folder)}/").items():
+            self._add_bytes(rel_path, data)
+        for path in sorted(p for p in folder.rglob("*") if p.is_file()):
+            self._add_file(path)
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def discard_folder(self, folder: Path):
+        """Forget the rendered files and attachments of a challenge that failed."""
+        prefix = f"{self._relative(folder)}/"
+        self._take_pending(prefix)
+        with self._lock:
+            self._kept = {p: f for p, f in self._kept.items() if not p.startswith(prefix)}
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def existing_dirs(self) -> set[str]:
+        if not self.has_parent:
+            return set()
+        tree = _git(self.repo, "ls-tree", "-r", "-d", "--name-only", "-z", self.ref)
+        return {name for name in tree.stdout.split("\0") if name}
+
+    def _committer(self) -> str:
+        ident = _git(self.repo, "var", "GIT_COMMITTER_IDENT", check=False)
+        if ident.returncode == 0 and ident.stdout.strip():
+            return ident.stdout.strip()
+        return f"ctf-dl <ctf-dl@localhost> {int(time.time())} +0000"
+
+    def commit(self, message: str) -> str:
+        """Write the commit and wait for fast-import; returns the new commit id."""
+        # What is still pending was written outside any challenge folder, like the index
+        for rel_path, data in self._take_pending().items():
+            self._add_bytes(rel_path, data)
+        if self.lfs and ".gitattributes" not in self._tree:
+            self._add_bytes(".gitattributes", LFS_ATTRIBUTES.encode())
+        if self._state_changed:
+            state = json.dumps(self._attachments, indent=2, sort_keys=True)
+            self._add_bytes(STATE_PATH, state.encode())
+
+        msg = message.encode("utf-8")
+        lines = [f"commit {self.ref}", f"committer {self._committer()}", f"data {len(msg)}"]
+        stdin = self._proc.stdin
+        with self._lock:
+            stdin.write("\n".join(lines).encode() + b"\n" + msg + b"\n")
+            if self.has_parent:
+                stdin.write(f"from {self.ref}^0\n".encode())
+            for path, (mode, mark) in sorted(self._files.items()):
+                stdin.write(f"M {mode} :{mark} {_quote_path(path)}\n".encode())
+            stdin.write(b"\ndone\n")
+
+        self._proc.communicate()
+        with self._stderr:
+            if self._proc.returncode != 0:
+                self._stderr.seek(0)
+                stderr = self._stderr.read().decode(errors="replace")
+                raise RuntimeError(f"git fast-import failed: {stderr}")
+        return _git(self.repo, "rev-parse", self.ref).stdout.strip()
+
+    def abort(self):
+        """Stop fast-import without updating the branch."""
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        self._stderr.close()
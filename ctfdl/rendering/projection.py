@@ -0,0 +1,75 @@
+from collections.abc import Iterator
+
+from jinja2 import nodes
+
+# Index templates see each challenge as `entry.data`
+INDEX_DATA_ATTR = "data"
+
+
+def _walk(node: nodes.Node, parent: nodes.Node | None = None) -> Iterator[tuple]:
+    yield node, parent
+    for child in node.iter_child_nodes():
+        yield from _walk(child, node)
+
+
+def _attr(node: nodes.Node | None) -> str | None:
+    """The attribute name of `x.attr` or `x["attr"]`, if `node` is one of those."""
+    if isinstance(node, nodes.Getattr):
+        return node.attr
+    if (
+        isinstance(node, nodes.Getitem)
+        and isinstance(node.arg, nodes.Const)
+        and isinstance(node.arg.value, str)
+    ):
+        return node.arg.value
+    return None
+
+
+def _field_of(node: nodes.Node, parent: nodes.Node | None) -> str | None:
+    """The field read from `node` when `parent` is an attribute lookup on it."""
+    if getattr(parent, "node", None) is node:
+        return _attr(parent)
+    return None
+
+
+def challenge_fields(ast: nodes.Template) -> set[str] | None:
+    """
+    The `challenge.*` fields a challenge or folder template reads.
+
+    Returns None when the template uses `challenge` as a whole (dumping it, passing it
+    to a macro, assigning it), since any field could then end up in the output.
+    """
+    fields = set()
+    for node, parent in _walk(ast):
+        if isinstance(node, nodes.Name) and node.name == "challenge" and node.ctx == "load":
+            field = _field_of(node, parent)
+            if field is None:
+                return None
+            fields.add(field)
+    return fields
+
+
+def index_fields(ast: nodes.Template) -> set[str] | None:
+    """
+    The challenge fields an index template reads through `entry.data.*`.
+
+    Attribute paths given to filters, like `selectattr("data.value")`, count as well.
+    Returns None when the challenge data is used as a whole.
+    """
+    fields = set()
+    for node, parent in _walk(ast):
+        if _attr(node) == INDEX_DATA_ATTR:
+            field = _field_of(node, parent)
+            if field is None:
+                return None
+            fields.add(field)
+        elif isinstance(node, nodes.Const) and isinstance(node.value, str):
+            head, _, rest = node.value.partition(".")
+            if head == INDEX_DATA_ATTR:
+                if not rest:
+                    return None
+                fields.add(rest.partition(".")[0])
+        elif isinstance(node, nodes.Filter) and node.name in ("tojson", "pprint"):
+            if isinstance(node.node, nodes.Name) and node.node.name == "challenges":
+                return None
+    return fields
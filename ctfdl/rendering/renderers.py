@@ -4,30 +4,61 @@ from ctfbridge.models.challenge import Challenge as CTFBridgeChallenge
 from jinja2 import Environment
 
 from ctfdl.common.format_output import format_output
-from ctfdl.core.models import ChallengeEntry
+from ctfdl.common.prettify_cache import PrettifyCache
+from ctfdl.core.models import AttachmentFile, ChallengeEntry
+from ctfdl.rendering.sinks import FileSink, OutputSink
+
+
+def challenge_context(
+    challenge: CTFBridgeChallenge, files: list[AttachmentFile] | None = None
+) -> dict:
+    """Dump a challenge for templating, annotating attachments with what was recorded for them."""
+    data = challenge.model_dump()
+    by_name = {f.name: f for f in files or []}
+    for attachment in data.get("attachments") or []:
+        recorded = by_name.get(attachment.get("name"))
+        if recorded:
+            attachment["sha256"] = recorded.sha256
+            if recorded.blake3:
+                attachment["blake3"] = recorded.blake3
+            if recorded.deferred:
+                attachment["deferred"] = True
+                attachment["size_bytes"] = recorded.size_bytes
+    return data
 
 
 class BaseRenderer:
     """Base renderer with shared formatting and file writing logic."""
 
-    def _apply_formatting_and_write(self, rendered: str, output_path: Path, config: dict):
-        """Format rendered content and write to disk."""
+    def __init__(self, sink: OutputSink | None = None, cache: PrettifyCache | None = None):
+        self.sink = sink or FileSink()
+        self.cache = cache
+
+    def _apply_formatting_and_write(self, rendered: str, output_path: Path, config: dict) -> bool:
+        """Format rendered content and write it out, unless the file is unchanged."""
         rendered = format_output(
             rendered,
             output_path,
             prettify=config.get("prettify", False),
+            cache=self.cache,
         )
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        output_path.write_text(rendered, encoding="utf-8")
+        return self.sink.write_text(output_path, rendered)
 
 
 class ChallengeRenderer(BaseRenderer):
     """Renders individual challenge."""
 
-    def render(self, template, config: dict, challenge: CTFBridgeChallenge, output_dir: Path):
-        rendered = template.render(challenge=challenge.model_dump())
+    def render(
+        self,
+        template,
+        config: dict,
+        challenge: CTFBridgeChallenge,
+        output_dir: Path,
+        files: list[AttachmentFile] | None = None,
+    ) -> bool:
+        rendered = template.render(challenge=challenge_context(challenge, files))
         output_path = output_dir / config["output_file"]
-        self._apply_formatting_and_write(rendered, output_path, config)
+        return self._apply_formatting_and_write(rendered, output_path, config)
 
 
 class FolderRenderer:
@@ -44,7 +75,12 @@ class IndexRenderer(BaseRenderer):
     """Renders the global challenge index."""
 
     def render(self, template, config: dict, challenges: list[ChallengeEntry], output_path: Path):
-        rendered = template.render(challenges=[challenge.model_dump() for challenge in challenges])
+        rendered = template.render(
+            challenges=[
+                {**entry.model_dump(), "data": challenge_context(entry.data, entry.files)}
+                for entry in challenges
+            ]
+        )
 
         final_path = output_path.parent / config.get("output_file", output_path.name)
 
@@ -0,0 +1,404 @@
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import shutil
+import threading
+import xml.etree.ElementTree as ET
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+import httpx
+
+from ctfdl.core.config import STATE_DIR_NAME, S3Target
+from ctfdl.rendering.sinks import AttachmentUpload, OutputSink, StoredFile
+
+# Headers that are signed besides host; the rest may be changed by proxies
+SIGNED_HEADERS = ("content-md5", "content-type", "range")
+# Sizes, digests and origin validators of streamed attachments, kept next to the export
+STATE_KEY = f"{STATE_DIR_NAME}/attachments.json"
+
+
+def _encode(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+class SigV4Auth(httpx.Auth):
+    """AWS Signature Version 4 for S3 requests, with the payload hash in the signature."""
+
+    def __init__(
+        self, access_key: str, secret_key: str, region: str, session_token: str | None = None
+    ):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.session_token = session_token
+
+    def auth_flow(self, request: httpx.Request) -> Iterator[httpx.Request]:
+        self.sign(request, datetime.now(timezone.utc))
+        yield request
+
+    def sign(self, request: httpx.Request, now: datetime):
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+
+        request.headers["x-amz-date"] = amz_date
+        if "x-amz-content-sha256" not in request.headers:
+            request.headers["x-amz-content-sha256"] = hashlib.sha256(request.content).hexdigest()
+        if self.session_token:
+            request.headers["x-amz-security-token"] = self.session_token
+
+        headers = {
+            name: " ".join(value.split())
+            for name, value in request.headers.items()
+            if name == "host" or name in SIGNED_HEADERS or name.startswith("x-amz-")
+        }
+        signed = ";".join(sorted(headers))
+        query = "&".join(
+            f"{_encode(k)}={_encode(v)}" for k, v in sorted(request.url.params.multi_items())
+        )
+        canonical = "\n".join(
+            [
+                request.method,
+                request.url.raw_path.split(b"?")[0].decode("ascii"),
+                query,
+                "".join(f"{name}:{headers[name]}\n" for name in sorted(headers)),
+                signed,
+                request.headers["x-amz-content-sha256"],
+            ]
+        )
+        to_sign = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                scope,
+                hashlib.sha256(canonical.encode()).hexdigest(),
+            ]
+        )
+
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (amz_date[:8], self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, to_sign.encode(), hashlib.sha256).hexdigest()
+        request.headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed}, Signature={signature}"
+        )
+
+
+def _read_parts(path: Path, part_size: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        while part := f.read(part_size):
+            yield part
+
+
+def s3_etag(path: Path, part_size: int) -> str:
+    """The ETag S3 gives `path` when uploaded by S3Sink: an MD5, or an MD5 of part MD5s."""
+    digests = [hashlib.md5(part).digest() for part in _read_parts(path, part_size)]  # noqa: S324
+    return _combined_etag(digests)
+
+
+def _combined_etag(digests: list[bytes]) -> str:
+    if len(digests) <= 1:
+        return (digests[0] if digests else hashlib.md5(b"").digest()).hex()  # noqa: S324
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"  # noqa: S324
+
+
+class S3Sink(OutputSink):
+    """
+    Uploads the export to an S3-compatible bucket instead of keeping a folder.
+
+    HTTP attachments stream into the bucket while they download, a part at a time once
+    they outgrow one, so they are never staged on disk; their sizes, digests and origin
+    validators are kept in `.ctfdl/attachments.json` under the prefix, so an update
+    skips the body of any the bucket already holds. Rendered files are uploaded in the
+    background as they are written, and anything else left in a challenge folder once
+    it is complete, after which the folder is removed. Objects are listed once at the
+    start, and files whose ETag would not change are skipped.
+    """
+
+    def __init__(self, target: S3Target, root: Path, transport: httpx.BaseTransport | None = None):
+        if not target.access_key or not target.secret_key:
+            raise ValueError("S3 uploads need an access key and a secret key")
+        self.target = target
+        self.root = root
+        endpoint = target.endpoint or f"https://s3.{target.region}.amazonaws.com"
+        self._base = f"{endpoint.rstrip('/')}/{_encode(target.bucket)}"
+        self._http = httpx.Client(
+            auth=SigV4Auth(
+                target.access_key, target.secret_key, target.region, target.session_token
+            ),
+            transport=transport,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+        )
+        self._parts = ThreadPoolExecutor(target.upload_workers, thread_name_prefix="ctfdl-s3")
+        self._lock = threading.Lock()
+        self._writes: list[tuple[str, Future]] = []
+        self.uploaded = 0
+        self.skipped = 0
+        self._etags = self._list()
+        self._attachments = self._load_state()
+        self._state_changed = False
+
+    def _url(self, key: str) -> str:
+        return f"{self._base}/{_encode(key, safe='/-_.~')}"
+
+    def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        response = self._http.request(method, url, **kwargs)
+        if response.is_error:
+            raise RuntimeError(
+                f"S3 {method} {url} failed: {response.status_code} {response.text[:200]}"
+            )
+        return response
+
+    def _list(self) -> dict[str, str]:
+        """ETag of every exported object under the prefix, by key relative to the prefix."""
+        etags: dict[str, str] = {}
+        params = {"list-type": "2", "prefix": self.target.prefix}
+        while True:
+            response = self._request("GET", self._base, params=params)
+            root = ET.fromstring(response.content)  # noqa: S314
+            for item in root.iterfind("{*}Contents"):
+                rel_path = item.findtext("{*}Key", "")[len(self.target.prefix) :]
+                if not rel_path.startswith(f"{STATE_DIR_NAME}/"):
+                    etags[rel_path] = item.findtext("{*}ETag", "").strip('"')
+            token = root.findtext("{*}NextContinuationToken")
+            if root.findtext("{*}IsTruncated") != "true" or not token:
+                return etags
+            params["continuation-token"] = token
+
+    def _load_state(self) -> dict[str, dict]:
+        response = self._http.get(self._url(self.target.prefix + STATE_KEY))
+        if response.status_code == 404:
+            return {}
+        if response.is_error:
+            raise RuntimeError(f"S3 GET {STATE_KEY} failed: {response.status_code}")
+        return json.loads(response.content)
+
+    def _relative(self, path: Path) -> str:
+        return path.resolve().relative_to(self.root.resolve()).as_posix()
+
+    def _unchanged(self, rel_path: str, etag: str) -> bool:
+        with self._lock:
+            if self._etags.get(rel_path) == etag:
+                self.skipped += 1
+                return True
+        return False
+
+    def _stored(self, rel_path: str, etag: str, file: StoredFile | None = None):
+        with self._lock:
+            self._etags[rel_path] = etag
+            self.uploaded += 1
+            if file is not None:
+                self._attachments[rel_path] = {**file.model_dump(), "etag": etag}
+                self._state_changed = True
+
+    def _put(self, rel_path: str, data: bytes, file: StoredFile | None = None):
+        self._request("PUT", self._url(self.target.prefix + rel_path), content=data)
+        self._stored(rel_path, hashlib.md5(data).hexdigest(), file)  # noqa: S324
+
+    def write_text(self, path: Path, text: str) -> bool:
+        rel_path = self._relative(path)
+        data = text.encode("utf-8")
+        if self._unchanged(rel_path, hashlib.md5(data).hexdigest()):  # noqa: S324
+            return False
+        # Renderers run on the event loop; the folder waits for the upload when it finishes
+        future = self._parts.submit(self._put, rel_path, data)
+        with self._lock:
+            self._writes.append((rel_path, future))
+        return True
+
+    def _wait_for_writes(self, matches: Callable[[str], bool]):
+        with self._lock:
+            waiting = [future for rel_path, future in self._writes if matches(rel_path)]
+            self._writes = [(r, f) for r, f in self._writes if not matches(r)]
+        for future in waiting:
+            future.result()
+
+    def stored(self, path: Path) -> StoredFile | None:
+        rel_path = self._relative(path)
+        with self._lock:
+            info = self._attachments.get(rel_path)
+            # Only while the object is still the one that was recorded
+            if info is None or info.get("etag") != self._etags.get(rel_path):
+                return None
+        return StoredFile.model_validate(info)
+
+    def _same_attachment(self, rel_path: str, file: StoredFile) -> bool:
+        """Whether the bucket holds these bytes already; then `file` is recorded for it."""
+        with self._lock:
+            info = self._attachments.get(rel_path)
+            etag = self._etags.get(rel_path)
+            if info is None or info.get("etag") != etag or info.get("sha256") != file.sha256:
+                return False
+            self.skipped += 1
+            if info.get("validator") != file.validator:
+                self._attachments[rel_path] = {**file.model_dump(), "etag": etag}
+                self._state_changed = True
+            return True
+
+    def open_upload(self, path: Path) -> AttachmentUpload:
+        return _StreamingUpload(self, self._relative(path))
+
+    def upload_file(self, path: Path, rel_path: str) -> bool:
+        """Upload one file unless the bucket already has it; returns whether it was sent."""
+        etag = s3_etag(path, self.target.part_size)
+        if self._unchanged(rel_path, etag):
+            return False
+        url = self._url(self.target.prefix + rel_path)
+        if path.stat().st_size <= self.target.part_size:
+            self._request("PUT", url, content=path.read_bytes())
+        else:
+            self._multipart(url, path)
+        self._stored(rel_path, etag)
+        return True
+
+    def _initiate(self, url: str) -> str:
+        response = self._request("POST", url, params={"uploads": ""})
+        return ET.fromstring(response.content).findtext("{*}UploadId")  # noqa: S314
+
+    def _put_part(self, url: str, upload_id: str, number: int, part: bytes) -> str:
+        params = {"partNumber": str(number), "uploadId": upload_id}
+        return self._request("PUT", url, params=params, content=part).headers["ETag"]
+
+    def _complete(self, url: str, upload_id: str, etags: list[str]):
+        body = "".join(
+            f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>"
+            for n, etag in enumerate(etags, 1)
+        )
+        self._request(
+            "POST",
+            url,
+            params={"uploadId": upload_id},
+            content=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>".encode(),
+        )
+
+    def _abort(self, url: str, upload_id: str):
+        # An unfinished upload keeps its parts billed until it is aborted
+        with contextlib.suppress(httpx.HTTPError):
+            self._http.request("DELETE", url, params={"uploadId": upload_id})
+
+    def _multipart(self, url: str, path: Path):
+        upload_id = self._initiate(url)
+        try:
+            # Parts are read as they are submitted, so at most a few are in memory at once
+            pending = []
+            etags = []
+            for number, part in enumerate(_read_parts(path, self.target.part_size), 1):
+                pending.append(self._parts.submit(self._put_part, url, upload_id, number, part))
+                if len(pending) >= self.target.upload_workers:
+                    etags.append(pending.pop(0).result())
+            etags += [future.result() for future in pending]
+            self._complete(url, upload_id, etags)
+        except BaseException:
+            self._abort(url, upload_id)
+            raise
+
+    def finish_folder(self, folder: Path):
+        """Upload every file left in a challenge folder, then drop the folder."""
+        prefix = self._relative(folder) + "/"
+        self._wait_for_writes(lambda rel_path: rel_path.startswith(prefix))
+        for path in sorted(p for p in folder.rglob("*") if p.is_file()):
+            self.upload_file(path, self._relative(path))
+        shutil.rmtree(folder, ignore_errors=True)
+
+    def existing_dirs(self) -> set[str]:
+        dirs = set()
+        for key in self._etags:
+            parts = key.split("/")[:-1]
+            dirs.update("/".join(parts[:i]) for i in range(1, len(parts) + 1))
+        return dirs
+
+    def flush(self):
+        """Wait for the uploads still running and save the attachment records."""
+        self._wait_for_writes(lambda rel_path: True)
+        if self._state_changed:
+            data = json.dumps(self._attachments, indent=2, sort_keys=True).encode()
+            self._request("PUT", self._url(self.target.prefix + STATE_KEY), content=data)
+            self._state_changed = False
+
+    def close(self):
+        self._parts.shutdown()
+        self._http.close()
+
+
+class _StreamingUpload(AttachmentUpload):
+    """
+    One attachment on its way into the bucket.
+
+    Bytes are buffered up to one part. A file that fits in one is sent with a single PUT
+    once complete, as `upload_file` would; otherwise a multipart upload starts once more
+    than a part has arrived, and at most `upload_workers` parts are in flight before
+    writing waits for the oldest.
+    """
+
+    def __init__(self, sink: S3Sink, rel_path: str):
+        self.sink = sink
+        self.rel_path = rel_path
+        self.url = sink._url(sink.target.prefix + rel_path)
+        self._buffer = bytearray()
+        self._upload_id: str | None = None
+        self._pending: list[asyncio.Future] = []
+        self._etags: list[str] = []
+
+    async def write(self, data: bytes):
+        self._buffer += data
+        part_size = self.sink.target.part_size
+        # A file of exactly one part must not become a one-part multipart upload, whose
+        # ETag ends in "-1" where `s3_etag` expects a plain MD5
+        while len(self._buffer) > part_size:
+            part = bytes(self._buffer[:part_size])
+            del self._buffer[:part_size]
+            await self._send(part)
+
+    async def _send(self, part: bytes):
+        if self._upload_id is None:
+            self._upload_id = await asyncio.to_thread(self.sink._initiate, self.url)
+        number = len(self._etags) + len(self._pending) + 1
+        future = self.sink._parts.submit(
+            self.sink._put_part, self.url, self._upload_id, number, part
+        )
+        self._pending.append(asyncio.wrap_future(future))
+        if len(self._pending) >= self.sink.target.upload_workers:
+            self._etags.append(await self._pending.pop(0))
+
+    async def restart(self):
+        await self.abort()
+        self._buffer.clear()
+        self._etags.clear()
+
+    async def finish(self, file: StoredFile) -> bool:
+        if self._upload_id is None:
+            if self.sink._same_attachment(self.rel_path, file):
+                return False
+            await asyncio.to_thread(self.sink._put, self.rel_path, bytes(self._buffer), file)
+            return True
+
+        try:
+            if self._buffer:
+                await self._send(bytes(self._buffer))
+                self._buffer.clear()
+            pending, self._pending = self._pending, []
+            self._etags += await asyncio.gather(*pending)
+            if self.sink._same_attachment(self.rel_path, file):
+                await self.abort()
+                return False
+            await asyncio.to_thread(self.sink._complete, self.url, self._upload_id, self._etags)
+        except BaseException:
+            await self.abort()
+            raise
+        self._upload_id = None
+        digests = [bytes.fromhex(etag.strip('"')) for etag in self._etags]
+        self.sink._stored(self.rel_path, _combined_etag(digests), file)
+        return True
+
+    async def abort(self):
+        pending, self._pending = self._pending, []
+        await asyncio.gather(*pending, return_exceptions=True)
+        if self._upload_id is not None:
+            upload_id, self._upload_id = self._upload_id, None
+            await asyncio.to_thread(self.sink._abort, self.url, upload_id)
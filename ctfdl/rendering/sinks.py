@@ -0,0 +1,99 @@
+from pathlib import Path
+
+from pydantic import BaseModel
+
+
+class StoredFile(BaseModel):
+    """An attachment's size and digests, and the origin validator it was fetched with."""
+
+    size: int
+    sha256: str | None = None
+    blake3: str | None = None
+    validator: str | None = None
+
+
+class AttachmentUpload:
+    """
+    Takes an attachment's bytes while they download, in place of a file on disk.
+
+    `restart` forgets what was written when the download has to start over. Exactly one
+    of `finish` or `abort` ends the upload.
+    """
+
+    def expect(self, size: int):
+        """The announced size, before the first write."""
+
+    async def write(self, data: bytes):
+        raise NotImplementedError
+
+    async def restart(self):
+        raise NotImplementedError
+
+    async def finish(self, file: StoredFile) -> bool:
+        """Keep the upload; returns False if the sink already held these bytes."""
+        raise NotImplementedError
+
+    async def abort(self):
+        raise NotImplementedError
+
+
+class OutputSink:
+    """
+    Where rendered files and downloaded attachments end up.
+
+    Renderers hand their output to `write_text`. HTTP attachments go to `open_upload`
+    when the sink offers one, and into the challenge folder otherwise; `finish_folder`
+    is called once a challenge is complete so sinks that do not keep a working tree can
+    collect what is on disk; `discard_folder` is called instead when it fails.
+
+    Sinks that write straight into the output set `stages_folders`, so new challenges
+    are built in a staging directory and only renamed into place once complete.
+    """
+
+    stages_folders = False
+
+    def write_text(self, path: Path, text: str) -> bool:
+        """Store a rendered file; returns False if it was left alone because it is unchanged."""
+        raise NotImplementedError
+
+    def stored(self, path: Path) -> StoredFile | None:
+        """What the sink already holds at `path`, so an unchanged download can be skipped."""
+        return None
+
+    def keep(self, path: Path, file: StoredFile):
+        """Called once an attachment is downloaded to `path` on disk, with its digests."""
+
+    def open_upload(self, path: Path) -> AttachmentUpload | None:
+        """Stream the attachment for `path` into the sink; None to download it to disk."""
+        return None
+
+    def finish_folder(self, folder: Path):
+        pass
+
+    def discard_folder(self, folder: Path):
+        """Called instead of `finish_folder` when a challenge failed partway."""
+
+    def existing_dirs(self) -> set[str] | None:
+        """Directories already exported, relative to the output root; None to scan it."""
+        return None
+
+
+class FileSink(OutputSink):
+    """
+    Writes everything straight into the output directory.
+
+    Files whose content would not change are not rewritten, which keeps their mtime
+    and lets rsync and backups skip them.
+    """
+
+    stages_folders = True
+
+    def write_text(self, path: Path, text: str) -> bool:
+        data = text.encode("utf-8")
+        try:
+            if path.stat().st_size == len(data) and path.read_bytes() == data:
+                return False
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return True
@@ -0,0 +1,44 @@
+import logging
+from pathlib import Path
+
+from ctfdl.core.events import EventEmitter, handles
+from ctfdl.core.models import ChallengeEntry
+from ctfdl.search.index import SearchIndex, ctf_label, record_source
+
+logger = logging.getLogger(__name__)
+
+
+class SearchIndexHandler:
+    """Keeps the search index up to date as challenges are exported."""
+
+    def __init__(self, emitter: EventEmitter, index_path: Path, output: Path, url: str):
+        self._index_path = index_path
+        self._output = output
+        self._url = url
+        self._ctf = ctf_label(url)
+        self._index: SearchIndex | None = None
+        self._disabled = False
+        emitter.subscribe(self)
+
+    @handles("challenge_exported")
+    def on_challenge_exported(self, entry: ChallengeEntry):
+        if self._disabled:
+            return
+        if self._index is None:
+            try:
+                self._index = SearchIndex(self._index_path)
+            except RuntimeError as e:
+                logger.warning("Search index disabled: %s", e)
+                self._disabled = True
+                return
+            try:
+                record_source(self._output, self._url)
+            except OSError as e:
+                logger.debug("Could not record the source of %s: %s", self._output, e)
+        self._index.add(self._output, entry, self._ctf)
+
+    @handles("download_complete")
+    def on_download_complete(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
@@ -0,0 +1,206 @@
+import json
+import logging
+import sqlite3
+import time
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from urllib.parse import urlparse
+
+from pydantic import BaseModel
+
+from ctfdl.core.config import STATE_DIR_NAME, state_dir
+from ctfdl.core.models import ChallengeEntry
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "search.sqlite"
+# Where an output folder remembers which CTF it holds
+SOURCE_FILE = "source.json"
+
+# bm25 weights, in the column order of the FTS table
+COLUMN_WEIGHTS = (10.0, 3.0, 1.0, 5.0, 3.0, 1.0)
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS challenges USING fts5(
+    name, category, description, tags, attachments, ctf,
+    challenge_id UNINDEXED, points UNINDEXED, root UNINDEXED, path UNINDEXED,
+    indexed_at UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+-- The rowid of each folder's row, since lookups on UNINDEXED columns scan the table
+CREATE TABLE IF NOT EXISTS folders (
+    id INTEGER PRIMARY KEY,
+    root TEXT NOT NULL,
+    path TEXT NOT NULL,
+    UNIQUE (root, path)
+);
+"""
+
+
+class SearchHit(BaseModel):
+    name: str
+    category: str | None
+    points: int | None
+    ctf: str | None
+    path: Path
+    snippet: str
+    score: float
+
+
+def default_index_path(output: Path) -> Path:
+    return state_dir(output) / INDEX_FILE
+
+
+def ctf_label(url: str) -> str:
+    """The name a CTF is indexed under: the host of its URL."""
+    return urlparse(url).netloc or url
+
+
+def record_source(output: Path, url: str):
+    """Remember the URL an output folder was exported from, for later reindexing."""
+    path = state_dir(output) / SOURCE_FILE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"url": url}), encoding="utf-8")
+
+
+def recorded_ctf(output: Path) -> str | None:
+    try:
+        data = json.loads((state_dir(output) / SOURCE_FILE).read_text(encoding="utf-8"))
+        return ctf_label(data["url"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def to_fts_query(query: str) -> str:
+    """Turn free text into an FTS5 query that matches every word as a prefix."""
+    terms = [t.replace('"', '""') for t in query.split()]
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+class SearchIndex:
+    """Full-text index over exported challenges, stored in SQLite FTS5."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        has_folders = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'folders'"
+        ).fetchone()
+        try:
+            self._db.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._db.close()
+            raise RuntimeError(f"SQLite FTS5 is not available: {e}") from e
+        if not has_folders:
+            # Indexes from before the folders table get it filled from their rows
+            with self._db:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO folders (id, root, path) "
+                    "SELECT rowid, root, path FROM challenges"
+                )
+
+    @staticmethod
+    def _row(root: Path, rel_path: Path, data: dict, ctf: str | None) -> tuple:
+        attachments = [a.get("name") or "" for a in data.get("attachments") or []]
+        return (
+            data.get("name") or "",
+            data.get("category") or "",
+            data.get("description") or "",
+            " ".join(data.get("tags") or []),
+            " ".join(attachments),
+            ctf or "",
+            str(data.get("id") or ""),
+            data.get("value"),
+            str(root.resolve()),
+            str(rel_path),
+            time.time(),
+        )
+
+    def add(self, root: Path, entry: ChallengeEntry, ctf: str | None = None):
+        self.add_many([(root, entry.path, entry.data.model_dump(), ctf)])
+
+    def add_many(self, rows: Iterable[tuple[Path, Path, dict, str | None]]):
+        rows = [self._row(*row) for row in rows]
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO folders (root, path) VALUES (?, ?)",
+                [(row[8], row[9]) for row in rows],
+            )
+            rowids = [
+                self._db.execute(
+                    "SELECT id FROM folders WHERE root = ? AND path = ?", (row[8], row[9])
+                ).fetchone()[0]
+                for row in rows
+            ]
+            self._db.executemany(
+                "DELETE FROM challenges WHERE rowid = ?", [(rowid,) for rowid in rowids]
+            )
+            self._db.executemany(
+                "INSERT INTO challenges (rowid, name, category, description, tags, "
+                "attachments, ctf, challenge_id, points, root, path, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(rowid, *row) for rowid, row in zip(rowids, rows, strict=True)],
+            )
+
+    def search(
+        self, query: str, limit: int = 20, category: str | None = None, raw: bool = False
+    ) -> list[SearchHit]:
+        sql = (
+            "SELECT name, category, points, ctf, root, path, "
+            "snippet(challenges, 2, '[', ']', '…', 12), "
+            "bm25(challenges, ?, ?, ?, ?, ?, ?) AS score "
+            "FROM challenges WHERE challenges MATCH ? AND (? IS NULL OR category = ?) "
+            "ORDER BY score LIMIT ?"
+        )
+        params = [
+            *COLUMN_WEIGHTS,
+            query if raw else to_fts_query(query),
+            category,
+            category,
+            limit,
+        ]
+
+        return [
+            SearchHit(
+                name=name,
+                category=cat or None,
+                points=points,
+                ctf=ctf or None,
+                path=Path(root) / path,
+                snippet=snippet,
+                score=score,
+            )
+            for name, cat, points, ctf, root, path, snippet, score in self._db.execute(sql, params)
+        ]
+
+    def close(self):
+        self._db.close()
+
+
+def iter_sidecars(root: Path) -> Iterator[tuple[Path, dict]]:
+    """Yield (challenge folder, challenge data) for every JSON sidecar in an output tree."""
+    for file in root.rglob("*.json"):
+        if STATE_DIR_NAME in file.relative_to(root).parts:
+            continue
+        try:
+            data = json.loads(file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict) and "id" in data and "name" in data:
+            yield file.parent.relative_to(root), data
+
+
+def reindex_tree(index: SearchIndex, root: Path, ctf: str | None = None) -> int:
+    """
+    Bulk-index an existing output tree from its JSON sidecars.
+
+    Challenges are labelled with `ctf`, else with the CTF the tree was exported from,
+    the same label live indexing uses. Trees from before that was recorded fall back
+    to the folder name.
+    """
+    ctf = ctf or recorded_ctf(root) or root.resolve().name
+    rows = [(root, rel_path, data, ctf) for rel_path, data in iter_sidecars(root)]
+    index.add_many(rows)
+    return len(rows)
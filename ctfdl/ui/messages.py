@@ -2,6 +2,22 @@ from rich.console import Console
 
 _default_console = Console(log_path=False, log_time=False)
 
+# ===== Formatting =====
+
+
+def format_size(size_bytes: int | None) -> str:
+    if size_bytes is None:
+        return "unknown size"
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    size = size_bytes / 1024
+    for unit in ("KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
 # ===== Basic Notifications =====
 
 
@@ -59,6 +75,13 @@ def challenges_found(count: int, console: Console = _default_console):
     console.print(f"📦 Found [bold]{count} challenges[/] to download:\n")
 
 
+def resumed_run(finished: int, remaining: int, console: Console = _default_console):
+    console.print(
+        f"⏯️  Resuming an interrupted run: [bold]{finished}[/] challenges already done, "
+        f"[bold]{remaining}[/] left"
+    )
+
+
 def downloaded_challenge(name: str, category: str, console: Console = _default_console):
     console.print(f"✅ Downloaded: [green]{name}[/] ([cyan]{category}[/])")
 
@@ -84,21 +107,177 @@ def download_success_updated_all(count: int, console: Console = _default_console
 
 
 def download_success_summary(
-    downloaded: int, updated: int, skipped: int, console: Console = _default_console
+    downloaded: int,
+    updated: int,
+    skipped: int,
+    unchanged: int = 0,
+    console: Console = _default_console,
 ):
     console.print("🎉 [bold green]Download summary:[/bold green]")
     if downloaded:
         console.print(f"   ✅ {downloaded} new challenges downloaded")
     if updated:
         console.print(f"   🔄 {updated} challenges updated")
+    if unchanged:
+        console.print(f"   💤 {unchanged} challenges unchanged")
     if skipped:
         console.print(f"   ⏩ {skipped} challenges skipped")
 
 
+def deferred_attachments(count: int, size_bytes: int, console: Console = _default_console):
+    console.print(
+        f"   📎 {count} attachments deferred ({format_size(size_bytes)}), "
+        f"download them with [cyan]ctf-dl fetch <path|glob>[/cyan]"
+    )
+
+
+def time_budget_left(names: list[str], console: Console = _default_console):
+    shown = ", ".join(names[:5]) + (f" and {len(names) - 5} more" if len(names) > 5 else "")
+    console.print(
+        f"   ⏱️ Time budget reached, {len(names)} challenges left ({shown}); "
+        f"run the same command again to continue"
+    )
+
+
+def workers_crashed(count: int, names: list[str], console: Console = _default_console):
+    shown = ", ".join(names[:5]) + (f" and {len(names) - 5} more" if len(names) > 5 else "")
+    console.print(
+        f"   💥 {count} worker processes crashed, {len(names)} challenges left ({shown}); "
+        f"run the same command again to continue"
+    )
+
+
+def relocated_folders(
+    moved: int, orphans: list[str], pruned: bool, console: Console = _default_console
+):
+    if moved:
+        console.print(f"   🚚 {moved} challenge folders moved to their new paths")
+    if not orphans:
+        return
+    shown = ", ".join(orphans[:5]) + (f" and {len(orphans) - 5} more" if len(orphans) > 5 else "")
+    if pruned:
+        console.print(f"   🧹 {len(orphans)} folders of removed challenges deleted ({shown})")
+    else:
+        console.print(
+            f"   👻 {len(orphans)} folders of challenges no longer listed ({shown}); "
+            f"delete them with [cyan]--prune[/cyan]"
+        )
+
+
+def format_duration(seconds: float) -> str:
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+
+def export_plan(plan, console: Console = _default_console):
+    from rich.table import Table
+
+    console.print("📋 [bold]Export plan[/bold] [dim](dry run, nothing was written)[/dim]")
+    table = Table(show_header=True, header_style="bold magenta", box=None)
+    table.add_column("Category", style="cyan")
+    table.add_column("New", justify="right", style="green")
+    table.add_column("Update", justify="right", style="yellow")
+    table.add_column("Skip", justify="right", style="dim")
+    table.add_column("Attachments", justify="right")
+    for name, category in sorted(plan.categories.items()):
+        table.add_row(
+            name,
+            str(category.new),
+            str(category.update),
+            str(category.skip),
+            format_size(category.attachment_bytes),
+        )
+    categories = plan.categories.values()
+    table.add_row(
+        "[bold]Total[/bold]",
+        str(sum(c.new for c in categories)),
+        str(sum(c.update for c in categories)),
+        str(sum(c.skip for c in categories)),
+        format_size(plan.attachment_bytes),
+    )
+    console.print(table)
+
+    unknown = f", {plan.unknown_sizes} of unknown size" if plan.unknown_sizes else ""
+    console.print(
+        f"   📦 {plan.attachment_count} attachments, {format_size(plan.attachment_bytes)}{unknown}"
+    )
+    for file in plan.largest:
+        console.print(
+            f"      {format_size(file.size_bytes):>10}  {file.name} [dim]({file.challenge})[/dim]"
+        )
+    if plan.free_bytes is not None:
+        verdict = "[green]enough[/green]" if plan.fits else "[bold red]not enough[/bold red]"
+        console.print(f"   💽 {format_size(plan.free_bytes)} free on {plan.disk_path}: {verdict}")
+    if plan.estimated_seconds is not None:
+        measured = (
+            f" at {format_size(round(plan.throughput))}/s with --parallel {plan.parallel}"
+            if plan.throughput
+            else ""
+        )
+        console.print(
+            f"   ⏱️ Estimated duration: {format_duration(plan.estimated_seconds)}{measured}"
+        )
+    else:
+        console.print("   ⏱️ Estimated duration: unknown, no attachment could be sampled")
+
+
+def extracted_archives(count: int, console: Console = _default_console):
+    console.print(f"   🗜️ {count} archives extracted")
+
+
+def rejected_archive(name: str, reason: str | None, console: Console = _default_console):
+    warning(f"Did not extract {name}: {reason}", console)
+
+
+def fetched_attachment(path: str, size_bytes: int | None, console: Console = _default_console):
+    console.print(f"✅ Fetched: [green]{path}[/] ({format_size(size_bytes)})")
+
+
+def failed_attachment(path: str, reason: str, console: Console = _default_console):
+    console.print(f"❌ [bold red]ERROR:[/] Failed [green]{path}[/]: {reason}")
+
+
+def uploaded_output(url: str, uploaded: int, unchanged: int, console: Console = _default_console):
+    console.print(
+        f"☁️  [green]Uploaded to[/] [bold underline]{url}[/] "
+        f"[dim]({uploaded} uploaded, {unchanged} unchanged)[/]"
+    )
+
+
 def zipped_output(path: str, console: Console = _default_console):
     console.print(f"🗂️ [green]Output saved to:[/] [bold underline]{path}[/]")
 
 
+def search_results(hits: list, console: Console = _default_console):
+    if not hits:
+        warning("No matching challenges", console)
+        return
+
+    from rich.table import Table
+
+    table = Table(show_header=True, header_style="bold magenta", box=None)
+    table.add_column("Name", style="bold green")
+    table.add_column("Category", style="cyan")
+    table.add_column("Points", justify="right")
+    table.add_column("CTF", style="yellow")
+    table.add_column("Match")
+    for hit in hits:
+        table.add_row(
+            f"[link=file://{hit.path}]{hit.name}[/link]",
+            hit.category or "",
+            "" if hit.points is None else str(hit.points),
+            hit.ctf or "",
+            hit.snippet.replace("\n", " "),
+        )
+    console.print(table)
+
+
 # ===== Version and Update =====
 
 
@@ -9,18 +9,12 @@ from rich.text import Text
 from rich.tree import Tree
 
 import ctfdl.ui.messages as console_utils
+from ctfdl.challenges.dry_run import ExportPlan
+from ctfdl.challenges.extractor import ExtractResult
+from ctfdl.challenges.manifest import Relocation
 from ctfdl.common.console import console
-from ctfdl.core.events import EventEmitter
-
-
-def handles(event_name: str):
-    """Decorator to mark a method as an event handler for `event_name`."""
-
-    def decorator(func):
-        func._event_name = event_name
-        return func
-
-    return decorator
+from ctfdl.core.events import EventEmitter, handles
+from ctfdl.core.models import AttachmentFile
 
 
 class AdaptiveTimeColumn(ProgressColumn):
@@ -58,13 +52,14 @@ class RichConsoleHandler:
         self._attachment_nodes: dict[str, any] = {}
         self._lock = asyncio.Lock()
 
-        self._stats = {"downloaded": 0, "updated": 0, "skipped": 0}
+        self._stats = {"downloaded": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+        self._deferred = {"count": 0, "bytes": 0}
+        self._extracted = 0
+        self._left: list[Challenge] = []
+        self._crashed = 0
+        self._relocation: Relocation | None = None
 
-        # Register handles
-        for attr_name in dir(self):
-            fn = getattr(self, attr_name)
-            if callable(fn) and hasattr(fn, "_event_name"):
-                emitter.on(fn._event_name, fn)
+        emitter.subscribe(self)
 
     # ===== Connection =====
 
@@ -101,6 +96,10 @@ class RichConsoleHandler:
     def on_download_start(self):
         self._progress.update(self._main_task_id, description="Downloading challenges")
 
+    @handles("run_resumed")
+    def on_run_resumed(self, finished: int, remaining: int):
+        console_utils.resumed_run(finished, remaining, console=self._console)
+
     @handles("no_challenges_found")
     def on_no_challenges_found(self):
         if self._main_task_id:
@@ -120,10 +119,11 @@ class RichConsoleHandler:
 
         downloaded = self._stats["downloaded"]
         updated = self._stats["updated"]
+        unchanged = self._stats["unchanged"]
         skipped = self._stats["skipped"]
-        total = downloaded + updated + skipped
+        total = downloaded + updated + unchanged + skipped
 
-        if updated == 0 and skipped == 0:
+        if updated == 0 and unchanged == 0 and skipped == 0:
             console_utils.download_success_new(downloaded, console=self._console)
         elif skipped == total:
             console_utils.download_success_skipped_all(skipped, console=self._console)
@@ -131,9 +131,52 @@ class RichConsoleHandler:
             console_utils.download_success_updated_all(updated, console=self._console)
         else:
             console_utils.download_success_summary(
-                downloaded, updated, skipped, console=self._console
+                downloaded, updated, skipped, unchanged, console=self._console
+            )
+
+        if self._extracted:
+            console_utils.extracted_archives(self._extracted, console=self._console)
+
+        if self._deferred["count"]:
+            console_utils.deferred_attachments(
+                self._deferred["count"], self._deferred["bytes"], console=self._console
+            )
+
+        if self._relocation:
+            console_utils.relocated_folders(
+                len(self._relocation.moved),
+                self._relocation.orphans,
+                self._relocation.pruned,
+                console=self._console,
+            )
+
+        if self._left and self._crashed:
+            console_utils.workers_crashed(
+                self._crashed, [chal.name for chal in self._left], console=self._console
+            )
+        elif self._left:
+            console_utils.time_budget_left(
+                [chal.name for chal in self._left], console=self._console
             )
 
+    @handles("time_budget_exhausted")
+    def on_time_budget_exhausted(self, left: list[Challenge]):
+        self._left = left
+
+    @handles("workers_crashed")
+    def on_workers_crashed(self, count: int):
+        self._crashed = count
+
+    @handles("folders_relocated")
+    def on_folders_relocated(self, relocation: Relocation):
+        self._relocation = relocation
+
+    @handles("export_planned")
+    def on_export_planned(self, plan: ExportPlan):
+        if self._live.is_started:
+            self._live.stop()
+        console_utils.export_plan(plan, console=self._console)
+
     @handles("download_complete")
     def on_download_complete(self):
         if self._live.is_started:
@@ -187,14 +230,31 @@ class RichConsoleHandler:
                 self._progress.update(self._main_task_id, advance=1)
 
     @handles("challenge_downloaded")
-    def on_challenge_downloaded(self, challenge: Challenge, updated: bool = False):
-        if updated:
+    def on_challenge_downloaded(
+        self, challenge: Challenge, updated: bool = False, unchanged: bool = False
+    ):
+        if unchanged:
+            self._stats["unchanged"] += 1
+        elif updated:
             self._stats["updated"] += 1
         else:
             self._stats["downloaded"] += 1
 
     # ===== Attachments =====
 
+    @handles("archive_extracted")
+    def on_archive_extracted(self, challenge: Challenge, result: ExtractResult):
+        self._extracted += 1
+
+    @handles("archive_rejected")
+    def on_archive_rejected(self, challenge: Challenge, result: ExtractResult):
+        console_utils.rejected_archive(result.archive.name, result.reason, console=self._console)
+
+    @handles("attachment_deferred")
+    def on_attachment_deferred(self, challenge: Challenge, file: AttachmentFile):
+        self._deferred["count"] += 1
+        self._deferred["bytes"] += file.size_bytes or 0
+
     @handles("attachment_progress")
     async def on_attachment_progress(self, progress_data: ProgressData, challenge: Challenge):
         pd = progress_data
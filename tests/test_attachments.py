@@ -0,0 +1,244 @@
+import asyncio
+import base64
+import hashlib
+import json
+
+import httpx
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge, DownloadInfo
+
+from ctfdl.challenges import attachments
+from ctfdl.challenges.attachments import AttachmentDownloader
+from ctfdl.challenges.deferred import AttachmentBudget, find_stubs, read_stub, write_stub
+from ctfdl.challenges.digests import DigestCache
+from ctfdl.challenges.fetch import fetch_deferred, mark_fetched
+from ctfdl.core.models import AttachmentFile
+
+PAYLOAD = b"flag{streamed}" * 4096
+
+
+class FakeClient:
+    platform_url = "https://ctf.example.com"
+
+
+def test_download_all_records_streaming_hashes(tmp_path):
+    def handler(request):
+        assert request.url == "https://ctf.example.com/files/chal.bin"
+        return httpx.Response(200, content=PAYLOAD)
+
+    challenge = Challenge(
+        id="1",
+        name="chal",
+        attachments=AttachmentCollection(
+            attachments=[
+                Attachment(name="chal.bin", download_info=DownloadInfo(url="/files/chal.bin"))
+            ]
+        ),
+    )
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            downloader = AttachmentDownloader(FakeClient(), http, chunk_size=1000, fsync="file")
+            return await downloader.download_all(challenge, tmp_path / "files")
+
+    challenge, files = asyncio.run(run())
+
+    assert (tmp_path / "files" / "chal.bin").read_bytes() == PAYLOAD
+    assert not (tmp_path / "files" / "chal.bin.part").exists()
+    assert challenge.attachments[0].size_bytes == len(PAYLOAD)
+    assert [(f.name, str(f.path), f.size_bytes) for f in files] == [
+        ("chal.bin", "files/chal.bin", len(PAYLOAD))
+    ]
+    assert files[0].sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+    assert not files[0].unchanged
+
+    # A second download of identical bytes keeps the existing file untouched
+    mtime = (tmp_path / "files" / "chal.bin").stat().st_mtime_ns
+    _, files = asyncio.run(run())
+    assert files[0].unchanged
+    assert (tmp_path / "files" / "chal.bin").stat().st_mtime_ns == mtime
+
+
+def test_oversized_attachment_is_deferred_to_a_stub(tmp_path):
+    def handler(request):
+        return httpx.Response(200, content=PAYLOAD)
+
+    challenge = Challenge(
+        id="1",
+        name="chal",
+        categories=["forensics"],
+        attachments=AttachmentCollection(
+            attachments=[Attachment(name="disk.img", download_info=DownloadInfo(url="/disk.img"))]
+        ),
+    )
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            budget = AttachmentBudget(max_size=None, category_budgets={"forensics": 1024})
+            downloader = AttachmentDownloader(FakeClient(), http, budget=budget)
+            return await downloader.download_all(challenge, tmp_path / "files")
+
+    _, files = asyncio.run(run())
+
+    assert files[0].deferred
+    assert not (tmp_path / "files" / "disk.img").exists()
+    assert find_stubs([str(tmp_path)]) == [tmp_path / "files" / "disk.img.deferred"]
+    assert read_stub(tmp_path / "files" / "disk.img.deferred")["url"] == (
+        "https://ctf.example.com/disk.img"
+    )
+
+
+def test_stalled_download_resumes_with_a_range_request(tmp_path):
+    half = len(PAYLOAD) // 2
+    requests = []
+
+    async def stalling():
+        yield PAYLOAD[:half]
+        await asyncio.sleep(10)
+
+    def handler(request):
+        requests.append(request.headers.get("Range"))
+        if "Range" in request.headers:
+            assert request.headers["If-Range"] == '"v1"'
+            return httpx.Response(206, content=PAYLOAD[half:])
+        headers = {"Content-Length": str(len(PAYLOAD)), "Accept-Ranges": "bytes", "ETag": '"v1"'}
+        return httpx.Response(200, content=stalling(), headers=headers)
+
+    challenge = Challenge(
+        id="1",
+        name="chal",
+        attachments=AttachmentCollection(
+            attachments=[Attachment(name="slow.bin", download_info=DownloadInfo(url="/slow.bin"))]
+        ),
+    )
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            downloader = AttachmentDownloader(FakeClient(), http, stall_timeout=0.2)
+            return await downloader.download_all(challenge, tmp_path / "files")
+
+    _, files = asyncio.run(run())
+
+    assert requests == [None, f"bytes={half}-"]
+    assert (tmp_path / "files" / "slow.bin").read_bytes() == PAYLOAD
+    assert files[0].sha256 == hashlib.sha256(PAYLOAD).hexdigest()
+
+
+def test_deferred_stub_records_the_announced_hash_and_fetch_marks_it_done(tmp_path):
+    digest = hashlib.sha256(PAYLOAD).digest()
+
+    def handler(request):
+        headers = {
+            "Content-Length": str(len(PAYLOAD)),
+            "Repr-Digest": f"sha-256=:{base64.b64encode(digest).decode()}:",
+        }
+        return httpx.Response(200, content=PAYLOAD, headers=headers)
+
+    challenge = Challenge(
+        id="1",
+        name="chal",
+        attachments=AttachmentCollection(
+            attachments=[Attachment(name="disk.img", download_info=DownloadInfo(url="/disk.img"))]
+        ),
+    )
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            downloader = AttachmentDownloader(
+                FakeClient(), http, budget=AttachmentBudget(max_size=1024, category_budgets={})
+            )
+            return await downloader.download_all(challenge, tmp_path / "files")
+
+    asyncio.run(run())
+
+    stub = read_stub(tmp_path / "files" / "disk.img.deferred")
+    assert (stub["size_bytes"], stub["sha256"]) == (len(PAYLOAD), digest.hex())
+    assert stub["platform_url"] == "https://ctf.example.com"
+
+    (tmp_path / "README.md").write_text(
+        "## Attachments\n\n- disk.img _(deferred, download with `ctf-dl fetch`)_\n"
+    )
+    (tmp_path / "challenge.json").write_text(
+        json.dumps({"id": "1", "attachments": [{"name": "disk.img", "deferred": True}]})
+    )
+    fetched = AttachmentFile(
+        name="disk.img", path="files/disk.img", size_bytes=len(PAYLOAD), sha256=digest.hex()
+    )
+    mark_fetched(tmp_path, fetched)
+
+    assert "- [disk.img](files/disk.img)" in (tmp_path / "README.md").read_text()
+    [attachment] = json.loads((tmp_path / "challenge.json").read_text())["attachments"]
+    assert attachment == {"name": "disk.img", "size_bytes": len(PAYLOAD), "sha256": digest.hex()}
+
+
+def test_updates_hash_existing_files_only_when_they_changed(tmp_path, mocker):
+    def handler(request):
+        return httpx.Response(200, content=PAYLOAD)
+
+    challenge = Challenge(
+        id="1",
+        name="chal",
+        attachments=AttachmentCollection(
+            attachments=[
+                Attachment(name="chal.bin", download_info=DownloadInfo(url="/files/chal.bin"))
+            ]
+        ),
+    )
+    digests = DigestCache(tmp_path / ".ctfdl" / "digests.sqlite")
+    hashed = mocker.spy(attachments, "hash_file")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            downloader = AttachmentDownloader(FakeClient(), http, digests=digests)
+            return await downloader.download_all(challenge, tmp_path / "files")
+
+    asyncio.run(run())
+    _, files = asyncio.run(run())
+    assert files[0].unchanged
+    assert hashed.call_count == 0
+
+    # A file edited since it was recorded is read back again
+    path = tmp_path / "files" / "chal.bin"
+    path.write_bytes(PAYLOAD[::-1])
+    _, files = asyncio.run(run())
+    assert not files[0].unchanged
+    assert hashed.call_count == 1
+    assert path.read_bytes() == PAYLOAD
+    digests.close()
+
+
+def test_fetch_logs_in_again_for_files_on_the_platform(tmp_path, mocker):
+    seen = {}
+
+    def handler(request):
+        seen[request.url.host] = (
+            request.headers.get("Authorization"),
+            request.headers.get("Cookie"),
+        )
+        return httpx.Response(200, content=PAYLOAD)
+
+    async def log_in(url, username=None, password=None, token=None, http=None):
+        assert url == "https://ctf.example.com"
+        http.headers["Authorization"] = f"Token {token}"
+        http.cookies.set("session", "s3cr3t", domain="ctf.example.com")
+
+    mocker.patch(
+        "ctfdl.common.transport.build_transport", lambda *a, **k: httpx.MockTransport(handler)
+    )
+    mocker.patch("ctfdl.challenges.fetch.make_platform_client", lambda *a: httpx.AsyncClient())
+    mocker.patch("ctfdl.challenges.fetch.get_authenticated_client", log_in)
+    for name, url in [
+        ("disk.img", "https://ctf.example.com/files/disk.img"),
+        ("vm.ova", "https://cdn.example/vm.ova"),
+    ]:
+        write_stub(
+            tmp_path / "files" / name,
+            Attachment(name=name),
+            url,
+            "too big",
+            platform_url="https://ctf.example.com",
+        )
+
+    assert asyncio.run(fetch_deferred([str(tmp_path)], token="abc"))
+
+    assert seen == {"ctf.example.com": ("Token abc", "session=s3cr3t"), "cdn.example": (None, None)}
+    assert (tmp_path / "files" / "vm.ova").read_bytes() == PAYLOAD
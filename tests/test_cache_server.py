@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from ctfdl.common.cache_server import STATUS_HEADER, CacheServer, PullThroughCache
+from ctfdl.common.transport import ViaTransport
+
+BODY = bytes(range(256)) * 64
+
+
+def start_cache(tmp_path, calls):
+    def upstream(request):
+        calls.append(request.url.path)
+        time.sleep(0.2)
+        chunks = [BODY[i : i + 4096] for i in range(0, len(BODY), 4096)]
+        return httpx.Response(200, content=iter(chunks), headers={"ETag": '"v1"'})
+
+    client = httpx.Client(transport=httpx.MockTransport(upstream))
+    server = CacheServer(("127.0.0.1", 0), PullThroughCache(tmp_path, client), "secret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def via_client(via, key="secret"):
+    return httpx.AsyncClient(transport=ViaTransport(httpx.AsyncHTTPTransport(), via, key, "file"))
+
+
+def test_teammates_share_one_upstream_download(tmp_path):
+    calls = []
+    server, via = start_cache(tmp_path, calls)
+    url = "https://files.ctf.example/chall.zip"
+
+    async def run():
+        async with via_client(via) as http:
+            first, second = await asyncio.gather(http.get(url), http.get(url))
+            later = await http.get(url, headers={"Range": "bytes=100-199", "If-Range": '"v1"'})
+            async with via_client(via, key="wrong") as stranger:
+                refused = await stranger.get(url)
+        return first, second, later, refused
+
+    try:
+        first, second, later, refused = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    assert calls == ["/chall.zip"]
+    assert first.content == second.content == BODY
+    assert later.status_code == 206
+    assert later.content == BODY[100:200]
+    assert later.headers[STATUS_HEADER] == "HIT"
+    assert refused.status_code == 401
+
+
+def test_tokens_cookies_and_pages_are_not_shared(tmp_path):
+    calls = []
+
+    def upstream(request):
+        calls.append(str(request.url))
+        if request.url.path == "/login":
+            return httpx.Response(200, content=iter([b"nonce"]), headers={"Set-Cookie": "s=new"})
+        if request.url.path.startswith("/api/"):
+            user = request.headers.get("Cookie", "").encode()
+            return httpx.Response(200, content=iter([user]))
+        return httpx.Response(200, content=iter([BODY]))
+
+    client = httpx.Client(transport=httpx.MockTransport(upstream))
+    server = CacheServer(("127.0.0.1", 0), PullThroughCache(tmp_path, client), "secret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    via = f"http://127.0.0.1:{server.server_address[1]}"
+
+    async def run():
+        transport = ViaTransport(httpx.AsyncHTTPTransport(), via, "secret", "api")
+        async with via_client(via) as files, httpx.AsyncClient(transport=transport) as api:
+            await files.get("https://ctf.example/files/a.zip?token=alice")
+            shared = await files.get("https://ctf.example/files/a.zip?token=bob")
+            login = await api.get("https://ctf.example/login")
+            alice = await api.get("https://ctf.example/api/v1/me", headers={"Cookie": "s=a"})
+            bob = await api.get("https://ctf.example/api/v1/me", headers={"Cookie": "s=b"})
+        return shared, login, alice, bob
+
+    try:
+        shared, login, alice, bob = asyncio.run(run())
+    finally:
+        server.shutdown()
+
+    assert shared.headers[STATUS_HEADER] in ("HIT", "SHARED")
+    assert shared.content == BODY
+    assert login.headers[STATUS_HEADER] == "BYPASS"
+    assert login.headers["Set-Cookie"] == "s=new"
+    assert (alice.text, bob.text) == ("s=a", "s=b")
+    assert sum("/files/" in url for url in calls) == 1
@@ -0,0 +1,76 @@
+import asyncio
+import hashlib
+import json
+
+import httpx
+
+from ctfdl.common.cassette import INDEX_FILE, RecordingTransport, ReplayTransport
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.method == "POST":
+        return httpx.Response(
+            200,
+            json={"login": request.content.decode()},
+            headers={"Set-Cookie": "session=s3cr3t; Path=/"},
+        )
+    return httpx.Response(200, content=f"page {request.url.params['page']}".encode())
+
+
+def test_record_then_replay(tmp_path):
+    async def record():
+        transport = RecordingTransport(httpx.MockTransport(handler), tmp_path)
+        async with httpx.AsyncClient(
+            transport=transport, headers={"Authorization": "Token t"}
+        ) as c:
+            login = await c.post("https://ctf.example/login", content=b"user")
+            pages = [(await c.get(f"https://ctf.example/api?page={i}")).text for i in (1, 2)]
+            file = await c.get("https://ctf.example/files?page=f&token=hunter2")
+        return login.json(), pages + [file.text]
+
+    async def replay():
+        async with httpx.AsyncClient(transport=ReplayTransport(tmp_path, scale=0)) as c:
+            login = await c.post("https://ctf.example/login", content=b"user")
+            pages = [(await c.get(f"https://ctf.example/api?page={i}")).text for i in (2, 1)]
+            # Another user's token still finds the recording
+            pages.append((await c.get("https://ctf.example/files?page=f&token=other")).text)
+            try:
+                await c.get("https://ctf.example/api?page=3")
+            except httpx.ConnectError as e:
+                missing = str(e)
+        return login.json(), pages, login.cookies.get("session"), missing
+
+    recorded_login, recorded_pages = asyncio.run(record())
+    login, pages, cookie, missing = asyncio.run(replay())
+
+    assert login == recorded_login == {"login": "user"}
+    assert recorded_pages == ["page 1", "page 2", "page f"]
+    assert pages == ["page 2", "page 1", "page f"]
+    assert cookie == "<redacted>"
+    assert "page=3" in missing
+
+    text = (tmp_path / INDEX_FILE).read_text()
+    assert "s3cr3t" not in text
+    assert "Token t" not in text
+    assert "hunter2" not in text
+    assert all("ttfb" in json.loads(line) for line in text.splitlines())
+
+
+def test_login_credentials_are_redacted_before_hashing(tmp_path):
+    form = {"name": "alice", "password": "hunter2", "nonce": "abc"}
+
+    async def login(transport, password):
+        async with httpx.AsyncClient(transport=transport) as c:
+            response = await c.post(
+                "https://ctf.example/login", data={**form, "password": password}
+            )
+            json_login = await c.post("https://ctf.example/api/login", json={"teamToken": password})
+            return response.status_code, json_login.status_code
+
+    asyncio.run(login(RecordingTransport(httpx.MockTransport(handler), tmp_path), "hunter2"))
+
+    keys = [json.loads(line)["key"] for line in (tmp_path / INDEX_FILE).read_text().splitlines()]
+    raw = hashlib.sha256(b"name=alice&password=hunter2&nonce=abc").hexdigest()
+    assert not any(key.endswith(raw) for key in keys)
+    # Another password still finds the recording, so the hash says nothing about it
+    assert asyncio.run(login(ReplayTransport(tmp_path, scale=0), "other")) == (200, 200)
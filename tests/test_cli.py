@@ -1,5 +1,7 @@
+import pytest
 from typer.testing import CliRunner
 
+from ctfdl.cli.helpers import resolve_output_variants, split_values
 from ctfdl.cli.main import app
 
 runner = CliRunner()
@@ -9,3 +11,18 @@ def test_help_command_runs():
     result = runner.invoke(app, ["--help"])
     assert result.exit_code == 0
     assert "Usage:" in result.output
+
+
+def test_output_variants_from_lists():
+    assert resolve_output_variants(split_values(["markdown,json"]), [], []) == [
+        ("markdown", "default", "grouped", "default"),
+        ("json", "json", "json", "flat"),
+    ]
+    assert resolve_output_variants([], ["default", "minimal"], ["grouped"]) == [
+        ("default", "default", "grouped", None),
+        ("minimal", "minimal", "grouped", None),
+    ]
+    with pytest.raises(ValueError):
+        resolve_output_variants([], ["a", "b", "c"], ["x", "y"])
+    with pytest.raises(ValueError):
+        resolve_output_variants(["json", "JSON"], [], [])
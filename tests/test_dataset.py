@@ -0,0 +1,64 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge, DownloadInfo
+
+from ctfdl.core.events import EventEmitter
+from ctfdl.core.models import AttachmentFile, ChallengeEntry
+from ctfdl.rendering.dataset import DatasetHandler, dataset_format
+
+
+def entry(cid: int) -> ChallengeEntry:
+    chal = Challenge(
+        id=str(cid),
+        name=f"chal {cid}",
+        categories=["web"],
+        value=100,
+        attachments=AttachmentCollection(
+            attachments=[
+                Attachment(name="a.zip", download_info=DownloadInfo(url="https://f/a.zip")),
+                Attachment(name="b.txt", download_info=DownloadInfo(url="https://f/b.txt")),
+            ]
+        ),
+    )
+    files = [AttachmentFile(name="a.zip", path="files/a.zip", size_bytes=3, sha256="ab")]
+    return ChallengeEntry(data=chal, path=f"web/chal-{cid}", files=files)
+
+
+def test_challenges_stream_into_ndjson_and_sqlite(tmp_path):
+    ndjson, db = tmp_path / "all.ndjson", tmp_path / "all.sqlite"
+
+    async def export(ids):
+        emitter = EventEmitter()
+        DatasetHandler(emitter, [ndjson, db], "https://ctf.example", batch_size=2)
+        for cid in ids:
+            await emitter.emit("challenge_exported", entry=entry(cid))
+        await emitter.emit("download_complete")
+
+    asyncio.run(export([1, 2, 3]))
+    asyncio.run(export([2]))
+
+    # A rerun replaces the record of a challenge it exports again and keeps the others
+    records = [json.loads(line) for line in ndjson.read_text().splitlines()]
+    assert [r["challenge"]["id"] for r in records] == ["1", "3", "2"]
+    assert records[0]["ctf"] == "ctf.example"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["all.ndjson", "all.sqlite"]
+
+    con = sqlite3.connect(db)
+    assert con.execute("SELECT count(*) FROM challenges").fetchone() == (3,)
+    rows = con.execute(
+        "SELECT name, path, url, sha256 FROM attachments WHERE challenge_id = '2' ORDER BY name"
+    ).fetchall()
+    assert rows == [
+        ("a.zip", "web/chal-2/files/a.zip", "https://f/a.zip", "ab"),
+        ("b.txt", None, "https://f/b.txt", None),
+    ]
+
+
+def test_dataset_format_comes_from_the_suffix(tmp_path):
+    assert dataset_format(tmp_path / "x.jsonl") == "ndjson"
+    assert dataset_format(tmp_path / "x.db") == "sqlite"
+    with pytest.raises(ValueError, match="Unknown dataset format"):
+        dataset_format(tmp_path / "x.csv")
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+
+from ctfdl.common.deadline import DeadlineExceededError, hedged, with_deadline
+
+
+def test_hedged_request_takes_the_first_answer():
+    calls = []
+
+    async def request():
+        calls.append(len(calls))
+        # The first attempt is the straggler
+        await asyncio.sleep(10 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    assert asyncio.run(hedged(request, 0.05)) == 2
+    assert calls == [0, 1]
+
+
+def test_deadline_cancels_slow_work():
+    with pytest.raises(DeadlineExceededError, match="detail request took longer than 0.05s"):
+        asyncio.run(with_deadline(asyncio.sleep(10), 0.05, "detail request"))
@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge, DownloadInfo
+
+from ctfdl.challenges.client import FetchPlan
+from ctfdl.challenges.dry_run import plan_export
+from ctfdl.core.config import ExportConfig
+
+SIZES = {"/big.bin": 3_000_000, "/small.txt": 10}
+
+
+def chal(cid: str, category: str, *files: str) -> Challenge:
+    attachments = [
+        Attachment(name=name, download_info=DownloadInfo(url=f"https://files.example/{name}"))
+        for name in files
+    ]
+    return Challenge(
+        id=cid,
+        name=f"chal {cid}",
+        categories=[category],
+        attachments=AttachmentCollection(attachments=attachments),
+    )
+
+
+def test_plan_counts_sizes_and_estimates_without_writing(tmp_path):
+    def files(request):
+        size = SIZES[request.url.path]
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={"Content-Length": str(size)})
+        return httpx.Response(200, content=b"x" * min(size, 1024 * 1024))
+
+    client = SimpleNamespace(challenges=SimpleNamespace(base_has_details=True))
+    output = tmp_path / "ctf"
+    config = ExportConfig(url="https://ctf.example", output=output, parallel=4)
+    work = [
+        (chal("1", "web", "big.bin"), "web/chal-1", False),
+        (chal("2", "web", "small.txt"), "web/chal-2", True),
+        (chal("3", "pwn"), "pwn/chal-3", False),
+    ]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(files)) as http:
+            return await plan_export(
+                client, config, FetchPlan(), work, [chal("4", "pwn"), chal("5", "misc")], http
+            )
+
+    plan = asyncio.run(run())
+
+    counts = {name: (c.new, c.update, c.skip) for name, c in plan.categories.items()}
+    assert counts == {"web": (1, 1, 0), "pwn": (1, 0, 1), "misc": (0, 0, 1)}
+    assert plan.attachment_bytes == 3_000_010
+    assert [f.name for f in plan.largest] == ["big.bin", "small.txt"]
+    assert plan.fits
+    assert plan.throughput and plan.estimated_seconds is not None
+    assert not output.exists()
@@ -0,0 +1,50 @@
+import io
+import tarfile
+import zipfile
+
+from ctfdl.challenges.extractor import ExtractLimits, extract_archive, extraction_dir
+
+
+def make_zip(path, members: dict[str, bytes]):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+
+
+def test_extracts_into_sibling_directory_and_skips_unchanged(tmp_path):
+    archive = tmp_path / "handout.zip"
+    make_zip(archive, {"chal/main.c": b"int main() {}", "README": b"hi"})
+    dest = extraction_dir(archive)
+
+    result = extract_archive(archive, dest, "abc", ExtractLimits())
+    assert result.status == "extracted"
+    assert dest == tmp_path / "handout"
+    assert (dest / "chal" / "main.c").read_bytes() == b"int main() {}"
+
+    assert extraction_dir(archive) == dest
+    assert extract_archive(archive, dest, "abc", ExtractLimits()).status == "skipped"
+
+
+def test_rejects_path_traversal(tmp_path):
+    archive = tmp_path / "evil.tar.gz"
+    with tarfile.open(archive, "w:gz") as tf:
+        info = tarfile.TarInfo("../../escape.txt")
+        info.size = 4
+        tf.addfile(info, io.BytesIO(b"boom"))
+
+    result = extract_archive(archive, extraction_dir(archive), None, ExtractLimits())
+
+    assert result.status == "rejected"
+    assert "traversal" in result.reason
+    assert not (tmp_path.parent / "escape.txt").exists()
+    assert not (tmp_path / "evil").exists()
+
+
+def test_rejects_zip_bombs(tmp_path):
+    archive = tmp_path / "bomb.zip"
+    make_zip(archive, {"zeros": b"\0" * 5_000_000})
+
+    result = extract_archive(archive, extraction_dir(archive), None, ExtractLimits(max_ratio=50))
+
+    assert result.status == "rejected"
+    assert "ratio" in result.reason
@@ -0,0 +1,25 @@
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.challenges.filters import ChallengeFilter
+from ctfdl.core.config import ExportConfig
+
+
+def make_filter(**kwargs) -> ChallengeFilter:
+    return ChallengeFilter(ExportConfig(url="https://ctf.example.com", **kwargs))
+
+
+def test_missing_values_only_rejected_when_strict():
+    chal = Challenge(id="1", name="baby-heap", categories=["pwn"], value=None, solved=None)
+    flt = make_filter(min_points=100, solved=True)
+
+    assert flt.matches(chal)
+    assert not flt.matches(chal, strict=True)
+
+
+def test_category_points_and_name_filters():
+    chal = Challenge(id="1", name="Tcache Party", categories=["pwn"], value=300)
+
+    assert make_filter(categories=["pwn"], name_pattern="tcache").matches(chal)
+    assert not make_filter(categories=["web"]).matches(chal)
+    assert not make_filter(max_points=200).matches(chal)
+    assert not make_filter(name_pattern="^heap").matches(chal)
@@ -0,0 +1,122 @@
+import asyncio
+import shutil
+import subprocess
+
+import httpx
+import pytest
+from ctfbridge.models.challenge import (
+    Attachment,
+    AttachmentCollection,
+    Challenge,
+    DownloadInfo,
+    DownloadType,
+)
+
+from ctfdl.challenges.attachments import AttachmentDownloader
+from ctfdl.rendering.git_sink import GitFastImportSink
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def git(repo, *args) -> str:
+    return subprocess.run(
+        ["git", "-C", str(repo), *args], capture_output=True, text=True, check=True
+    ).stdout
+
+
+def test_runs_become_commits_on_top_of_each_other(tmp_path):
+    repo, root = tmp_path / "repo", tmp_path / "export"
+
+    sink = GitFastImportSink(repo, root)
+    sink.write_text(root / "web" / "a" / "README.md", "# a\n")
+    (root / "web" / "a" / "files").mkdir(parents=True)
+    (root / "web" / "a" / "files" / "flag.txt").write_bytes(b"\x00flag")
+    sink.finish_folder(root / "web" / "a")
+    sink.commit("first")
+
+    assert not (root / "web" / "a").exists()
+    assert GitFastImportSink(repo, root).existing_dirs() >= {"web", "web/a"}
+
+    sink = GitFastImportSink(repo, root)
+    assert not sink.write_text(root / "web" / "a" / "README.md", "# a\n")
+    assert sink.write_text(root / "pwn" / "b" / "README.md", "# b\n")
+    sink.finish_folder(root / "pwn" / "b")
+    # A challenge that failed partway leaves nothing in the commit
+    sink.write_text(root / "pwn" / "c" / "README.md", "# c\n")
+    sink.discard_folder(root / "pwn" / "c")
+    sink.write_text(root / "index.md", "- a\n- b\n")
+    sink.commit("second")
+
+    assert git(repo, "log", "--format=%s", "ctf-dl").split() == ["second", "first"]
+    assert git(repo, "ls-tree", "-r", "--name-only", "ctf-dl").split() == [
+        "index.md",
+        "pwn/b/README.md",
+        "web/a/README.md",
+        "web/a/files/flag.txt",
+    ]
+
+
+def test_lfs_pointers(tmp_path):
+    repo, root = tmp_path / "repo", tmp_path / "export"
+    (root / "a" / "files").mkdir(parents=True)
+    (root / "a" / "files" / "big.bin").write_bytes(b"x" * 100)
+
+    sink = GitFastImportSink(repo, root, lfs=True)
+    sink.finish_folder(root / "a")
+    sink.commit("lfs")
+
+    pointer = git(repo, "show", "ctf-dl:a/files/big.bin")
+    assert pointer.startswith("version https://git-lfs.github.com/spec/v1\noid sha256:")
+    assert "size 100" in pointer
+    oid = pointer.split("sha256:")[1].split()[0]
+    assert (repo / ".git" / "lfs" / "objects" / oid[:2] / oid[2:4] / oid).read_bytes() == b"x" * 100
+    assert "filter=lfs" in git(repo, "show", "ctf-dl:.gitattributes")
+    # Without a recorded validator, the pointer still tells what the tip holds
+    stored = GitFastImportSink(repo, root, lfs=True).stored(root / "a" / "files" / "big.bin")
+    assert (stored.size, stored.sha256) == (100, oid)
+
+
+def test_updates_skip_attachments_the_tip_already_holds(tmp_path):
+    repo, root = tmp_path / "repo", tmp_path / "export"
+    bodies = []
+
+    def origin(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        bodies.append(request.url.path)
+        return httpx.Response(200, content=b"flag{git}", headers={"ETag": '"v1"'})
+
+    challenge = Challenge(
+        id="1",
+        name="a",
+        attachments=AttachmentCollection(
+            attachments=[
+                Attachment(
+                    name="flag.txt",
+                    download_info=DownloadInfo(
+                        type=DownloadType.HTTP, url="https://ctf.local/flag.txt"
+                    ),
+                )
+            ]
+        ),
+    )
+
+    def export(message):
+        sink = GitFastImportSink(repo, root)
+
+        async def download():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(origin)) as http:
+                downloader = AttachmentDownloader(None, http, sink=sink)
+                return await downloader.download_all(challenge, root / "web" / "a" / "files")
+
+        _, [file] = asyncio.run(download())
+        sink.finish_folder(root / "web" / "a")
+        sink.commit(message)
+        return file
+
+    first = export("first")
+    again = export("second")
+
+    assert bodies == ["/flag.txt"]
+    assert again.unchanged and again.sha256 == first.sha256
+    assert git(repo, "show", "ctf-dl:web/a/files/flag.txt") == "flag{git}"
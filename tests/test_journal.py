@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge
+
+import ctfdl
+from ctfdl.challenges.journal import RunJournal, journal_path
+from ctfdl.challenges.planner import commit_staged, unstage_paths
+from ctfdl.core.models import ChallengeEntry
+
+
+def test_interrupted_run_keeps_only_unfinished_work(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = RunJournal(path)
+    chals = [Challenge(id=str(i), name=f"chal {i}", categories=["web"]) for i in range(3)]
+    journal.begin("https://ctf.example", [(c, f"web/chal-{c.id}", c.id == "2") for c in chals])
+    journal.on_challenge_exported(ChallengeEntry(data=chals[0], path="web/chal-0"))
+    journal.close()
+    # A crash mid-write leaves a partial last line
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"type": "done", "id": "1", "ent')
+
+    run = RunJournal(path).interrupted("https://ctf.example")
+
+    assert sorted(run.pending) == ["1", "2"]
+    assert run.pending["2"].existed_before
+    assert [e.path.as_posix() for e in run.entries] == ["web/chal-0"]
+    assert RunJournal(path).interrupted("https://other.example") is None
+
+    journal.end()
+    assert RunJournal(path).interrupted("https://ctf.example") is None
+
+
+def test_staged_folder_replaces_leftover(tmp_path):
+    staged = tmp_path / ".ctfdl/staging/abc"
+    staged.mkdir(parents=True)
+    (staged / "README.md").write_text("new")
+    folder = tmp_path / "web/chal"
+    folder.mkdir(parents=True)
+    (folder / "stale.txt").write_text("old")
+
+    commit_staged(staged, folder)
+
+    assert [p.name for p in folder.iterdir()] == ["README.md"]
+    assert not staged.exists()
+
+    # Paths recorded while building point at the final folder, not the staging one
+    chal = Challenge(
+        id="1",
+        name="chal",
+        attachments=AttachmentCollection(
+            attachments=[Attachment(name="a", local_path=str(staged / "files" / "a"))]
+        ),
+    )
+    [att] = unstage_paths(chal, staged, folder).attachments
+    assert att.local_path == str(folder / "files" / "a")
+
+
+def test_resume_also_plans_challenges_outside_the_journal(tmp_path, mocker):
+    chals = [Challenge(id=str(i), name=f"chal {i}", categories=["web"]) for i in range(3)]
+
+    class Challenges:
+        base_has_details = True
+
+        async def iter_all(self, **kwargs):
+            for chal in chals:
+                yield chal
+
+    async def client_for(*args, **kwargs):
+        return SimpleNamespace(challenges=Challenges())
+
+    mocker.patch("ctfdl.challenges.downloader.get_authenticated_client", client_for)
+    config = ctfdl.ExportConfig(url="https://ctf.example", output=tmp_path, prettify_cache_size=0)
+
+    # The interrupted run only knew challenges 0 and 1, and finished 0
+    journal = RunJournal(journal_path(config))
+    journal.begin(config.url, [(c, f"web/chal-{c.id}", False) for c in chals[:2]])
+    journal.on_challenge_exported(ChallengeEntry(data=chals[0], path="web/chal-0"))
+    journal.close()
+
+    async def consume():
+        return [entry async for entry in ctfdl.stream(config)]
+
+    exported = asyncio.run(consume())
+
+    # Challenge 2 is new to the journal and still exported; 0 is not exported again
+    assert sorted(e.data.id for e in exported[:2]) == ["1", "2"]
+    assert [e.data.id for e in exported[2:]] == ["0"]
+    assert not (tmp_path / "web/chal-0").exists()
+    assert not journal_path(config).exists()
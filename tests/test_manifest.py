@@ -0,0 +1,52 @@
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.challenges.manifest import FolderManifest
+from ctfdl.challenges.planner import PathPlan
+
+
+def chal(cid: str, name: str) -> Challenge:
+    return Challenge(id=cid, name=name, categories=["web"])
+
+
+def nested(challenges: list[Challenge]) -> list[str]:
+    return [f"web/{c.name}" for c in challenges]
+
+
+def flat(challenges: list[Challenge]) -> list[str]:
+    return [c.name for c in challenges]
+
+
+def test_relayout_moves_folders_and_reports_orphans(tmp_path):
+    path = tmp_path / ".ctfdl" / "manifest.json"
+    challenges = [chal("1", "a"), chal("2", "b"), chal("3", "gone")]
+    for folder in ("web/a/files", "web/b", "web/gone"):
+        (tmp_path / folder).mkdir(parents=True)
+    (tmp_path / "web/a/files/a.bin").write_bytes(b"a")
+
+    # Folders from before there was a manifest are adopted
+    manifest = FolderManifest(path, "https://ctf")
+    manifest.relocate(
+        PathPlan.build(tmp_path, challenges, nested), challenges, challenges, [tmp_path]
+    )
+    assert FolderManifest(path, "https://ctf").folders == {
+        "1": "web/a",
+        "2": "web/b",
+        "3": "web/gone",
+    }
+
+    listed = challenges[:2]
+    plan = PathPlan.build(tmp_path, listed, flat)
+    relocation = FolderManifest(path, "https://ctf").relocate(plan, listed, listed, [tmp_path])
+
+    assert relocation.moved == {"web/a": "a", "web/b": "b"}
+    assert relocation.orphans == ["web/gone"]
+    assert (tmp_path / "a/files/a.bin").read_bytes() == b"a"
+    assert all(plan.exists(c) for c in listed)
+
+    plan = PathPlan.build(tmp_path, listed, flat)
+    relocation = FolderManifest(path, "https://ctf").relocate(
+        plan, listed, listed, [tmp_path], prune=True
+    )
+    assert relocation.orphans == ["web/gone"]
+    assert not (tmp_path / "web").exists()
+    assert FolderManifest(path, "https://ctf").folders == {"1": "a", "2": "b"}
@@ -0,0 +1,53 @@
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.challenges.planner import PathPlan, link_tree
+from ctfdl.rendering.engine import cached_slugify
+
+
+def chal(cid: str, name: str) -> Challenge:
+    return Challenge(id=cid, name=name, categories=["web"])
+
+
+def render(challenges: list[Challenge]) -> list[str]:
+    return [f"web/{cached_slugify(c.name)}" for c in challenges]
+
+
+def test_collisions_are_suffixed_by_id_independent_of_order(tmp_path):
+    challenges = [chal("12", "Login!"), chal("3", "login"), chal("7", "LOGIN"), chal("5", "x")]
+
+    for listing in (challenges, challenges[::-1]):
+        plan = PathPlan.build(tmp_path, listing, render)
+        assert plan.paths == {
+            "3": "web/login",
+            "7": "web/login-7",
+            "12": "web/login-12",
+            "5": "web/x",
+        }
+
+
+def test_existing_folders_and_batch_create(tmp_path):
+    (tmp_path / "web" / "x").mkdir(parents=True)
+    challenges = [chal("1", "x"), chal("2", "y")]
+
+    plan = PathPlan.build(tmp_path, challenges, render)
+    assert [plan.exists(c) for c in challenges] == [True, False]
+
+    plan.create(challenges)
+    assert (tmp_path / "web" / "y").is_dir()
+
+    plan.discard(challenges[1])
+    plan.discard(challenges[0])
+    assert not (tmp_path / "web" / "y").exists()
+    assert (tmp_path / "web" / "x").is_dir()
+
+
+def test_link_tree_shares_files_and_skips_linked_ones(tmp_path):
+    source = tmp_path / "markdown" / "files"
+    (source / "inner").mkdir(parents=True)
+    (source / "a.txt").write_text("a")
+    (source / "inner" / "b.txt").write_text("b")
+    target = tmp_path / "json" / "files"
+
+    assert link_tree(source, target) == 2
+    assert (target / "inner" / "b.txt").samefile(source / "inner" / "b.txt")
+    assert link_tree(source, target) == 0
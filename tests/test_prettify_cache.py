@@ -0,0 +1,38 @@
+from ctfdl.common.format_output import FORMATTER_IDS, format_output
+from ctfdl.common.prettify_cache import PrettifyCache
+
+MARKDOWN = "# Title\n\n|a|b|\n|-|-|\n|1|2|\n"
+
+
+def test_formatting_is_reused_across_runs(tmp_path, mocker):
+    path = tmp_path / "prettify.sqlite"
+    expected = format_output(MARKDOWN, "README.md", prettify=True)
+
+    cache = PrettifyCache(path)
+    assert format_output(MARKDOWN, "README.md", prettify=True, cache=cache) == expected
+    cache.close()
+
+    mdformat_text = mocker.patch("ctfdl.common.format_output.mdformat.text")
+    cache = PrettifyCache(path)
+    assert format_output(MARKDOWN, "README.md", prettify=True, cache=cache) == expected
+    assert (cache.hits, cache.misses) == (1, 0)
+    mdformat_text.assert_not_called()
+    # Only the formatter version and extensions together with the text make the key
+    assert PrettifyCache.key(FORMATTER_IDS[".md"], MARKDOWN) != PrettifyCache.key(
+        "mdformat-0.0.0+tables-0.0.0", MARKDOWN
+    )
+
+
+def test_least_recently_used_outputs_are_evicted(tmp_path):
+    cache = PrettifyCache(tmp_path / "prettify.sqlite", max_bytes=250)
+    upper = str.upper
+
+    for text in ("a" * 100, "b" * 100):
+        cache.get_or_format("upper", text, upper)
+    cache.get_or_format("upper", "a" * 100, upper)  # a is now used more recently than b
+    cache.get_or_format("upper", "c" * 100, upper)
+
+    cache.hits = cache.misses = 0
+    for text in ("a" * 100, "c" * 100, "b" * 100):
+        cache.get_or_format("upper", text, upper)
+    assert (cache.hits, cache.misses) == (2, 1)
@@ -0,0 +1,61 @@
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.challenges.client import FetchPlan, fetch_challenge_details
+from ctfdl.core.config import ExportConfig
+from ctfdl.rendering.engine import TemplateEngine
+
+BUILTIN = Path(__file__).parent.parent / "ctfdl" / "resources" / "templates"
+
+
+def engine_with(tmp_path: Path, component: str) -> TemplateEngine:
+    (tmp_path / "challenge/variants").mkdir(parents=True)
+    (tmp_path / "challenge/_components").mkdir(parents=True)
+    (tmp_path / "challenge/variants/slim.yaml").write_text(
+        "name: slim\ncomponents:\n  - file: README.md\n    template: slim.jinja\n"
+    )
+    (tmp_path / "challenge/_components/slim.jinja").write_text(component)
+    return TemplateEngine(tmp_path, BUILTIN)
+
+
+def test_listing_fields_only_skip_the_detail_request(tmp_path):
+    engine = engine_with(tmp_path, "# {{ challenge.name }} ({{ challenge['value'] }})")
+    config = ExportConfig(
+        url="https://ctf.example",
+        variant_name="slim",
+        folder_template_name="flat",
+        no_attachments=True,
+        search_index=False,
+    )
+
+    assert engine.referenced_fields("slim", "flat", "grouped") == {"name", "value", "category"}
+    assert FetchPlan.for_export(config, engine) == FetchPlan(details=False, enrich=False)
+    # Downloading attachments needs them from the details
+    config.no_attachments = False
+    assert FetchPlan.for_export(config, engine) == FetchPlan(details=True, enrich=True)
+
+
+def test_whole_challenge_use_needs_everything(tmp_path):
+    engine = engine_with(tmp_path, "{% set c = challenge %}{{ c.name }}")
+
+    assert engine.referenced_fields("slim", "flat") is None
+    assert TemplateEngine(None, BUILTIN).referenced_fields("default", "flat", "json") is None
+    assert FetchPlan.for_fields(None) == FetchPlan()
+
+
+def test_details_are_enriched_where_get_by_id_ignores_it():
+    class Challenges:
+        base_has_details = False
+
+        async def get_by_id(self, challenge_id, enrich=True):
+            # Like CTFd: details come from their own request and enrich is not applied
+            return Challenge(id=challenge_id, name="x", description="Author: alice")
+
+    client = SimpleNamespace(challenges=Challenges())
+    stub = Challenge(id="1", name="x")
+
+    assert asyncio.run(fetch_challenge_details(client, stub)).authors == ["alice"]
+    assert asyncio.run(fetch_challenge_details(client, stub, enrich=False)).authors == []
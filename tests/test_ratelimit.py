@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import httpx
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge, DownloadInfo
+
+from ctfdl.challenges.attachments import AttachmentDownloader
+from ctfdl.common.ratelimit import BandwidthLimiter, LimitedTransport
+from ctfdl.core.config import TransportProfile
+
+RATE = 1_000_000
+BODY = 300_000
+
+
+class FakeClient:
+    platform_url = "https://ctf.example.com"
+
+
+async def chunks():
+    for _ in range(BODY // 10_000):
+        yield b"x" * 10_000
+
+
+def serve(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, content=chunks())
+
+
+async def download(limiter: BandwidthLimiter, url: str, bulk: bool) -> float:
+    transport = LimitedTransport(httpx.MockTransport(serve), limiter, bulk=bulk)
+    start = time.monotonic()
+    async with httpx.AsyncClient(transport=transport) as http, http.stream("GET", url) as response:
+        assert len(await response.aread()) == BODY
+    return time.monotonic() - start
+
+
+def test_bulk_downloads_are_held_to_the_rate():
+    limiter = BandwidthLimiter(RATE)
+    elapsed = asyncio.run(download(limiter, "https://files.example/a", bulk=True))
+    assert elapsed >= 0.25
+
+
+def test_host_limits_only_apply_to_their_host():
+    limiter = BandwidthLimiter(host_rates={"slow.example": RATE})
+
+    async def run():
+        return await asyncio.gather(
+            download(limiter, "https://slow.example/a", bulk=True),
+            download(limiter, "https://fast.example/a", bulk=True),
+        )
+
+    slow, fast = asyncio.run(run())
+    assert slow >= 0.25
+    assert fast < 0.1
+
+
+def test_metadata_is_counted_but_never_waits():
+    limiter = BandwidthLimiter(RATE)
+
+    async def run():
+        api = await download(limiter, "https://ctf.example/api", bulk=False)
+        # The metadata bytes were charged, so the next bulk transfer pays for them too
+        bulk = await download(limiter, "https://ctf.example/file", bulk=True)
+        return api, bulk
+
+    api, bulk = asyncio.run(run())
+    assert api < 0.1
+    assert bulk >= 0.5
+
+
+def test_limits_are_split_between_workers():
+    profile = TransportProfile(max_bandwidth=4_000_000, host_bandwidth={"Files.Example": 2_000_000})
+    limiter = BandwidthLimiter.from_profile(profile, share=4)
+    assert limiter.total.rate == 1_000_000
+    assert limiter.hosts["files.example"].rate == 500_000
+    assert BandwidthLimiter.from_profile(TransportProfile()) is None
+
+
+def test_waits_overlap_across_buckets_and_rates_can_change():
+    limiter = BandwidthLimiter(RATE, host_rates={"files.example": RATE})
+
+    async def run():
+        start = time.monotonic()
+        await limiter.throttle("files.example", BODY)
+        return time.monotonic() - start
+
+    # Both buckets owe 0.3 s, which is slept once rather than twice
+    assert 0.25 <= asyncio.run(run()) < 0.5
+
+    limiter.set_rate(None)
+    limiter.set_rate(10 * RATE, host="Files.Example")
+    limiter.set_rate(RATE, host="slow.example")
+    assert limiter.total is None
+    assert limiter.hosts["files.example"].rate == 10 * RATE
+    assert limiter.hosts["slow.example"].rate == RATE
+
+
+def test_throttling_is_not_taken_for_a_stall(tmp_path):
+    requests = []
+
+    async def large_chunks():
+        for _ in range(3):
+            yield b"x" * (BODY // 3)
+
+    def handler(request):
+        requests.append(request.headers.get("Range"))
+        return httpx.Response(200, content=large_chunks(), headers={"Content-Length": str(BODY)})
+
+    challenge = Challenge(
+        id="1",
+        name="chal",
+        attachments=AttachmentCollection(
+            attachments=[Attachment(name="a.bin", download_info=DownloadInfo(url="/a.bin"))]
+        ),
+    )
+
+    async def run():
+        # Two parallel downloads share 1 MB/s, so each waits far longer than the stall timeout
+        limiter = BandwidthLimiter(RATE)
+        transport = LimitedTransport(httpx.MockTransport(handler), limiter, bulk=True)
+        async with httpx.AsyncClient(transport=transport) as http:
+            downloader = AttachmentDownloader(FakeClient(), http, stall_timeout=0.05, restarts=0)
+            return await asyncio.gather(
+                downloader.download_all(challenge, tmp_path / "one"),
+                downloader.download_all(challenge, tmp_path / "two"),
+            )
+
+    asyncio.run(run())
+
+    assert requests == [None, None]
+    assert (tmp_path / "one" / "a.bin").stat().st_size == BODY
+    assert (tmp_path / "two" / "a.bin").stat().st_size == BODY
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge, DownloadInfo
+
+from ctfdl.challenges.downloader import ChallengeExporter
+from ctfdl.challenges.scheduler import ChallengeScheduler
+from ctfdl.core import EventEmitter, ExportConfig
+from ctfdl.rendering.engine import TemplateEngine
+
+
+def chal(cid: str, category: str, value: int = 0, size: int = 0) -> Challenge:
+    attachments = [Attachment(name="f", size_bytes=size)] if size else []
+    return Challenge(
+        id=cid,
+        name=cid,
+        categories=[category],
+        value=value,
+        attachments=AttachmentCollection(attachments=attachments),
+    )
+
+
+def order(scheduler: ChallengeScheduler, challenges: list[Challenge]) -> list[str]:
+    return scheduler.order([(c, c.id) for c in challenges])
+
+
+def test_size_policy_is_small_first_and_interleaves_ties():
+    challenges = [
+        chal("huge", "forensics", size=10**10),
+        chal("vm", "forensics", size=10**9),
+        chal("pwn-big", "pwn", size=10**6),
+        chal("pwn-small", "pwn", size=10),
+        chal("web", "web"),
+        chal("web-2", "web"),
+        chal("misc", "misc"),
+    ]
+
+    assert order(ChallengeScheduler("size"), challenges) == [
+        "web",
+        "misc",
+        "web-2",
+        "pwn-small",
+        "pwn-big",
+        "vm",
+        "huge",
+    ]
+
+
+def test_category_weights_and_priority():
+    challenges = [chal(f"web{i}", "web", value=i) for i in range(4)]
+    challenges += [chal(f"pwn{i}", "pwn", value=i) for i in range(2)]
+
+    weighted = ChallengeScheduler("unsolved", category_weights={"web": 2})
+    assert order(weighted, challenges) == ["web0", "pwn0", "web1", "web2", "pwn1", "web3"]
+    by_points = ChallengeScheduler("points", category_weights={"web": 2})
+    assert order(by_points, challenges) == ["web0", "pwn0", "web1", "pwn1", "web2", "web3"]
+
+    strict = ChallengeScheduler("category", category_priority=["pwn"])
+    assert order(strict, challenges)[:2] == ["pwn0", "pwn1"]
+    assert order(ChallengeScheduler(), challenges) == [c.id for c in challenges]
+
+
+def test_size_policy_orders_by_sizes_found_after_the_listing(tmp_path):
+    sizes = {"big": 10**9, "small": 10}
+
+    class Challenges:
+        base_has_details = False
+
+        async def get_by_id(self, challenge_id, enrich=True):
+            # Only the details list the attachments, and without sizes
+            url = f"https://files.local/{challenge_id}.bin"
+            return Challenge(
+                id=challenge_id,
+                name=challenge_id,
+                categories=["misc"],
+                attachments=AttachmentCollection(
+                    attachments=[Attachment(name="f", download_info=DownloadInfo(url=url))]
+                ),
+            )
+
+    def head(request: httpx.Request) -> httpx.Response:
+        name = request.url.path.strip("/").removesuffix(".bin")
+        return httpx.Response(200, headers={"Content-Length": str(sizes[name])})
+
+    async def run():
+        config = ExportConfig(url="https://ctf.example", output=tmp_path, schedule="size")
+        client = SimpleNamespace(challenges=Challenges(), platform_url="https://ctf.example")
+        exporter = ChallengeExporter(client, config, EventEmitter(), TemplateEngine(None))
+        await exporter.http.aclose()
+        exporter.http = httpx.AsyncClient(transport=httpx.MockTransport(head))
+        stubs = [Challenge(id=cid, name=cid, categories=["misc"]) for cid in ("big", "small")]
+        try:
+            return await exporter.fetch_sizes([(c, (c, c.id, False)) for c in stubs])
+        finally:
+            await exporter.aclose()
+
+    work = ChallengeScheduler("size").order(asyncio.run(run()))
+
+    assert [chal.id for chal, _, _ in work] == ["small", "big"]
+    assert work[1][0].attachments.attachments[0].size_bytes == 10**9
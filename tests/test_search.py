@@ -0,0 +1,75 @@
+import json
+
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge
+
+from ctfdl.core.models import ChallengeEntry
+from ctfdl.search.index import SearchIndex, record_source, reindex_tree
+
+
+def entry(cid: str, name: str, category: str, description: str = "", files=()) -> ChallengeEntry:
+    attachments = [Attachment(name=f) for f in files]
+    data = Challenge(
+        id=cid,
+        name=name,
+        categories=[category],
+        description=description,
+        attachments=AttachmentCollection(attachments=attachments),
+    )
+    return ChallengeEntry(data=data, path=f"{category}/{name}")
+
+
+def test_add_and_rank(tmp_path):
+    index = SearchIndex(tmp_path / "search.sqlite")
+    index.add(tmp_path, entry("1", "heap-notes", "pwn", "A note taking app", ["libc.so.6"]))
+    index.add(tmp_path, entry("2", "notes", "web", "Heap of XSS in a notes app"))
+    index.add(tmp_path, entry("3", "baby-rsa", "crypto", "Small exponent"))
+
+    # A name match outranks a description match
+    assert [h.name for h in index.search("heap")] == ["heap-notes", "notes"]
+    assert [h.name for h in index.search("libc")] == ["heap-notes"]
+    assert [h.name for h in index.search("note", category="web")] == ["notes"]
+
+    # Re-adding the same folder replaces the old row
+    index.add(tmp_path, entry("3", "baby-rsa", "crypto", "Wiener attack"))
+    assert index.search("exponent") == []
+    assert index.search("wiener")[0].path == tmp_path.resolve() / "crypto/baby-rsa"
+    index.close()
+
+
+def test_reindex_tree_from_sidecars(tmp_path):
+    folder = tmp_path / "out" / "rev" / "crackme"
+    folder.mkdir(parents=True)
+    (folder / "challenge.json").write_text(
+        json.dumps({"id": "9", "name": "crackme", "category": "rev", "tags": ["easy"]})
+    )
+    (tmp_path / "out" / "index.json").write_text(json.dumps({"challenges": []}))
+
+    index = SearchIndex(tmp_path / "search.sqlite")
+    assert reindex_tree(index, tmp_path / "out") == 1
+    [hit] = index.search("easy")
+    assert (hit.name, hit.category, hit.ctf) == ("crackme", "rev", "out")
+
+    # Once the export recorded its URL, reindexing uses the same label as live indexing
+    record_source(tmp_path / "out", "https://ctf.example/")
+    reindex_tree(index, tmp_path / "out")
+    assert index.search("easy")[0].ctf == "ctf.example"
+    index.close()
+
+
+def test_readding_uses_the_folder_index_and_upgrades_old_indexes(tmp_path):
+    path = tmp_path / "search.sqlite"
+    index = SearchIndex(path)
+    index.add(tmp_path, entry("1", "heap-notes", "pwn"))
+    # An index from before the folders table existed
+    index._db.execute("DROP TABLE folders")
+    index._db.commit()
+    index.close()
+
+    index = SearchIndex(path)
+    index.add(tmp_path, entry("1", "heap-notes", "pwn", "Use after free"))
+    assert [h.name for h in index.search("heap")] == ["heap-notes"]
+    plan = index._db.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM folders WHERE root = ? AND path = ?", ("a", "b")
+    ).fetchall()
+    assert "USING COVERING INDEX" in plan[0][-1] or "USING INDEX" in plan[0][-1]
+    index.close()
@@ -0,0 +1,38 @@
+from ctfbridge.models.challenge import Attachment, AttachmentCollection, Challenge
+
+from ctfdl.challenges.shard import read_spools, shard_of, write_spool
+from ctfdl.cli.helpers import parse_shard
+from ctfdl.core.models import ChallengeEntry
+
+
+def entry(cid: str) -> ChallengeEntry:
+    chal = Challenge(
+        id=cid,
+        name=f"chal {cid}",
+        categories=["web"],
+        attachments=AttachmentCollection(attachments=[Attachment(name="a.txt")]),
+    )
+    return ChallengeEntry(data=chal, path=f"web/chal-{cid}")
+
+
+def test_shards_partition_ids_stably():
+    challenges = [Challenge(id=str(i), name=str(i)) for i in range(200)]
+    shards = [shard_of(c, 4) for c in challenges]
+
+    assert set(shards) == {1, 2, 3, 4}
+    assert shards == [shard_of(c, 4) for c in challenges]
+    # Pinned so the partition never silently changes between releases
+    assert shards[:8] == [1, 2, 3, 4, 3, 4, 4, 3]
+    assert parse_shard("2/4") == (2, 4)
+
+
+def test_spools_merge_in_path_order(tmp_path):
+    write_spool(tmp_path, (2, 3), "https://ctf.example", [entry("2"), entry("1")])
+    write_spool(tmp_path, (1, 3), "https://ctf.example", [entry("3"), entry("1")])
+
+    merged = read_spools(tmp_path)
+
+    assert [e.path.as_posix() for e in merged.entries] == ["web/chal-1", "web/chal-2", "web/chal-3"]
+    assert merged.entries[0].data.attachments[0].name == "a.txt"
+    assert merged.missing == [3]
+    assert merged.url == "https://ctf.example"
@@ -0,0 +1,15 @@
+from ctfdl.rendering.sinks import FileSink
+
+
+def test_file_sink_skips_identical_writes(tmp_path):
+    sink = FileSink()
+    path = tmp_path / "web" / "chal" / "README.md"
+
+    assert sink.write_text(path, "# chal\n")
+    mtime = path.stat().st_mtime_ns
+
+    assert not sink.write_text(path, "# chal\n")
+    assert path.stat().st_mtime_ns == mtime
+
+    assert sink.write_text(path, "# chal v2\n")
+    assert path.read_text() == "# chal v2\n"
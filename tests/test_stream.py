@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from ctfbridge.exceptions import LoginError
+from ctfbridge.models.challenge import Challenge
+
+import ctfdl
+from ctfdl.challenges import downloader
+from ctfdl.rendering.sinks import OutputSink
+
+
+class Challenges:
+    base_has_details = True
+
+    def __init__(self, event: str):
+        self.event = event
+
+    async def iter_all(self, **kwargs):
+        for i in range(3):
+            yield Challenge(id=str(i), name=f"{self.event} {i}", categories=["web"])
+
+
+class MemorySink(OutputSink):
+    def __init__(self):
+        self.files = {}
+
+    def write_text(self, path, text):
+        self.files[path] = text
+        return True
+
+
+def test_exports_stream_side_by_side(tmp_path, mocker):
+    async def client_for(url, *args, **kwargs):
+        return SimpleNamespace(challenges=Challenges(url.removeprefix("https://")))
+
+    mocker.patch("ctfdl.challenges.downloader.get_authenticated_client", client_for)
+    sink = MemorySink()
+
+    async def collect(event, sink=None):
+        config = ctfdl.ExportConfig(
+            url=f"https://{event}", output=tmp_path / event, prettify_cache_size=0
+        )
+        return [entry async for entry in ctfdl.stream(config, sink=sink)]
+
+    async def both():
+        return await asyncio.gather(collect("alpha"), collect("beta", sink))
+
+    alpha, beta = asyncio.run(both())
+
+    assert sorted(e.data.name for e in alpha) == ["alpha 0", "alpha 1", "alpha 2"]
+    assert sorted(e.data.name for e in beta) == ["beta 0", "beta 1", "beta 2"]
+    assert (tmp_path / "alpha/README.md").is_file()
+    # The sink of one export is not shared with the other
+    assert tmp_path / "beta/README.md" in sink.files
+    assert not any(path.is_relative_to(tmp_path / "alpha") for path in sink.files)
+
+
+def test_failed_login_raises(tmp_path, mocker):
+    mocker.patch(
+        "ctfdl.challenges.downloader.get_authenticated_client", side_effect=LoginError("nope")
+    )
+    config = ctfdl.ExportConfig(url="https://ctf.example", output=tmp_path, prettify_cache_size=0)
+
+    async def consume():
+        return [entry async for entry in ctfdl.stream(config)]
+
+    with pytest.raises(ctfdl.ExportError, match="Authentication failed"):
+        asyncio.run(consume())
+
+
+def test_a_limiter_passed_in_governs_the_export(tmp_path, mocker):
+    async def client_for(url, *args, **kwargs):
+        return SimpleNamespace(challenges=Challenges("alpha"))
+
+    mocker.patch("ctfdl.challenges.downloader.get_authenticated_client", client_for)
+    platform = mocker.spy(downloader, "make_platform_client")
+    downloads = mocker.spy(downloader, "make_download_client")
+    limiter = ctfdl.BandwidthLimiter(1_000_000)
+    config = ctfdl.ExportConfig(url="https://alpha", output=tmp_path, prettify_cache_size=0)
+
+    async def consume(config):
+        return [entry async for entry in ctfdl.stream(config, limiter=limiter)]
+
+    assert len(asyncio.run(consume(config))) == 3
+    assert platform.call_args.args[1] is limiter
+    assert downloads.call_count
+    assert all(call.args[1] is limiter for call in downloads.call_args_list)
+
+    with pytest.raises(ValueError, match="limiter"):
+        asyncio.run(consume(config.model_copy(update={"workers": 2})))
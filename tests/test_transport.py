@@ -0,0 +1,46 @@
+import asyncio
+
+import httpcore
+
+from ctfdl.common.transport import CachingResolverBackend, build_transport
+from ctfdl.core.config import TransportProfile
+
+
+class RecordingBackend(httpcore.AsyncNetworkBackend):
+    def __init__(self, refuse: set[str]):
+        self.refuse = refuse
+        self.connected: list[str] = []
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        self.connected.append(host)
+        if host in self.refuse:
+            raise httpcore.ConnectError("refused")
+        return object()
+
+
+def test_lookups_are_cached_and_every_address_is_tried():
+    lookups = []
+    recorder = RecordingBackend(refuse={"10.0.0.1"})
+    backend = CachingResolverBackend(ttl=60, backend=recorder)
+
+    async def getaddrinfo(host, port, **kwargs):
+        lookups.append(host)
+        return [(0, 0, 0, "", ("10.0.0.1", port)), (0, 0, 0, "", ("10.0.0.2", port))]
+
+    async def run():
+        asyncio.get_running_loop().getaddrinfo = getaddrinfo
+        await backend.connect_tcp("ctf.example", 443)
+        await backend.connect_tcp("ctf.example", 443)
+        await backend.connect_tcp("10.0.0.2", 443)
+
+    asyncio.run(run())
+
+    assert lookups == ["ctf.example"]
+    assert recorder.connected == ["10.0.0.1", "10.0.0.2", "10.0.0.1", "10.0.0.2", "10.0.0.2"]
+
+
+def test_dns_cache_can_be_disabled():
+    cached = build_transport(TransportProfile())
+    plain = build_transport(TransportProfile(dns_cache_ttl=0))
+    assert isinstance(cached._pool._network_backend, CachingResolverBackend)
+    assert not isinstance(plain._pool._network_backend, CachingResolverBackend)
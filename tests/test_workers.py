@@ -0,0 +1,98 @@
+import asyncio
+import multiprocessing
+import queue
+
+import pytest
+from ctfbridge.models.challenge import Challenge
+
+from ctfdl.challenges.workers import (
+    DONE,
+    QueueEmitter,
+    forward_events,
+    run_worker_pool,
+    split_budget,
+)
+from ctfdl.core import EventEmitter, ExportConfig
+from ctfdl.core.models import ChallengeEntry
+
+
+def test_worker_events_are_reemitted_in_the_parent():
+    events = multiprocessing.get_context("spawn").Queue()
+    chal = Challenge(id="1", name="baby rop", categories=["pwn"])
+    seen = []
+    emitter = EventEmitter()
+    emitter.on("challenge_success", lambda challenge: seen.append(challenge.name))
+
+    async def run():
+        worker = QueueEmitter(events)
+        await worker.emit("worker_fail", reason="Authentication failed")
+        await worker.emit("challenge_exported", entry=ChallengeEntry(data=chal, path="pwn/baby"))
+        await worker.emit("challenge_success", challenge=chal)
+        events.put(DONE)
+        entries = []
+        return entries, await forward_events(events, emitter, entries)
+
+    entries, failures = asyncio.run(run())
+
+    assert [e.path.as_posix() for e in entries] == ["pwn/baby"]
+    assert seen == ["baby rop"]
+    assert failures == ["Authentication failed"]
+
+
+def test_category_budgets_are_shared_between_workers():
+    config = ExportConfig(url="https://ctf.example", category_budgets={"web": 90})
+
+    budget = split_budget(config, 3)
+
+    assert budget.remaining == {"web": 30}
+    assert split_budget(ExportConfig(url="https://ctf.example"), 3) is None
+
+
+class FakeQueue(queue.Queue):
+    def cancel_join_thread(self):
+        pass
+
+
+class FakeProcess:
+    """Finishes the first challenge it takes, or crashes straight away when told to."""
+
+    def __init__(self, target, args, name, crash):
+        self.name = name
+        self.crash = crash
+        self.work, self.events = args[1], args[2]
+        self.exitcode = None
+
+    def start(self):
+        if not self.crash:
+            chal, _, _ = self.work.get()
+            self.events.put(("challenge_complete", (), {"challenge": chal}))
+        self.exitcode = 1 if self.crash else 0
+
+    def join(self):
+        pass
+
+    def is_alive(self):
+        return False
+
+
+def test_crashed_workers_leave_their_work_for_the_next_run(mocker):
+    def pool(crashes):
+        context = mocker.Mock(Queue=FakeQueue)
+        context.Process = lambda target, args, name: FakeProcess(
+            target, args, name, crash=crashes.pop(0)
+        )
+        mocker.patch("multiprocessing.get_context", return_value=context)
+        chals = [Challenge(id=str(i), name=f"chal {i}", categories=["web"]) for i in range(3)]
+        config = ExportConfig(url="https://ctf.example", workers=2)
+        emitter = EventEmitter()
+        crashed = []
+        emitter.on("workers_crashed", lambda count: crashed.append(count))
+        work = [(c, f"web/chal-{c.id}", False) for c in chals]
+        return asyncio.run(run_worker_pool(config, emitter, work)), crashed
+
+    (_, left), crashed = pool([False, True])
+    assert [chal.id for chal, _, _ in left] == ["1", "2"]
+    assert crashed == [1]
+
+    with pytest.raises(RuntimeError, match="3 challenges left"):
+        pool([True, True])